@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+"""
+Telemetry Benchmark Suite
+Builds a synthetic multi-ride telemetry.db and times the hot paths - sample
+ingest, GPS parsing, ride distance, the route tracker track/geojson API and
+the dashboard API - appending results to a JSONL file keyed by git commit so
+regressions show up across commits on the same machine. Results are kept
+with the synthetic dataset, outside the working tree (--results to override).
+
+Usage:
+    python3 benchmark_suite.py                  full dataset (~1.8M samples)
+    python3 benchmark_suite.py --quick          small dataset for a fast check
+    python3 benchmark_suite.py --only gps       run benchmarks matching a name
+    python3 benchmark_suite.py --history        print stored results
+"""
+
+import os
+import sys
+import json
+import time
+import math
+import socket
+import sqlite3
+import platform
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime, timezone, timedelta
+
+from sim_backends import VirtualClock, SyntheticIMU, SyntheticNMEA, nmea_sentence, SYNTHETIC_ORIGIN
+from update_db_schema import apply_migrations
+from ride_stats import RideStats
+
+REPO_DIR = Path(__file__).resolve().parent
+
+# Benchmark configuration
+BENCH_DIR = Path(tempfile.gettempdir()) / 'motorcycle_bench'
+RESULTS_PATH = BENCH_DIR / 'benchmark_results.jsonl'
+FULL_DATASET = {'rides': 50, 'ride_minutes': 120, 'sample_rate': 5, 'track_rate': 1}
+QUICK_DATASET = {'rides': 5, 'ride_minutes': 10, 'sample_rate': 5, 'track_rate': 1}
+INGEST_SAMPLES = 20000
+LATENCY_REPEAT = 20         # Requests per endpoint
+PARSE_REPEAT = 2000         # mmcli outputs parsed per run
+DISTANCE_POINTS = 20000     # Track length for calculate_distance
+REGRESSION_THRESHOLD = 0.10  # Flag changes worse than 10%
+DATASET_VERSION = 2          # Bump when the generated data changes shape
+# The newest ride ends at build time and the dashboard queries are relative to
+# now - rebuild before /api/gps_history's 1 hour window runs short of samples
+DATASET_MAX_AGE = 45 * 60
+
+# Union of the collector and route tracker schemas, as update_db_schema.py leaves it
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS rides (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT UNIQUE,
+        ride_id TEXT UNIQUE,
+        name TEXT,
+        start_time TIMESTAMP,
+        end_time TIMESTAMP,
+        distance_miles REAL,
+        max_speed_mph REAL,
+        avg_speed_mph REAL,
+        active INTEGER DEFAULT 0,
+        uploaded BOOLEAN DEFAULT FALSE,
+        moving_time_s REAL,
+        max_lean_deg REAL,
+        max_g REAL,
+        point_count INTEGER,
+        stats_updated TEXT
+    );
+    CREATE TABLE IF NOT EXISTS telemetry_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT,
+        timestamp TIMESTAMP,
+        ax REAL, ay REAL, az REAL,
+        gx REAL, gy REAL, gz REAL,
+        mx REAL, my REAL, mz REAL,
+        temperature REAL,
+        vibration_level REAL,
+        power_voltage REAL,
+        on_external_power BOOLEAN,
+        latitude REAL,
+        longitude REAL,
+        speed_mph REAL,
+        heading REAL,
+        gps_fix BOOLEAN,
+        satellites_used INTEGER,
+        hdop REAL,
+        FOREIGN KEY (session_id) REFERENCES rides (session_id)
+    );
+    CREATE TABLE IF NOT EXISTS tracks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ride_id TEXT,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        latitude REAL,
+        longitude REAL,
+        altitude REAL,
+        speed_mph REAL
+    );
+    CREATE TABLE IF NOT EXISTS status (
+        id INTEGER PRIMARY KEY,
+        current_ride_id TEXT,
+        tracking_active INTEGER DEFAULT 0,
+        last_updated TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    INSERT OR IGNORE INTO status (id, tracking_active) VALUES (1, 0);
+    CREATE TABLE IF NOT EXISTS bench_meta (key TEXT PRIMARY KEY, value TEXT);
+'''
+
+SAMPLE_COLUMNS = (
+    'session_id', 'timestamp', 'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'mx', 'my', 'mz',
+    'temperature', 'vibration_level', 'power_voltage', 'on_external_power',
+    'latitude', 'longitude', 'speed_mph', 'heading', 'gps_fix', 'satellites_used', 'hdop',
+)
+
+
+def ride_samples(index, start, dataset):
+    """Yield (telemetry_data row dict, is_track_point) for one synthetic ride"""
+    clock = VirtualClock(start_wall=start.timestamp())
+    imu = SyntheticIMU(clock, rate_hz=dataset['sample_rate'], seed=index)
+    # Spread rides around the area so spatial queries see more than one loop
+    origin = (SYNTHETIC_ORIGIN[0] + (index % 7) * 0.05, SYNTHETIC_ORIGIN[1] + (index // 7) * 0.05)
+    gps = SyntheticNMEA(clock, speed_mph=30 + index % 40, origin=origin)
+
+    session_id = start.strftime('%Y%m%d_%H%M%S')
+    track_every = max(1, int(dataset['sample_rate'] / dataset['track_rate']))
+    period = 1.0 / dataset['sample_rate']
+    for i in range(int(dataset['ride_minutes'] * 60 * dataset['sample_rate'])):
+        t = i * period
+        clock.now = t
+        imu.getAgmt()
+        lat, lon, course = gps.position(t)
+        yield {
+            'session_id': session_id,
+            'timestamp': (start + timedelta(seconds=t)).isoformat(),
+            't_ns': int(t * 1e9),
+            'ax': imu.axRaw, 'ay': imu.ayRaw, 'az': imu.azRaw,
+            'gx': imu.gxRaw, 'gy': imu.gyRaw, 'gz': imu.gzRaw,
+            'mx': imu.mxRaw, 'my': imu.myRaw, 'mz': imu.mzRaw,
+            'temperature': imu.tempRaw,
+            'vibration_level': abs(imu.axRaw) / 16384,
+            'power_voltage': 13.8,
+            'on_external_power': True,
+            'latitude': lat,
+            'longitude': lon,
+            'speed_mph': gps.speed_mph,
+            'heading': course,
+            'gps_fix': True,
+            'satellites_used': 9,
+            'hdop': 0.8,
+        }, i % track_every == 0
+
+
+def create_schema(db_path):
+    conn = sqlite3.connect(str(db_path))
+    conn.executescript(SCHEMA)
+    conn.commit()
+    conn.close()
+
+
+def build_dataset(db_path, dataset):
+    """Create (or reuse) the synthetic database; the newest ride ends now and is left active"""
+    db_path = Path(db_path)
+    signature = json.dumps(dict(dataset, version=DATASET_VERSION), sort_keys=True)
+    if db_path.exists():
+        conn = sqlite3.connect(str(db_path))
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM bench_meta").fetchall())
+        except sqlite3.Error:
+            meta = {}
+        conn.close()
+        if meta.get('dataset') == signature and time.time() - float(meta.get('built_at', 0)) < DATASET_MAX_AGE:
+            print(f"📂 Reusing dataset {db_path}")
+            apply_migrations(db_path)
+            return
+        for path in (db_path, Path(str(db_path) + '-wal'), Path(str(db_path) + '-shm')):
+            if path.exists():
+                path.unlink()
+
+    print(f"🏗️ Building dataset {db_path}: {dataset['rides']} rides x {dataset['ride_minutes']} min "
+          f"at {dataset['sample_rate']} Hz")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    create_schema(db_path)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    insert_sample = 'INSERT INTO telemetry_data ({}) VALUES ({})'.format(
+        ', '.join(SAMPLE_COLUMNS), ', '.join(':' + column for column in SAMPLE_COLUMNS))
+    insert_track = ('INSERT INTO tracks (ride_id, timestamp, latitude, longitude, altitude, speed_mph) '
+                    'VALUES (?, ?, ?, ?, ?, ?)')
+    started = time.monotonic()
+    ride_length = timedelta(minutes=dataset['ride_minutes'])
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    rows = 0
+
+    for index in range(dataset['rides']):
+        # Rides one per day going back, the last one finishing now
+        end = now - timedelta(days=dataset['rides'] - 1 - index)
+        start = end - ride_length
+        session_id = start.strftime('%Y%m%d_%H%M%S')
+        ride_id = f"ride_{session_id}"
+        active = index == dataset['rides'] - 1
+
+        samples, tracks = [], []
+        stats = RideStats()
+        for sample, is_track in ride_samples(index, start, dataset):
+            stats.update(sample)
+            samples.append(sample)
+            if is_track:
+                tracks.append((ride_id, sample['timestamp'], sample['latitude'], sample['longitude'],
+                               30.0, sample['speed_mph']))
+            if len(samples) >= 10000:
+                conn.executemany(insert_sample, samples)
+                rows += len(samples)
+                samples = []
+        conn.executemany(insert_sample, samples)
+        conn.executemany(insert_track, tracks)
+        rows += len(samples)
+
+        ride = dict(stats.to_row(), session_id=session_id, ride_id=ride_id,
+                    name=f"Ride on {start.strftime('%Y-%m-%d %H:%M')}", start_time=start.isoformat(),
+                    end_time=None if active else end.isoformat(), active=int(active))
+        conn.execute("INSERT INTO rides ({}) VALUES ({})".format(
+            ', '.join(ride), ', '.join(':' + column for column in ride)), ride)
+        if active:
+            conn.execute("UPDATE status SET current_ride_id=?, tracking_active=1 WHERE id=1", (ride_id,))
+        conn.commit()
+        print(f"   ride {index + 1}/{dataset['rides']}: {rows} samples")
+
+    conn.executemany("INSERT OR REPLACE INTO bench_meta (key, value) VALUES (?, ?)",
+                     [('dataset', signature), ('built_at', str(time.time()))])
+    conn.commit()
+    conn.close()
+    # Same indexes and schema upgrades as the bike's database
+    apply_migrations(db_path)
+    print(f"✅ Dataset built in {time.monotonic() - started:.1f} s")
+
+
+def latency_stats(times):
+    """Summary of a list of durations in seconds"""
+    times = sorted(times)
+    return {
+        'median_ms': round(times[len(times) // 2] * 1000, 3),
+        'p95_ms': round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 3),
+        'min_ms': round(times[0] * 1000, 3),
+        'runs': len(times)
+    }
+
+
+def time_calls(func, repeat):
+    """Call func repeat times after one warm-up call"""
+    func()
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return latency_stats(times)
+
+
+def time_requests(client, url, repeat):
+    """Latency of GET url through a Flask test client, plus the response size"""
+    def get():
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+    stats = time_calls(get, repeat)
+    stats['bytes'] = len(get().get_data())
+    return stats
+
+
+def bench_ingest(work_dir, args):
+    """TelemetryWriter throughput, SQLite plus ride archive"""
+    from telemetry_writer import TelemetryWriter
+
+    db_path = work_dir / 'ingest.db'
+    for path in (db_path, Path(str(db_path) + '-wal'), Path(str(db_path) + '-shm')):
+        if path.exists():
+            path.unlink()
+    create_schema(db_path)
+    apply_migrations(db_path)
+    archive_dir = work_dir / 'ingest_archive'
+    archive_dir.mkdir(exist_ok=True)
+
+    dataset = dict(QUICK_DATASET, ride_minutes=INGEST_SAMPLES / QUICK_DATASET['sample_rate'] / 60)
+    samples = [sample for sample, _ in ride_samples(0, datetime.now(timezone.utc), dataset)]
+
+    writer = TelemetryWriter(db_path, archive_dir=archive_dir, queue_size=len(samples) + 10)
+    writer.start()
+    started = time.perf_counter()
+    for sample in samples:
+        writer.submit(sample)
+    writer.end_session(samples[0]['session_id'])
+    writer.flush(timeout=300)
+    elapsed = time.perf_counter() - started
+    writer.stop()
+
+    stats = writer.get_stats()
+    for archive in archive_dir.iterdir():
+        archive.unlink()
+    return {
+        'samples': stats['written'],
+        'dropped': stats['dropped'],
+        'write_dropped': stats['write_dropped'],
+        'seconds': round(elapsed, 3),
+        'ops_per_sec': round(stats['written'] / elapsed, 1)
+    }
+
+
+def mmcli_output():
+    """A --location-get dump like the SIM7600 returns with a fix"""
+    gga = nmea_sentence("GPGGA,123519.00,4248.575160,N,07052.044240,W,1,09,0.8,30.0,M,-33.0,M,,")
+    rmc = nmea_sentence("GPRMC,123519.00,A,4248.575160,N,07052.044240,W,39.1,87.5,171026,,,A")
+    gsv = nmea_sentence("GPGSV,3,1,09,02,45,120,40,05,30,210,38,12,60,045,44,15,20,300,35")
+    lines = ['  --------------------------', '  3GPP |  operator code: 310', '  --------------------------']
+    lines += [f"  GPS  |  nmea: {gga}", f"       |        {rmc}", f"       |        {gsv}"]
+    return '\n'.join(lines * 2)
+
+
+def bench_gps_parse(work_dir, args):
+    """CellularGPS.parse_location_output on a typical mmcli dump"""
+    from cellular_gps import CellularGPS
+
+    gps = CellularGPS()
+    output = mmcli_output()
+    stats = time_calls(lambda: [gps.parse_location_output(output) for _ in range(PARSE_REPEAT)], 5)
+    stats['ops_per_sec'] = round(PARSE_REPEAT / (stats['median_ms'] / 1000), 1)
+    return stats
+
+
+def bench_nmea_stream(work_dir, args):
+    """NMEAStreamGPS.handle_sentence, one GGA + RMC epoch per fix"""
+    clock = VirtualClock()
+    gps = SyntheticNMEA(clock)
+    sentences = []
+    for epoch in range(PARSE_REPEAT):
+        sentences.extend(gps.epoch_sentences(epoch))
+
+    def parse():
+        for sentence in sentences:
+            gps.handle_sentence(sentence)
+    stats = time_calls(parse, 5)
+    stats['ops_per_sec'] = round(len(sentences) / (stats['median_ms'] / 1000), 1)
+    return stats
+
+
+def bench_distance(work_dir, args):
+    """route_tracker.calculate_distance over a long track"""
+    import route_tracker
+
+    gps = SyntheticNMEA(VirtualClock())
+    points = [gps.position(t)[:2] for t in range(DISTANCE_POINTS)]
+    stats = time_calls(lambda: route_tracker.calculate_distance(points), 10)
+    stats['ops_per_sec'] = round(DISTANCE_POINTS / (stats['median_ms'] / 1000), 1)
+    return stats
+
+
+def largest_ride(db_path):
+    """The finished ride with the most track points"""
+    conn = sqlite3.connect(str(db_path))
+    row = conn.execute(
+        "SELECT t.ride_id, COUNT(*) AS points FROM tracks t JOIN rides r ON r.ride_id = t.ride_id "
+        "WHERE r.active = 0 GROUP BY t.ride_id ORDER BY points DESC LIMIT 1"
+    ).fetchone()
+    conn.close()
+    return row[0]
+
+
+def ride_start(db_path, ride_id):
+    """(latitude, longitude) of a ride's first track point"""
+    conn = sqlite3.connect(str(db_path))
+    row = conn.execute("SELECT latitude, longitude FROM tracks WHERE ride_id=? ORDER BY id LIMIT 1",
+                       (ride_id,)).fetchone()
+    conn.close()
+    return row
+
+
+def tile_xy(lat, lon, zoom):
+    """x, y of the web-mercator tile containing a point"""
+    n = 2 ** zoom
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+
+def latest_track_id(db_path):
+    conn = sqlite3.connect(str(db_path))
+    row = conn.execute("SELECT MAX(id) FROM tracks").fetchone()
+    conn.close()
+    return row[0]
+
+
+def bench_route_api(work_dir, args):
+    """Route tracker track, geojson, current ride and ride list endpoints"""
+    import route_tracker
+
+    client = route_tracker.app.test_client()
+    ride_id = largest_ride(route_tracker.DB_PATH)
+    lat, lon = ride_start(route_tracker.DB_PATH, ride_id)
+    return {
+        'ride_track': time_requests(client, f'/api/ride/{ride_id}/track', args.repeat),
+        'ride_geojson': time_requests(client, f'/api/ride/{ride_id}/geojson', args.repeat),
+        'ride_track_zoom12': time_requests(client, f'/api/ride/{ride_id}/track?zoom=12', args.repeat),
+        'ride_track_polyline': time_requests(client, f'/api/ride/{ride_id}/track?format=polyline', args.repeat),
+        'ride_track_binary': time_requests(client, f'/api/ride/{ride_id}/track?format=binary', args.repeat),
+        'ride_geojson_zoom15': time_requests(client, f'/api/ride/{ride_id}/geojson?zoom=15', args.repeat),
+        'current_ride_track': time_requests(client, '/api/current_ride_track', args.repeat),
+        'current_ride_track_delta': time_requests(
+            client, f'/api/current_ride_track?since={latest_track_id(route_tracker.DB_PATH) - 5}', args.repeat),
+        'rides': time_requests(client, '/api/rides', args.repeat),
+        'search_bbox': time_requests(
+            client, f'/api/search/bbox?bbox={lon - 0.01},{lat - 0.01},{lon + 0.01},{lat + 0.01}', args.repeat),
+        'search_radius': time_requests(
+            client, f'/api/search/radius?lat={lat}&lon={lon}&radius_m=500&points=1', args.repeat),
+        'heat_tile_zoom12': time_requests(client, '/tiles/12/{}/{}.png'.format(*tile_xy(lat, lon, 12)), args.repeat),
+    }
+
+
+def bench_dashboard_api(work_dir, args):
+    """Dashboard /api/telemetry and /api/gps_history, reading SQLite"""
+    import motorcycle_dashboard_app
+
+    # Measure the SQLite path - the shared-memory ring only exists while the collector runs
+    motorcycle_dashboard_app.telemetry.ring = False
+    client = motorcycle_dashboard_app.app.test_client()
+    return {
+        'telemetry': time_requests(client, '/api/telemetry', args.repeat),
+        'gps_history': time_requests(client, '/api/gps_history?hours=1', args.repeat),
+        'gps_history_24h': time_requests(client, '/api/gps_history?hours=24', args.repeat),
+    }
+
+
+BENCHMARKS = {
+    'ingest': bench_ingest,
+    'gps_parse': bench_gps_parse,
+    'nmea_stream': bench_nmea_stream,
+    'distance': bench_distance,
+    'route_api': bench_route_api,
+    'dashboard_api': bench_dashboard_api,
+}
+
+
+def git_commit():
+    """Current commit and whether the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+
+
+def flatten(results, prefix=''):
+    """{'route_api': {'rides': {...}}} -> {'route_api.rides': {...}}"""
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict) and not ('median_ms' in value or 'ops_per_sec' in value):
+            flat.update(flatten(value, f"{prefix}{name}."))
+        else:
+            flat[f"{prefix}{name}"] = value
+    return flat
+
+
+def headline(metrics):
+    """(value, higher_is_better) used to compare runs"""
+    if 'ops_per_sec' in metrics:
+        return metrics['ops_per_sec'], True
+    return metrics['median_ms'], False
+
+
+def load_history(path):
+    if not Path(path).exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(record, history):
+    """Print each result against the last run of the same dataset on the same host"""
+    previous = None
+    for old in reversed(history):
+        if old['host'] == record['host'] and old['dataset'] == record['dataset'] and old['commit'] != record['commit']:
+            previous = old
+            break
+
+    current = flatten(record['results'])
+    baseline = flatten(previous['results']) if previous else {}
+    print()
+    print(f"📊 Results for {record['commit'] or 'unknown commit'}{' (dirty)' if record['dirty'] else ''}"
+          + (f" vs {previous['commit']}" if previous else ''))
+    regressions = 0
+    for name, metrics in current.items():
+        value, higher_better = headline(metrics)
+        unit = 'ops/s' if higher_better else 'ms'
+        line = f"   {name:32} {value:>14,.3f} {unit}"
+        if name in baseline:
+            old_value, _ = headline(baseline[name])
+            if old_value:
+                change = (value - old_value) / old_value
+                worse = -change if higher_better else change
+                flag = '  ⚠️ regression' if worse > REGRESSION_THRESHOLD else ''
+                regressions += bool(flag)
+                line += f"   {change:+.1%}{flag}"
+        print(line)
+    return regressions
+
+
+def print_history(path):
+    for record in load_history(path):
+        flat = flatten(record['results'])
+        summary = ', '.join(f"{name} {headline(metrics)[0]:,.1f}" for name, metrics in flat.items())
+        print(f"{record['recorded_at']}  {record['commit']}{'+' if record['dirty'] else ' '}  {record['host']}  {summary}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the telemetry pipeline')
+    parser.add_argument('--quick', action='store_true', help='Use a small dataset')
+    parser.add_argument('--rides', type=int, help='Override the number of synthetic rides')
+    parser.add_argument('--ride-minutes', type=float, help='Override the length of each ride')
+    parser.add_argument('--only', action='append', help='Run only benchmarks whose name contains this (repeatable)')
+    parser.add_argument('--repeat', type=int, default=LATENCY_REPEAT, help='Requests per endpoint')
+    parser.add_argument('--work-dir', default=str(BENCH_DIR), help='Where the synthetic database is kept')
+    parser.add_argument('--results', default=str(RESULTS_PATH), help='JSONL file results are appended to')
+    parser.add_argument('--no-save', action='store_true', help="Don't append results")
+    parser.add_argument('--history', action='store_true', help='Print stored results and exit')
+    args = parser.parse_args()
+
+    if args.history:
+        print_history(args.results)
+        return
+
+    dataset = dict(QUICK_DATASET if args.quick else FULL_DATASET)
+    if args.rides:
+        dataset['rides'] = args.rides
+    if args.ride_minutes:
+        dataset['ride_minutes'] = args.ride_minutes
+
+    # Point the route tracker and dashboard at the synthetic data before importing them
+    work_dir = Path(args.work_dir) / ('quick' if args.quick else 'full')
+    work_dir.mkdir(parents=True, exist_ok=True)
+    os.environ['MOTO_DATA_DIR'] = str(work_dir)
+    build_dataset(work_dir / 'telemetry.db', dataset)
+
+    results = {}
+    for name, benchmark in BENCHMARKS.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        print(f"⏱️ {name}: {benchmark.__doc__}")
+        try:
+            results[name] = benchmark(work_dir, args)
+        except Exception as e:
+            print(f"   ❌ {name} failed: {e}")
+            results[name] = {'error': str(e)}
+    results = {name: value for name, value in results.items() if 'error' not in value}
+
+    commit, dirty = git_commit()
+    record = {
+        'commit': commit,
+        'dirty': dirty,
+        'recorded_at': datetime.now().isoformat(timespec='seconds'),
+        'host': socket.gethostname(),
+        'machine': platform.machine(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'dataset': dataset,
+        'results': results
+    }
+    regressions = compare(record, load_history(args.results))
+
+    if not args.no_save:
+        Path(args.results).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"💾 Results appended to {args.results}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
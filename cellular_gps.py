@@ -8,8 +8,32 @@ import subprocess
 import re
 import time
 import json
+import threading
 from datetime import datetime
 
+try:
+    import serial
+except ImportError:
+    serial = None
+
+# SIM7600 NMEA streaming port
+NMEA_PORT = '/dev/ttyUSB1'
+NMEA_BAUD = 115200
+NMEA_RECONNECT_DELAY = 5   # Seconds between attempts to reopen the port
+
+def nmea_checksum_ok(sentence):
+    """Verify the XOR checksum of an NMEA sentence, if it has one"""
+    if '*' not in sentence:
+        return True
+    body, _, checksum = sentence[1:].partition('*')
+    calculated = 0
+    for char in body:
+        calculated ^= ord(char)
+    try:
+        return calculated == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
 class CellularGPS:
     def __init__(self):
         self.modem_id = 0
@@ -183,6 +207,171 @@ class CellularGPS:
         print("   ⚠️ No GPS fix acquired within timeout")
         return False
 
+class NMEAStreamGPS(CellularGPS):
+    """GPS backend that keeps the SIM7600 NMEA port open and parses sentences as they stream in"""
+    
+    def __init__(self, port=NMEA_PORT, baudrate=NMEA_BAUD):
+        super().__init__()
+        self.port = port
+        self.baudrate = baudrate
+        self.serial = None
+        self.running = False
+        self.thread = None
+        self.callback = None
+        self.lock = threading.Lock()
+        self.latest = None
+        self.fix_state = self.empty_fix()
+        self.epoch_time = None      # UTC time field of the epoch being assembled
+        self.epoch_types = set()    # Sentence types seen for it so far
+        self.stats = {
+            'sentences': 0,
+            'checksum_errors': 0,
+            'fixes_published': 0
+        }
+        
+    def empty_fix(self):
+        """GPS data dict with no fix, matching parse_location_output"""
+        return {
+            'latitude': None,
+            'longitude': None,
+            'speed_mph': 0,
+            'heading': None,
+            'gps_fix': False,
+            'hdop': 99,
+            'satellites_used': 0,
+            'timestamp': datetime.now()
+        }
+        
+    def enable_gps(self):
+        """Enable GPS with ModemManager releasing the NMEA port to us"""
+        try:
+            subprocess.run(['sudo', 'mmcli', '-m', str(self.modem_id), '-e'], 
+                         capture_output=True, check=True)
+            time.sleep(2)
+            
+            # Unmanaged mode starts the GPS engine but leaves the NMEA port unclaimed
+            subprocess.run(['sudo', 'mmcli', '-m', str(self.modem_id), '--location-enable-gps-unmanaged'], 
+                         capture_output=True, check=True)
+            return True
+        except Exception as e:
+            print(f"Failed to enable GPS: {e}")
+            return False
+            
+    def open_port(self):
+        """Open the NMEA serial port"""
+        if serial is None:
+            print("pyserial not installed - NMEA streaming unavailable")
+            return False
+        try:
+            self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
+            return True
+        except (serial.SerialException, OSError) as e:
+            print(f"Failed to open NMEA port {self.port}: {e}")
+            self.serial = None
+            return False
+            
+    def start(self, callback=None):
+        """Start streaming; callback(gps_data) is called for every new fix"""
+        self.callback = callback
+        if not self.open_port():
+            return False
+        self.running = True
+        self.thread = threading.Thread(target=self.reader_loop, daemon=True)
+        self.thread.start()
+        return True
+        
+    def stop(self):
+        """Stop streaming and close the port"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+        if self.serial:
+            self.serial.close()
+            self.serial = None
+            
+    def reader_loop(self):
+        """Read NMEA sentences line by line, reopening the port if it drops"""
+        while self.running:
+            if not self.serial and not self.open_port():
+                time.sleep(NMEA_RECONNECT_DELAY)
+                continue
+                
+            try:
+                line = self.serial.readline()
+            except (serial.SerialException, OSError) as e:
+                print(f"NMEA port error: {e}")
+                self.serial.close()
+                self.serial = None
+                continue
+                
+            if line:
+                self.handle_sentence(line.decode('ascii', errors='ignore').strip())
+                
+    def handle_sentence(self, sentence):
+        """Fold one NMEA sentence into the current fix, publishing once GGA and RMC share a timestamp"""
+        if not sentence.startswith('$'):
+            return
+            
+        self.stats['sentences'] += 1
+        if not nmea_checksum_ok(sentence):
+            self.stats['checksum_errors'] += 1
+            return
+            
+        talker_type = sentence[3:6]
+        if talker_type not in ('GGA', 'RMC'):
+            return
+            
+        # Both sentences carry the epoch's UTC time in field 1
+        fields = sentence.split('*')[0].split(',')
+        utc_time = fields[1] if len(fields) > 1 else ''
+        if utc_time != self.epoch_time:
+            self.epoch_time = utc_time
+            self.epoch_types = set()
+            
+        if talker_type == 'GGA':
+            parsed = self.parse_gga(sentence)
+            if parsed:
+                self.fix_state.update(parsed)
+            else:
+                self.fix_state.update({'satellites_used': 0, 'hdop': 99})
+                
+        else:
+            parsed = self.parse_rmc(sentence)
+            if parsed:
+                self.fix_state.update(parsed)
+            else:
+                self.fix_state.update({
+                    'latitude': None,
+                    'longitude': None,
+                    'speed_mph': 0,
+                    'heading': None,
+                    'gps_fix': False
+                })
+                
+        self.epoch_types.add(talker_type)
+        if self.epoch_types == {'GGA', 'RMC'}:
+            # Position and quality now describe the same epoch
+            self.epoch_types = set()
+            self.fix_state['timestamp'] = datetime.now()
+            self.publish(dict(self.fix_state))
+            
+    def publish(self, gps_data):
+        """Store the new fix and hand it to the subscriber"""
+        with self.lock:
+            self.latest = gps_data
+            if gps_data['gps_fix']:
+                self.last_fix = gps_data
+        self.stats['fixes_published'] += 1
+        
+        if self.callback:
+            self.callback(gps_data)
+            
+    def get_location(self):
+        """Get the most recent streamed fix"""
+        with self.lock:
+            return dict(self.latest) if self.latest else None
+
 if __name__ == "__main__":
     gps = CellularGPS()
     gps.test_gps() 
\ No newline at end of file
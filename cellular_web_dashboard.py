@@ -4,14 +4,23 @@ Cellular Web Dashboard for Motorcycle Telemetry
 Serves a real-time dashboard accessible over cellular connection
 """
 
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, request
 import sqlite3
 import json
-from datetime import datetime, timedelta
+import math
+from datetime import datetime, timezone
 import threading
 import time
 
+from telemetry_ring import open_reader, RING_STALE_AFTER
+from telemetry_hub import HubSubscriber
+from history_buckets import HISTORY_BUCKETS, bucket_recent
+from wsgi_server import serve
+
 app = Flask(__name__)
+SERVER_THREADS = 8
+LIVE_RATE = 20        # Hz - hub samples taken for the polled /api/telemetry
+MAX_HISTORY_MINUTES = 24 * 60 * 31
 
 # HTML template for the dashboard
 DASHBOARD_HTML = '''
@@ -240,9 +249,34 @@ class TelemetryServer:
         self.db_path = db_path
         self.latest_data = {}
         self.running = False
+        self.ring = None
+        self.ring_live = False
+        
+    def read_latest_row(self):
+        """Latest sample from the collector's live ring, or None if it isn't publishing
+        or has stopped"""
+        if self.ring is None:
+            self.ring = open_reader()
+        if not self.ring:
+            return None
+        sample = self.ring.latest_sample(max_age=RING_STALE_AFTER)
+        self.ring_live = sample is not None
+        if sample:
+            self.add_row_fields(sample)
+        return sample
+        
+    def add_row_fields(self, sample):
+        """Give a live sample the column names of a telemetry_data row"""
+        sample['timestamp'] = datetime.fromtimestamp(sample['t_wall'], timezone.utc).isoformat()
+        sample['satellites'] = sample['satellites_used']
+        return sample
         
     def get_latest_telemetry(self):
-        """Get the latest telemetry data from database"""
+        """Get the latest telemetry data from the live ring, falling back to the database"""
+        data = self.read_latest_row()
+        if data:
+            return self.add_derived_values(data)
+            
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
@@ -256,34 +290,46 @@ class TelemetryServer:
             """)
             
             row = cursor.fetchone()
-            if row:
-                data = dict(row)
-                
-                # Calculate derived values
-                if data.get('ax') and data.get('ay'):
-                    # Calculate lean angle from accelerometer
-                    ax = (data['ax'] - 100) / 16384.0  # Calibrated values
-                    ay = (data['ay'] - 100) / 16384.0
-                    
-                    import math
-                    lean_angle = math.atan2(ay, abs(ax)) * 57.3
-                    data['lean_angle'] = lean_angle
-                    data['gforce_lateral'] = ay
-                
-                return data
-            
             conn.close()
+            if row:
+                return self.add_derived_values(dict(row))
             
         except Exception as e:
             print(f"Database error: {e}")
             
         return {}
     
+    def add_derived_values(self, data):
+        """Calculate lean angle and lateral G from the raw accelerometer"""
+        if data.get('ax') and data.get('ay'):
+            # Calculate lean angle from accelerometer
+            ax = (data['ax'] - 100) / 16384.0  # Calibrated values
+            ay = (data['ay'] - 100) / 16384.0
+            
+            lean_angle = math.atan2(ay, abs(ax)) * 57.3
+            data['lean_angle'] = lean_angle
+            data['gforce_lateral'] = ay
+        
+        return data
+    
     def update_loop(self):
-        """Continuously update latest data"""
+        """Continuously update latest data - from the telemetry hub as samples
+        arrive, else by polling the ring or database"""
+        subscriber = HubSubscriber(name='cellular-dashboard', max_rate=LIVE_RATE, queue=1)
         while self.running:
+            if subscriber.connected or subscriber.connect():
+                try:
+                    sample = subscriber.recv(timeout=1.0)
+                except ConnectionError:
+                    continue
+                if sample:
+                    self.latest_data = self.add_derived_values(self.add_row_fields(sample))
+                continue
+            
             self.latest_data = self.get_latest_telemetry()
-            time.sleep(0.5)
+            # The ring is a memory read, so it can be polled faster than SQLite
+            time.sleep(0.05 if self.ring_live else 0.5)
+        subscriber.close()
     
     def start(self):
         """Start the update thread"""
@@ -311,29 +357,34 @@ def get_telemetry():
 
 @app.route('/api/history/<int:minutes>')
 def get_history(minutes):
-    """Get telemetry history for the last N minutes"""
+    """Get telemetry history for the last N minutes, downsampled to evenly
+    spaced buckets (?buckets=, default HISTORY_BUCKETS) - one row per bucket"""
     try:
-        conn = sqlite3.connect(telemetry_server.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        # Calculate time threshold
-        threshold = datetime.now() - timedelta(minutes=minutes)
+        if minutes <= 0 or minutes > MAX_HISTORY_MINUTES:
+            return jsonify({"error": f"minutes must be between 1 and {MAX_HISTORY_MINUTES}"}), 400
+        buckets = request.args.get('buckets', HISTORY_BUCKETS, type=int)
         
-        cursor.execute("""
-            SELECT timestamp, latitude, longitude, speed_mph, ax, ay 
-            FROM telemetry_data 
-            WHERE timestamp > ? 
-            AND latitude IS NOT NULL 
-            ORDER BY timestamp DESC 
-            LIMIT 1000
-        """, (threshold.isoformat(),))
-        
-        rows = cursor.fetchall()
-        data = [dict(row) for row in rows]
+        conn = sqlite3.connect(telemetry_server.db_path)
+        try:
+            _, points = bucket_recent(conn, minutes * 60, buckets)
+        finally:
+            conn.close()
         
-        conn.close()
-        return jsonify(data)
+        # Newest first with the raw rows' fields, as before bucketing: the
+        # bucket's last sample, plus what the bucket adds
+        return jsonify([{
+            'timestamp': point['timestamp'],
+            'latitude': point['lat'],
+            'longitude': point['lon'],
+            'speed_mph': point['last_speed'],
+            'ax': point['ax'],
+            'ay': point['ay'],
+            'avg_speed_mph': point['speed'],
+            'min_speed_mph': point['min_speed'],
+            'max_speed_mph': point['max_speed'],
+            'max_lean_angle': point['max_lean'],
+            'samples': point['samples']
+        } for point in reversed(points)])
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -359,7 +410,7 @@ if __name__ == '__main__':
     
     try:
         # Run Flask app
-        app.run(host='0.0.0.0', port=8080, debug=False)
+        serve(app, host='0.0.0.0', port=8080, threads=SERVER_THREADS)
     except KeyboardInterrupt:
         telemetry_server.stop()
         print("\n🛑 Dashboard stopped") 
\ No newline at end of file
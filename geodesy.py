@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Geodesy Kernel
+Haversine distances over whole tracks at once
+
+Coordinates come in as (latitude, longitude) rows - SQLite fetchall() results,
+lists of tuples or an (n, 2) array - or as separate latitude/longitude buffers
+(array.array('d'), NumPy arrays, lists). With NumPy every function is a
+handful of vectorized operations; without it the same API falls back to a
+pure-Python loop that converts each coordinate to radians once.
+"""
+
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Pure-Python fallback below
+
+EARTH_RADIUS_MILES = 3958.8
+
+
+def haversine_miles(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in miles"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def split_points(points):
+    """(latitudes, longitudes) from (lat, lon, ...) rows, skipping rows with a missing coordinate"""
+    if np is not None:
+        array = np.asarray(points, dtype=float)
+        if array.size == 0:
+            return np.empty(0), np.empty(0)
+        # None becomes NaN in a float array
+        array = array[~np.isnan(array[:, :2]).any(axis=1)]
+        return array[:, 0], array[:, 1]
+    points = [point for point in points if point[0] is not None and point[1] is not None]
+    return [point[0] for point in points], [point[1] for point in points]
+
+
+def as_radians(values):
+    if np is not None:
+        return np.radians(np.asarray(values, dtype=float))
+    return list(map(math.radians, values))
+
+
+def segment_distances(lats, lons):
+    """Distance in miles of each segment between consecutive points (n - 1 values)"""
+    phi = as_radians(lats)
+    lam = as_radians(lons)
+
+    if np is not None:
+        if len(phi) < 2:
+            return np.empty(0)
+        cos_phi = np.cos(phi)
+        a = np.sin(np.diff(phi) / 2) ** 2 + cos_phi[:-1] * cos_phi[1:] * np.sin(np.diff(lam) / 2) ** 2
+        return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    sin, asin, sqrt = math.sin, math.asin, math.sqrt
+    cos_phi = list(map(math.cos, phi))
+    return [
+        2 * EARTH_RADIUS_MILES * asin(sqrt(min(1.0, sin((phi2 - phi1) / 2) ** 2
+                                               + cos1 * cos2 * sin((lam2 - lam1) / 2) ** 2)))
+        for phi1, phi2, lam1, lam2, cos1, cos2
+        in zip(phi, phi[1:], lam, lam[1:], cos_phi, cos_phi[1:])
+    ]
+
+
+def cumulative_distance(lats, lons):
+    """Distance in miles from the first point to each point (n values, starting at 0)"""
+    distances = segment_distances(lats, lons)
+    if np is not None:
+        return np.concatenate(([0.0], np.cumsum(distances))) if len(lats) else np.empty(0)
+
+    total = 0.0
+    cumulative = [0.0] if len(lats) else []
+    for distance in distances:
+        total += distance
+        cumulative.append(total)
+    return cumulative
+
+
+def total_distance(lats, lons):
+    """Length of the whole track in miles"""
+    distances = segment_distances(lats, lons)
+    return float(distances.sum()) if np is not None else sum(distances)
+
+
+def track_distance(points):
+    """Length in miles of a track given as (lat, lon, ...) rows; rows without a fix are skipped"""
+    if len(points) < 2:
+        return 0.0
+    lats, lons = split_points(points)
+    return total_distance(lats, lons)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Ride Heatmap Tiles
+256 px web-mercator PNG tiles of every finished ride, colored by how many
+rides passed through each pixel - a raster overlay the map loads one visible
+tile at a time instead of receiving every point of every ride
+
+A tile draws the rides whose track_segments overlap it, each from its
+simplified track_levels level for the tile's zoom, so the work per tile is
+bounded by what is visible rather than by the whole history. Rendered tiles
+are kept on disk under a generation named after the set of finished rides;
+ending, adding or deleting a ride starts a new generation and the old one is
+removed.
+"""
+
+import hashlib
+import math
+import shutil
+import struct
+import zlib
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Pure-Python fallback below
+
+from track_simplify import FULL_DETAIL_ZOOM, MIN_ZOOM, build_track_levels, load_track_level
+
+# Heat tile configuration
+TILE_SIZE = 256
+MAX_ZOOM = 20                 # Deepest zoom served - levels stop at FULL_DETAIL_ZOOM - 1 anyway
+TILE_MARGIN_PX = 4            # Rides just outside the tile can still draw into it
+HEAT_SATURATION_RIDES = 20    # This many rides through a pixel gets the hottest color
+PNG_COMPRESSION = 6
+
+# Color ramp from one ride to HEAT_SATURATION_RIDES, as (position, r, g, b, a)
+HEAT_RAMP = (
+    (0.0, 0, 90, 255, 150),
+    (0.35, 0, 220, 255, 190),
+    (0.6, 255, 230, 0, 220),
+    (1.0, 255, 40, 0, 255),
+)
+
+
+def tile_bounds(z, x, y, margin_px=0):
+    """(min_lat, min_lon, max_lat, max_lon) of a tile, grown by margin_px"""
+    n = 2 ** z
+    margin = margin_px / TILE_SIZE
+
+    def lon(tx):
+        return tx / n * 360.0 - 180.0
+
+    def lat(ty):
+        ty = min(max(ty, 0), n)
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * ty / n))))
+
+    return lat(y + 1 + margin), lon(x - margin), lat(y - margin), lon(x + 1 + margin)
+
+
+def tile_pixels(points, z, x, y):
+    """Pixel x and y within a tile of (lat, lon, ...) points"""
+    scale = 2 ** z * TILE_SIZE
+    xs, ys = [], []
+    for point in points:
+        lat = max(min(point[0], 85.0511), -85.0511)
+        xs.append((point[1] + 180.0) / 360.0 * scale - x * TILE_SIZE)
+        ys.append((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * scale - y * TILE_SIZE)
+    return xs, ys
+
+
+def line_pixels(xs, ys):
+    """Indices (row * TILE_SIZE + column) of the tile pixels a polyline
+    crosses, each once"""
+    if np is not None:
+        xs = np.asarray(xs)
+        ys = np.asarray(ys)
+        if len(xs) == 1:
+            px, py = xs, ys
+        else:
+            # Sample every segment at least once per pixel of its length
+            steps = np.maximum(np.ceil(np.maximum(np.abs(np.diff(xs)), np.abs(np.diff(ys)))), 1).astype(int)
+            segment = np.repeat(np.arange(len(steps)), steps)
+            t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+            px = np.append(xs[segment] + (xs[segment + 1] - xs[segment]) * t, xs[-1])
+            py = np.append(ys[segment] + (ys[segment + 1] - ys[segment]) * t, ys[-1])
+        px = np.floor(px).astype(int)
+        py = np.floor(py).astype(int)
+        inside = (px >= 0) & (px < TILE_SIZE) & (py >= 0) & (py < TILE_SIZE)
+        return np.unique(py[inside] * TILE_SIZE + px[inside])
+
+    pixels = set()
+    samples = [(xs[0], ys[0])]
+    for i in range(1, len(xs)):
+        steps = max(1, math.ceil(max(abs(xs[i] - xs[i - 1]), abs(ys[i] - ys[i - 1]))))
+        for step in range(1, steps + 1):
+            t = step / steps
+            samples.append((xs[i - 1] + (xs[i] - xs[i - 1]) * t, ys[i - 1] + (ys[i] - ys[i - 1]) * t))
+    for px, py in samples:
+        px, py = math.floor(px), math.floor(py)
+        if 0 <= px < TILE_SIZE and 0 <= py < TILE_SIZE:
+            pixels.add(py * TILE_SIZE + px)
+    return list(pixels)
+
+
+def ramp_color(count):
+    """(r, g, b, a) for the number of rides through a pixel"""
+    position = min(1.0, math.log1p(count - 1) / math.log1p(HEAT_SATURATION_RIDES - 1))
+    for (p0, *c0), (p1, *c1) in zip(HEAT_RAMP, HEAT_RAMP[1:]):
+        if position <= p1:
+            t = (position - p0) / (p1 - p0)
+            return tuple(round(a + (b - a) * t) for a, b in zip(c0, c1))
+    return tuple(HEAT_RAMP[-1][1:])
+
+
+# Colors for every count up to saturation; counts beyond share the last one
+COLORS = [(0, 0, 0, 0)] + [ramp_color(count) for count in range(1, HEAT_SATURATION_RIDES + 1)]
+
+
+def encode_png(rgba):
+    """PNG file bytes of TILE_SIZE x TILE_SIZE RGBA pixel bytes"""
+    stride = TILE_SIZE * 4
+    raw = b''.join(b'\x00' + rgba[row * stride:(row + 1) * stride] for row in range(TILE_SIZE))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', TILE_SIZE, TILE_SIZE, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, PNG_COMPRESSION))
+            + chunk(b'IEND', b''))
+
+
+def colorize(counts):
+    """RGBA bytes of a grid of ride counts"""
+    if np is not None:
+        palette = np.array(COLORS, dtype=np.uint8)
+        return palette[np.minimum(counts, HEAT_SATURATION_RIDES)].tobytes()
+    return b''.join(bytes(COLORS[min(count, HEAT_SATURATION_RIDES)]) for count in counts)
+
+
+def rides_in_tile(conn, z, x, y):
+    """ride_id and point_count of the finished rides whose segments overlap a tile"""
+    min_lat, min_lon, max_lat, max_lon = tile_bounds(z, x, y, TILE_MARGIN_PX)
+    return conn.execute("""
+        SELECT r.ride_id, r.point_count FROM rides r
+        WHERE r.active = 0 AND r.ride_id IN (
+            SELECT ride_id FROM track_segments
+            WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?
+        )
+    """, (min_lat, max_lat, min_lon, max_lon)).fetchall()
+
+
+def ride_level(conn, ride_id, zoom, source_points):
+    """A finished ride's simplified points for a zoom, building its levels on first use"""
+    zoom = max(MIN_ZOOM, min(zoom, FULL_DETAIL_ZOOM - 1))
+    level = load_track_level(conn, ride_id, zoom, None, source_points)
+    if level is None:
+        build_track_levels(conn, ride_id, source_points)
+        conn.commit()
+        level = load_track_level(conn, ride_id, zoom, None, source_points)
+    return level[2] if level else []
+
+
+def render_tile(conn, z, x, y):
+    """PNG bytes of the heat tile z/x/y"""
+    if np is not None:
+        counts = np.zeros(TILE_SIZE * TILE_SIZE, dtype=np.int32)
+    else:
+        counts = [0] * (TILE_SIZE * TILE_SIZE)
+
+    for ride_id, point_count in rides_in_tile(conn, z, x, y):
+        points = ride_level(conn, ride_id, z, point_count)
+        if not points:
+            continue
+        pixels = line_pixels(*tile_pixels(points, z, x, y))
+        if np is not None:
+            counts[pixels] += 1
+        else:
+            for pixel in pixels:
+                counts[pixel] += 1
+
+    return encode_png(colorize(counts))
+
+
+def tile_generation(conn):
+    """Name of the current tile generation - changes whenever a ride is
+    finished, added or removed"""
+    row = conn.execute(
+        "SELECT COUNT(*), MAX(end_time), TOTAL(point_count) FROM rides WHERE active = 0"
+    ).fetchone()
+    return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()[:12]
+
+
+class TileCache:
+    """On-disk cache of rendered tiles, one directory per generation"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self.generation = None
+
+    def tile_path(self, generation, z, x, y):
+        return self.cache_dir / generation / str(z) / str(x) / f"{y}.png"
+
+    def get(self, conn, z, x, y):
+        """Path of the tile's PNG, rendering it if this generation hasn't yet"""
+        generation = tile_generation(conn)
+        if generation != self.generation:
+            self.prune(generation)
+            self.generation = generation
+
+        path = self.tile_path(generation, z, x, y)
+        if not path.exists():
+            png = render_tile(conn, z, x, y)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so a concurrent request never reads half a tile
+            partial = path.with_suffix(f".{id(png)}.tmp")
+            partial.write_bytes(png)
+            partial.replace(path)
+        return path
+
+    def prune(self, keep):
+        """Remove every generation but keep"""
+        if not self.cache_dir.exists():
+            return
+        for entry in self.cache_dir.iterdir():
+            if entry.is_dir() and entry.name != keep:
+                shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Time-Bucketed Telemetry History
+Downsamples any window of telemetry_data to a fixed number of evenly spaced
+buckets in one aggregate query, so a chart always spans the whole window it
+asked for at a cost bounded by the window's rows, not by a row LIMIT
+
+Each bucket carries its sample count, last sample (position, speed and
+lateral/longitudinal acceleration), min/max/average speed and peak lean
+angle. A sample belongs to the bucket its whole-millisecond offset from the
+window start falls in; the window includes its start and excludes its end. Empty buckets (bike parked, no fix) are left out.
+
+The window is found through idx_telemetry_time. Stored timestamps are UTC
+but written with either a 'T' or a ' ' date separator, so the index range
+is widened to cover both spellings and julianday() does the exact cut.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+
+from ride_stats import ACCEL_SCALE
+
+# History configuration
+HISTORY_BUCKETS = 500         # Buckets returned when the caller doesn't ask
+MAX_HISTORY_BUCKETS = 2000
+SECONDS_PER_DAY = 86400.0
+
+BUCKET_SQL = """
+    SELECT b.bucket, b.samples, t.timestamp, t.latitude, t.longitude, t.speed_mph, t.ax, t.ay,
+           b.min_speed, b.max_speed, b.avg_speed, b.max_lateral
+    FROM (
+        SELECT offset_ms * :buckets / :span_ms AS bucket,
+               COUNT(*) AS samples, MAX(id) AS last_id,
+               MIN(speed_mph) AS min_speed, MAX(speed_mph) AS max_speed, AVG(speed_mph) AS avg_speed,
+               MAX(ABS(ay)) AS max_lateral
+        FROM (
+            SELECT rowid AS id, speed_mph, ay,
+                   CAST(ROUND((julianday(timestamp) - :start) * 86400000) AS INTEGER) AS offset_ms
+            FROM telemetry_data
+            WHERE timestamp >= :lower AND timestamp <= :upper
+            AND latitude IS NOT NULL AND latitude != 0 AND longitude != 0
+        )
+        WHERE offset_ms >= 0 AND offset_ms < :span_ms
+        GROUP BY bucket
+    ) b
+    JOIN telemetry_data t ON t.rowid = b.last_id
+    ORDER BY b.bucket
+"""
+
+
+def julian_day(moment):
+    return moment.timestamp() / SECONDS_PER_DAY + 2440587.5
+
+
+def lean_degrees(lateral):
+    """Lean angle of a raw lateral accelerometer reading, as ride_stats computes it"""
+    if lateral is None:
+        return None
+    return math.degrees(math.asin(max(-1.0, min(1.0, lateral / ACCEL_SCALE))))
+
+
+def bucket_window(conn, start, end, buckets=HISTORY_BUCKETS):
+    """Summaries of the samples in [start, end) (UTC datetimes) in `buckets`
+    equal slices, oldest first; returns (bucket seconds, list of dicts)"""
+    buckets = max(1, min(int(buckets), MAX_HISTORY_BUCKETS))
+    span_ms = round((end - start).total_seconds() * 1000)
+    if span_ms <= 0:
+        return 0.0, []
+    width = span_ms / 1000 / buckets
+
+    # Bucket on whole milliseconds from the start - a float division would
+    # put samples on a bucket boundary into the bucket before it
+    rows = conn.execute(BUCKET_SQL, {
+        'start': julian_day(start),
+        'span_ms': span_ms,
+        'buckets': buckets,
+        # ' ' sorts before 'T', so these bracket both spellings of the window
+        'lower': start.astimezone(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        'upper': end.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f~'),
+    }).fetchall()
+
+    summaries = []
+    for (bucket, samples, timestamp, lat, lon, last_speed, ax, ay,
+         min_speed, max_speed, avg_speed, max_lateral) in rows:
+        max_lean = lean_degrees(max_lateral)
+        summaries.append({
+            'start': (start + timedelta(milliseconds=bucket * span_ms / buckets)).isoformat(),
+            'timestamp': timestamp,
+            'lat': lat,
+            'lon': lon,
+            'last_speed': last_speed,
+            'ax': ax,
+            'ay': ay,
+            'speed': round(avg_speed, 1) if avg_speed is not None else None,
+            'min_speed': min_speed,
+            'max_speed': max_speed,
+            'max_lean': round(max_lean, 1) if max_lean is not None else None,
+            'samples': samples,
+        })
+    return width, summaries
+
+
+def bucket_recent(conn, seconds, buckets=HISTORY_BUCKETS, now=None):
+    """bucket_window over the last `seconds` up to now"""
+    end = now or datetime.now(timezone.utc)
+    return bucket_window(conn, end - timedelta(seconds=seconds), end, buckets)
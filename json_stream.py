@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Streaming JSON Responses
+Serializes query results into a JSON response chunk by chunk as the cursor
+is read, so a long ride never sits in memory as a list of dicts and the
+client gets the first bytes while the rest is still being fetched
+
+A response is an opening text (the object fields before the array), the
+array items encoded a chunk of rows at a time, and a closing text that may
+depend on the item count - e.g. a point_count trailer after the points.
+"""
+
+import json
+from itertools import islice
+
+from flask import Response
+
+# Streaming configuration
+STREAM_CHUNK_ROWS = 1000   # Rows fetched and encoded per chunk
+SEPARATORS = (',', ':')
+
+
+def dumps(value):
+    return json.dumps(value, separators=SEPARATORS)
+
+
+def chunked(rows, size=STREAM_CHUNK_ROWS):
+    """Lists of up to size rows from a cursor (via fetchmany) or any iterable"""
+    if hasattr(rows, 'fetchmany'):
+        while True:
+            chunk = rows.fetchmany(size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, size))
+            if not chunk:
+                return
+            yield chunk
+
+
+def open_object(fields, key):
+    """JSON text of an object's fields up to the value of key"""
+    text = dumps(fields)[:-1]
+    return text + (',' if fields else '') + dumps(key) + ':'
+
+
+def close_object(fields=None):
+    """JSON text of an object's trailing fields and closing brace"""
+    return ',' + dumps(fields)[1:] if fields else '}'
+
+
+def stream_array(chunks, to_item, prefix='', suffix=''):
+    """Yield prefix, a JSON array of to_item(row) for every row in chunks, then
+    suffix - or suffix(count) when it needs the number of items"""
+    yield prefix + '['
+    count = 0
+    for chunk in chunks:
+        items = dumps([to_item(row) for row in chunk])[1:-1]
+        yield (',' + items) if count else items
+        count += len(chunk)
+    yield ']' + (suffix(count) if callable(suffix) else suffix)
+
+
+def stream_response(text, on_close=None, status=200):
+    """Flask response sending generated JSON text as it is produced;
+    on_close (e.g. the cursor's connection.close) runs once it is sent"""
+    response = Response(text, status=status, mimetype='application/json')
+    if on_close:
+        response.call_on_close(on_close)
+    return response
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Adaptive Live Update Streams
+Per-client Socket.IO telemetry streams for the dashboard: each client
+negotiates its own update rate and encoding, receives only the fields that
+changed since its last update, and acknowledges every update so the server
+can pace a slow link without holding back the others
+
+Protocol:
+    client -> 'subscribe' {rate: Hz, format: 'json' | 'binary'}
+              acknowledged with the settings granted {rate, format, events}
+    server -> 'telemetry_delta', acknowledged by the client (no arguments)
+    client -> 'resync'  next update carries the full state again
+
+A JSON update is {seq, full, changes: {section: {field: value}}}. In binary
+format a full update is the same JSON plus `fields`, the table of
+"section.field" names; later updates that only touch known fields are bytes:
+    u32 seq, u16 change count, then per change
+    u8 field index, u8 type ('n' null, 't'/'f' bool, 'i' i32, 'e' f32,
+    'd' f64, 's' u16 length + UTF-8, 'j' u16 length + JSON)
+
+Changes are relative to the last update the client acknowledged and carry
+absolute values, so applying one twice is harmless and an update that is
+lost is resent as part of the next. A binary field table only replaces the
+client's once the full update carrying it is acknowledged.
+
+At most one update per client is unacknowledged at a time; the interval
+between updates is the client's requested one, stretched to a multiple of
+its smoothed round-trip time, and doubled after an update goes
+unacknowledged for ACK_TIMEOUT.
+"""
+
+import json
+import time
+import struct
+import threading
+
+# Live update configuration
+LIVE_EVENT = 'telemetry_delta'
+LIVE_FORMATS = ('json', 'binary')
+MIN_RATE = 0.1                # Hz
+DEFAULT_RATE = 2.0            # Hz, when a client doesn't ask
+ACK_TIMEOUT = 5.0             # Seconds before an update counts as lost
+RTT_SMOOTHING = 0.25          # Weight of each new round-trip sample
+RTT_INTERVALS = 2.0           # Interval is at least this many round trips
+MAX_INTERVAL = 30.0           # Seconds - slowest a backed-off client gets
+
+DELTA_HEADER = struct.Struct('<IH')
+FLOAT32 = struct.Struct('<f')
+
+
+def flatten(state):
+    """{'section.field': value} of a {section: {field: value}} state"""
+    return {f"{section}.{field}": value
+            for section, fields in state.items() for field, value in fields.items()}
+
+
+def nest(flat):
+    nested = {}
+    for name, value in flat.items():
+        section, field = name.split('.', 1)
+        nested.setdefault(section, {})[field] = value
+    return nested
+
+
+def encode_value(value):
+    if value is None:
+        return b'n'
+    if isinstance(value, bool):
+        return b't' if value else b'f'
+    if isinstance(value, int) and -2**31 <= value < 2**31:
+        return b'i' + struct.pack('<i', value)
+    if isinstance(value, float):
+        # float32 when it keeps the value to the dashboards' 3 decimals
+        narrowed = FLOAT32.unpack(FLOAT32.pack(value))[0]
+        if round(narrowed, 3) == round(value, 3):
+            return b'e' + FLOAT32.pack(value)
+        return b'd' + struct.pack('<d', value)
+    if isinstance(value, str):
+        data = value.encode()
+        return b's' + struct.pack('<H', len(data)) + data
+    data = json.dumps(value, separators=(',', ':')).encode()
+    return b'j' + struct.pack('<H', len(data)) + data
+
+
+def encode_delta(seq, changes, fields):
+    """Binary update of changed values, by index into the field table"""
+    parts = [DELTA_HEADER.pack(seq, len(changes))]
+    for name, value in changes.items():
+        parts.append(bytes((fields[name],)) + encode_value(value))
+    return b''.join(parts)
+
+
+class LiveClient:
+    """Stream state of one subscribed client. Updates are diffed against the
+    last state the client acknowledged, so one that is lost (or acknowledged
+    too late) is covered by the next, which resends its changes"""
+
+    def __init__(self, sid, rate, encoding):
+        self.sid = sid
+        self.interval = 1.0 / rate
+        self.encoding = encoding
+        self.backoff = 1.0
+        self.acked_state = {}    # Flattened state as of the last acknowledged update
+        self.fields = {}         # Binary field table the client has acknowledged, name -> index
+        self.seq = 0
+        self.in_flight = None    # (seq, monotonic time sent, flattened state, field table)
+        self.rtt = None
+        self.next_send = 0.0
+        self.stats = {'updates': 0, 'bytes': 0, 'acks': 0, 'timeouts': 0}
+
+    def effective_interval(self):
+        interval = self.interval
+        if self.rtt is not None:
+            interval = max(interval, self.rtt * RTT_INTERVALS)
+        return min(MAX_INTERVAL, interval * self.backoff)
+
+    def due(self, now):
+        if self.in_flight:
+            if now - self.in_flight[1] < ACK_TIMEOUT:
+                return False
+            # Lost, or the link is that slow - back off rather than pile up
+            if self.in_flight[3] is not self.fields:
+                # It carried a new field table the client may or may not have - start over
+                self.acked_state = {}
+            self.in_flight = None
+            self.stats['timeouts'] += 1
+            self.backoff = min(self.backoff * 2, MAX_INTERVAL / self.interval)
+        return now >= self.next_send
+
+    def update(self, flat, now):
+        """Payload of the next update, or None if nothing changed since the
+        last acknowledged one"""
+        changes = {name: value for name, value in flat.items()
+                   if name not in self.acked_state or self.acked_state[name] != value}
+        if not changes:
+            return None
+        full = not self.acked_state
+        self.seq += 1
+        fields = self.fields
+
+        if self.encoding == 'json':
+            payload = {'seq': self.seq, 'full': full, 'changes': nest(flat if full else changes)}
+        elif not full and all(name in fields for name in changes):
+            payload = encode_delta(self.seq, changes, fields)
+        else:
+            # A field the client has no acknowledged index for - resend everything with a new table
+            names = sorted(flat)[:256]
+            fields = {name: i for i, name in enumerate(names)}
+            payload = {'seq': self.seq, 'full': True, 'changes': nest(flat), 'fields': names}
+
+        self.in_flight = (self.seq, now, dict(flat), fields)
+        self.next_send = now + self.effective_interval()
+        self.stats['updates'] += 1
+        self.stats['bytes'] += len(payload) if isinstance(payload, bytes) else len(json.dumps(payload))
+        return payload
+
+    def acked(self, seq, now):
+        if not self.in_flight or self.in_flight[0] != seq:
+            return
+        _, sent_at, self.acked_state, self.fields = self.in_flight
+        sample = now - sent_at
+        self.rtt = sample if self.rtt is None else self.rtt + RTT_SMOOTHING * (sample - self.rtt)
+        self.in_flight = None
+        self.stats['acks'] += 1
+        self.backoff = max(1.0, self.backoff / 2)
+        self.next_send = max(self.next_send, sent_at + self.effective_interval())
+
+    def resync(self):
+        """Send the full state (and a new field table) next"""
+        self.acked_state = {}
+        self.fields = {}
+        self.in_flight = None
+        self.next_send = 0.0
+
+    def get_stats(self):
+        return dict(self.stats, rate=round(1.0 / self.effective_interval(), 2), format=self.encoding,
+                    rtt_ms=round(self.rtt * 1000, 1) if self.rtt is not None else None)
+
+
+class LiveUpdates:
+    """Subscribed clients and the pacing of their updates"""
+
+    def __init__(self, max_rate):
+        self.max_rate = max_rate
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, sid, options):
+        """Register a client; returns the settings granted"""
+        options = options if isinstance(options, dict) else {}
+        try:
+            rate = float(options.get('rate', DEFAULT_RATE))
+        except (TypeError, ValueError):
+            rate = DEFAULT_RATE
+        if not rate > 0:
+            rate = DEFAULT_RATE
+        rate = max(MIN_RATE, min(rate, self.max_rate))
+        encoding = options.get('format', 'json')
+        if encoding not in LIVE_FORMATS:
+            encoding = 'json'
+        with self.lock:
+            self.clients[sid] = LiveClient(sid, rate, encoding)
+        return {'rate': rate, 'format': encoding, 'events': LIVE_EVENT}
+
+    def remove(self, sid):
+        with self.lock:
+            return self.clients.pop(sid, None) is not None
+
+    def resync(self, sid):
+        with self.lock:
+            client = self.clients.get(sid)
+            if client:
+                client.resync()
+
+    def publish(self, state, send):
+        """Send each due client its update through send(sid, payload, on_ack)"""
+        flat = flatten(state)
+        now = time.monotonic()
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            with self.lock:
+                if not client.due(now):
+                    continue
+                payload = client.update(flat, now)
+            if payload is not None:
+                send(client.sid, payload, self.ack_callback(client, client.seq))
+
+    def ack_callback(self, client, seq):
+        def on_ack(*args):
+            with self.lock:
+                client.acked(seq, time.monotonic())
+        return on_ack
+
+    def get_stats(self):
+        with self.lock:
+            return {sid: client.get_stats() for sid, client in self.clients.items()}
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Load Test for the Flask Services
+Runs concurrent dashboard-style clients against the route tracker or the
+dashboard and reports requests per second and latency percentiles per
+endpoint
+
+Either points at a running service (--url) or starts one itself (--start)
+on the benchmark suite's synthetic data, so the production and development
+servers can be compared:
+
+    python benchmark_suite.py --quick --only route     # builds the dataset
+    python load_test.py --start route_tracker --clients 32
+    python load_test.py --start route_tracker --clients 32 --dev
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+REPO_DIR = Path(__file__).resolve().parent
+BENCH_DIR = Path(os.environ.get('MOTO_BENCH_DIR', '/tmp/motorcycle_bench'))
+
+# Load test configuration
+DEFAULT_CLIENTS = 16
+DEFAULT_DURATION = 20.0     # Seconds
+REQUEST_TIMEOUT = 30.0      # Seconds before a request counts as an error
+STARTUP_TIMEOUT = 30.0      # Seconds to wait for a started service to answer
+
+# Endpoint mixes, as a dashboard client polls them
+PRESETS = {
+    'route_tracker': [
+        '/api/tracking_status',
+        '/api/current_ride_track',
+        '/api/rides',
+        '/api/ride/{ride_id}/track?zoom=12',
+    ],
+    'dashboard': [
+        '/api/telemetry',
+        '/api/gps_history?hours=1',
+    ],
+}
+SCRIPTS = {'route_tracker': 'route_tracker.py', 'dashboard': 'motorcycle_dashboard_app.py'}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_service(name, data_dir, dev=False):
+    """Start a service on a free port; returns (process, base url)"""
+    port = free_port()
+    command = [sys.executable, str(REPO_DIR / SCRIPTS[name]), '--port', str(port)]
+    if dev:
+        command.append('--dev')
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=dict(os.environ, MOTO_DATA_DIR=str(data_dir)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{SCRIPTS[name]} exited with {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{SCRIPTS[name]} didn't start listening within {STARTUP_TIMEOUT} s")
+
+
+def fetch(url, timeout=REQUEST_TIMEOUT):
+    """(status, bytes read) of a GET, status 0 on a connection error"""
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, 0
+    except (OSError, urllib.error.URLError):
+        return 0, 0
+
+
+def resolve_paths(base_url, paths):
+    """Fill {ride_id} placeholders with a finished ride from /api/rides"""
+    if not any('{ride_id}' in path for path in paths):
+        return paths
+    with urllib.request.urlopen(base_url + '/api/rides', timeout=REQUEST_TIMEOUT) as response:
+        rides = json.load(response).get('rides', [])
+    finished = [ride['ride_id'] for ride in rides if not ride.get('active')]
+    if not finished:
+        return [path for path in paths if '{ride_id}' not in path]
+    return [path.format(ride_id=finished[0]) for path in paths]
+
+
+class Client(threading.Thread):
+    """One simulated dashboard cycling through the endpoints"""
+
+    def __init__(self, base_url, paths, stop_at, think, offset):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.paths = paths
+        self.stop_at = stop_at
+        self.think = think
+        self.offset = offset
+        self.results = []        # (path, seconds, status, bytes)
+
+    def run(self):
+        i = self.offset
+        while time.monotonic() < self.stop_at:
+            path = self.paths[i % len(self.paths)]
+            started = time.perf_counter()
+            status, size = fetch(self.base_url + path)
+            self.results.append((path, time.perf_counter() - started, status, size))
+            i += 1
+            if self.think:
+                time.sleep(self.think)
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def summarize(results, elapsed):
+    """{path: stats} plus an 'all' entry"""
+    by_path = {}
+    for path, seconds, status, size in results:
+        by_path.setdefault(path, []).append((seconds, status, size))
+    by_path['all'] = [(seconds, status, size) for _, seconds, status, size in results]
+
+    summary = {}
+    for path, entries in by_path.items():
+        ok = sorted(seconds for seconds, status, _ in entries if status == 200)
+        summary[path] = {
+            'requests': len(entries),
+            'errors': sum(1 for _, status, _ in entries if status != 200),
+            'rps': round(len(ok) / elapsed, 1),
+            'p50_ms': round(percentile(ok, 0.50) * 1000, 1) if ok else None,
+            'p95_ms': round(percentile(ok, 0.95) * 1000, 1) if ok else None,
+            'p99_ms': round(percentile(ok, 0.99) * 1000, 1) if ok else None,
+            'max_ms': round(ok[-1] * 1000, 1) if ok else None,
+        }
+    return summary
+
+
+def run_load(base_url, paths, clients, duration, think):
+    stop_at = time.monotonic() + duration
+    workers = [Client(base_url, paths, stop_at, think, offset) for offset in range(clients)]
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.monotonic() - started
+    return summarize([result for worker in workers for result in worker.results], elapsed)
+
+
+def print_summary(summary):
+    print(f"   {'endpoint':<42} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8} {'errors':>7}")
+    for path, stats in summary.items():
+        def ms(value):
+            return f"{value:.1f}" if value is not None else '-'
+        print(f"   {path[:42]:<42} {stats['rps']:>8.1f} {ms(stats['p50_ms']):>8} {ms(stats['p95_ms']):>8} "
+              f"{ms(stats['p99_ms']):>8} {ms(stats['max_ms']):>8} {stats['errors']:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the route tracker or dashboard')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--url', help='Base URL of a running service')
+    target.add_argument('--start', choices=sorted(SCRIPTS), help='Start this service on the benchmark data')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Endpoint mix (default: the started service)')
+    parser.add_argument('--path', action='append', help='Endpoint to request (repeatable, replaces the preset)')
+    parser.add_argument('--clients', type=int, default=DEFAULT_CLIENTS, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Seconds to run')
+    parser.add_argument('--think', type=float, default=0.0, help='Seconds each client waits between requests')
+    parser.add_argument('--dev', action='store_true', help="Start the service on its development server")
+    parser.add_argument('--data-dir', default=str(BENCH_DIR / 'quick'), help='MOTO_DATA_DIR for --start')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    args = parser.parse_args()
+
+    paths = args.path or PRESETS[args.preset or args.start or 'route_tracker']
+    process = None
+    if args.start:
+        if not (Path(args.data_dir) / 'telemetry.db').exists():
+            sys.exit(f"❌ No database in {args.data_dir} - run benchmark_suite.py first")
+        process, base_url = start_service(args.start, args.data_dir, args.dev)
+        print(f"🚀 Started {SCRIPTS[args.start]} ({'development' if args.dev else 'production'} server) at {base_url}")
+    else:
+        base_url = args.url.rstrip('/')
+
+    try:
+        paths = resolve_paths(base_url, paths)
+        print(f"🔥 {args.clients} clients for {args.duration:.0f} s against {base_url}")
+        summary = run_load(base_url, paths, args.clients, args.duration, args.think)
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print_summary(summary)
+    sys.exit(1 if summary['all']['errors'] else 0)
+
+
+if __name__ == "__main__":
+    main()
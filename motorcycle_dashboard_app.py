@@ -5,31 +5,80 @@ Replaces Node-RED with a clean, remote-accessible dashboard
 """
 
 from flask import Flask, render_template, jsonify, request, Response
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import sqlite3
 import json
 import math
 import threading
 import time
-from datetime import datetime, timedelta
-import subprocess
+from datetime import datetime, timedelta, timezone
 import os
 import requests
-import shutil
+import argparse
+
+from telemetry_ring import open_reader, RING_STALE_AFTER
+from telemetry_hub import HubSubscriber
+from system_status import StatusCollector
+from telemetry_metrics import read_metrics, session_counts
+from history_buckets import HISTORY_BUCKETS, bucket_recent
+from live_updates import LIVE_EVENT, LiveUpdates
+from wsgi_server import serve
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'motorcycle_dashboard_2025'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
 # Configuration
-DATABASE_PATH = '/home/pi/motorcycle_data/telemetry.db'
+DATABASE_PATH = os.path.join(os.environ.get('MOTO_DATA_DIR', '/home/pi/motorcycle_data'), 'telemetry.db')
 UPDATE_INTERVAL = 2  # seconds
+CAMERA_URL = 'http://localhost:8090'
+CAMERA_TIMEOUT = (3, 10)  # Connect / read seconds, so a stalled camera frees its worker
+SERVER_PORT = 3000
+SERVER_THREADS = 32       # Each open Socket.IO connection and camera stream holds one
+MAX_HISTORY_HOURS = 24 * 31  # Longest /api/gps_history window
+LIVE_UPDATE_RATE = 10     # Hz - most samples pushed to subscribed browsers while the telemetry hub runs
+FULL_UPDATE_ROOM = 'telemetry_update'  # Clients that haven't subscribed get the full state every UPDATE_INTERVAL
+
+def sample_row(sample):
+    """Live sample dict as an (ax, ay, az, latitude, longitude, speed, gps_fix, timestamp) row"""
+    timestamp = datetime.fromtimestamp(sample['t_wall'], timezone.utc).isoformat()
+    return (
+        sample['ax'], sample['ay'], sample['az'],
+        sample['latitude'] or 0, sample['longitude'] or 0,
+        sample['speed_mph'] or 0, sample['gps_fix'], timestamp
+    )
+
+# Service, record-count and storage figures, refreshed in the background
+status_collector = StatusCollector(DATABASE_PATH)
 
 class TelemetryData:
     def __init__(self):
         self.latest_data = {}
         self.gps_status = {}
         self.system_status = {}
+        self.ring = None
+        
+    def read_latest_sample(self, cursor):
+        """Latest (ax, ay, az, latitude, longitude, speed, gps_fix, timestamp) row,
+        from the collector's live ring when it is still publishing, else from SQLite"""
+        if self.ring is None:
+            self.ring = open_reader()
+        if self.ring:
+            sample = self.ring.latest_sample(max_age=RING_STALE_AFTER)
+            if sample:
+                return sample_row(sample)
+        
+        cursor.execute('''
+            SELECT ax, ay, az, 
+                   COALESCE(latitude, 0) as latitude, 
+                   COALESCE(longitude, 0) as longitude, 
+                   COALESCE(speed_mph, 0) as speed_mph, 
+                   COALESCE(gps_fix, 0) as gps_fix, 
+                   timestamp 
+            FROM telemetry_data 
+            ORDER BY timestamp DESC LIMIT 1
+        ''')
+        return cursor.fetchone()
         
     def get_latest_telemetry(self):
         """Get latest telemetry data from database"""
@@ -38,140 +87,97 @@ class TelemetryData:
             cursor = conn.cursor()
             
             # Get latest telemetry record
-            cursor.execute('''
-                SELECT ax, ay, az, 
-                       COALESCE(latitude, 0) as latitude, 
-                       COALESCE(longitude, 0) as longitude, 
-                       COALESCE(speed_mph, 0) as speed_mph, 
-                       COALESCE(gps_fix, 0) as gps_fix, 
-                       timestamp 
-                FROM telemetry_data 
-                ORDER BY timestamp DESC LIMIT 1
-            ''')
-            
-            row = cursor.fetchone()
+            row = self.read_latest_sample(cursor)
             if row:
-                ax, ay, az, lat, lon, speed, gps_fix, timestamp = row
-                
-                # Calculate G-forces and lean angle
-                X_OFFSET, Y_OFFSET, Z_OFFSET = 0, 0, 0
-                SCALE = 16384
-                
-                forward_g = (ax - X_OFFSET) / SCALE
-                lateral_g = (ay - Y_OFFSET) / SCALE
-                vertical_g = (az - Z_OFFSET) / SCALE
-                
-                # Calculate lean angle in degrees
-                lean_angle = math.asin(max(-1, min(1, lateral_g))) * 57.3
-                
-                # GPS status
-                has_valid_coords = (lat != 0 and lon != 0)
-                has_gps_fix = bool(gps_fix)
-                has_valid_gps = has_valid_coords and has_gps_fix
-                
-                # Data age - handle UTC timestamps properly
-                try:
-                    from datetime import timezone
-                    if timestamp.endswith('+00:00'):
-                        data_time = datetime.fromisoformat(timestamp)
-                        # Convert to local time for comparison
-                        data_age = (datetime.now(timezone.utc) - data_time).total_seconds()
-                    else:
-                        # Handle timestamps without timezone info
-                        data_time = datetime.fromisoformat(timestamp)
-                        data_age = (datetime.now() - data_time).total_seconds()
-                except:
-                    data_age = 0
-                
-                self.latest_data = {
-                    'lean_angle': round(lean_angle, 1),
-                    'forward_g': round(forward_g, 3),
-                    'lateral_g': round(lateral_g, 3),
-                    'vertical_g': round(vertical_g, 3),
-                    'speed': round(speed, 1),
-                    'latitude': lat,
-                    'longitude': lon,
-                    'gps_fix': gps_fix,
-                    'timestamp': timestamp,
-                    'data_age': round(data_age, 1)
-                }
-                
-                self.gps_status = {
-                    'has_gps': has_valid_gps,
-                    'has_gps_fix': has_gps_fix,
-                    'has_valid_coords': has_valid_coords,
-                    'status_text': 'GPS Lock Acquired' if has_valid_gps else 
-                                  ('GPS Fix but Invalid Coordinates' if has_gps_fix else 'No GPS Data - Check Hardware'),
-                    'last_update': data_time.strftime('%H:%M:%S') if 'data_time' in locals() else 'Unknown',
-                    'data_age': round(data_age, 1)
-                }
-            
-            # Get record count for last 5 minutes
-            cursor.execute('''
-                SELECT COUNT(*) FROM telemetry_data 
-                WHERE timestamp > datetime("now", "-5 minutes")
-            ''')
-            recent_count = cursor.fetchone()[0]
-            
-            # Get total record count
-            cursor.execute('SELECT COUNT(*) FROM telemetry_data')
-            total_count = cursor.fetchone()[0]
-            
-            # Get storage information
-            total, used, free = shutil.disk_usage('/')
-            storage_used_gb = used / (1024**3)
-            storage_free_gb = free / (1024**3)
-            storage_total_gb = total / (1024**3)
-            storage_percent = (used / total) * 100
-            
-            # Get database size
-            db_size_mb = 0
-            try:
-                db_stat = os.stat(DATABASE_PATH)
-                db_size_mb = db_stat.st_size / (1024**2)
-            except:
-                pass
-
-            self.system_status = {
-                'recent_records': recent_count,
-                'total_records': total_count,
-                'data_rate': round(recent_count / 5, 1) if recent_count > 0 else 0,
-                'status': 'Active' if data_age < 10 else ('Delayed' if data_age < 30 else 'Stalled'),
-                'last_update': self.latest_data.get('timestamp', 'Unknown'),
-                'storage_used_gb': round(storage_used_gb, 1),
-                'storage_free_gb': round(storage_free_gb, 1),
-                'storage_total_gb': round(storage_total_gb, 1),
-                'storage_percent': round(storage_percent, 1),
-                'database_size_mb': round(db_size_mb, 1)
-            }
+                self.apply_sample(row)
             
             conn.close()
+            self.update_system_status()
             return True
             
         except Exception as e:
             print(f"Database error: {e}")
             return False
+            
+    def apply_sample(self, row):
+        """Derive the live telemetry and GPS status from a sample row"""
+        ax, ay, az, lat, lon, speed, gps_fix, timestamp = row
+        
+        # Calculate G-forces and lean angle
+        X_OFFSET, Y_OFFSET, Z_OFFSET = 0, 0, 0
+        SCALE = 16384
+        
+        forward_g = (ax - X_OFFSET) / SCALE
+        lateral_g = (ay - Y_OFFSET) / SCALE
+        vertical_g = (az - Z_OFFSET) / SCALE
+        
+        # Calculate lean angle in degrees
+        lean_angle = math.asin(max(-1, min(1, lateral_g))) * 57.3
+        
+        # GPS status
+        has_valid_coords = (lat != 0 and lon != 0)
+        has_gps_fix = bool(gps_fix)
+        has_valid_gps = has_valid_coords and has_gps_fix
+        
+        # Data age - handle UTC timestamps properly
+        try:
+            if timestamp.endswith('+00:00'):
+                data_time = datetime.fromisoformat(timestamp)
+                # Convert to local time for comparison
+                data_age = (datetime.now(timezone.utc) - data_time).total_seconds()
+            else:
+                # Handle timestamps without timezone info
+                data_time = datetime.fromisoformat(timestamp)
+                data_age = (datetime.now() - data_time).total_seconds()
+        except:
+            data_age = 0
+        
+        self.latest_data = {
+            'lean_angle': round(lean_angle, 1),
+            'forward_g': round(forward_g, 3),
+            'lateral_g': round(lateral_g, 3),
+            'vertical_g': round(vertical_g, 3),
+            'speed': round(speed, 1),
+            'latitude': lat,
+            'longitude': lon,
+            'gps_fix': gps_fix,
+            'timestamp': timestamp,
+            'data_age': round(data_age, 1)
+        }
+        
+        self.gps_status = {
+            'has_gps': has_valid_gps,
+            'has_gps_fix': has_gps_fix,
+            'has_valid_coords': has_valid_coords,
+            'status_text': 'GPS Lock Acquired' if has_valid_gps else 
+                          ('GPS Fix but Invalid Coordinates' if has_gps_fix else 'No GPS Data - Check Hardware'),
+            'last_update': data_time.strftime('%H:%M:%S') if 'data_time' in locals() else 'Unknown',
+            'data_age': round(data_age, 1)
+        }
+
+    def update_system_status(self):
+        """Record counts and storage from the status collector's snapshot"""
+        data_age = self.latest_data.get('data_age', float('inf'))
+        status = status_collector.snapshot()
+        recent_count = status['recent_records']
+        
+        self.system_status = {
+            'recent_records': recent_count,
+            'total_records': status['total_records'],
+            'data_rate': round(recent_count / 5, 1) if recent_count > 0 else 0,
+            'status': 'Active' if data_age < 10 else ('Delayed' if data_age < 30 else 'Stalled'),
+            'last_update': self.latest_data.get('timestamp', 'Unknown'),
+            'storage_used_gb': status['storage_used_gb'],
+            'storage_free_gb': status['storage_free_gb'],
+            'storage_total_gb': status['storage_total_gb'],
+            'storage_percent': status['storage_percent'],
+            'database_size_mb': status['database_size_mb'],
+            'ingest_rates': status['ingest_rates']
+        }
 
     def get_service_status(self):
         """Get system service status"""
-        services = [
-            'motorcycle-telemetry',
-            'gpsd',
-            'gps-proxy',
-            'route-tracker',
-            'tailscaled'
-        ]
-        
-        status = {}
-        for service in services:
-            try:
-                result = subprocess.run(['systemctl', 'is-active', service], 
-                                      capture_output=True, text=True)
-                status[service] = result.stdout.strip() == 'active'
-            except:
-                status[service] = False
-        
-        return status
+        return status_collector.snapshot()['services']
 
 # Global telemetry data instance
 telemetry = TelemetryData()
@@ -193,35 +199,43 @@ def api_telemetry():
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/metrics')
+def api_metrics():
+    """Row counts per session and rolling ingest rates, from the writer's counters"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        try:
+            metrics = read_metrics(conn)
+            if metrics is None:
+                return jsonify({'error': 'Metrics not available - run update_db_schema.py'}), 503
+            metrics['sessions'] = session_counts(conn)
+        finally:
+            conn.close()
+        return jsonify(metrics)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/gps_history')
 def api_gps_history():
-    """API endpoint for GPS track history"""
+    """API endpoint for GPS track history - the whole window in evenly spaced buckets"""
     try:
-        hours = request.args.get('hours', 1, type=int)
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT latitude, longitude, speed_mph, timestamp 
-            FROM telemetry_data 
-            WHERE latitude != 0 AND longitude != 0 
-            AND timestamp > datetime("now", "-{} hours")
-            ORDER BY timestamp DESC
-            LIMIT 1000
-        '''.format(hours))
+        hours = request.args.get('hours', 1, type=float)
+        buckets = request.args.get('buckets', HISTORY_BUCKETS, type=int)
+        if not hours or hours <= 0 or hours > MAX_HISTORY_HOURS:
+            return jsonify({'error': f"hours must be between 0 and {MAX_HISTORY_HOURS}"}), 400
         
-        points = []
-        for row in cursor.fetchall():
-            lat, lon, speed, timestamp = row
-            points.append({
-                'lat': lat,
-                'lon': lon,
-                'speed': speed,
-                'timestamp': timestamp
-            })
+        conn = sqlite3.connect(DATABASE_PATH)
+        try:
+            bucket_seconds, points = bucket_recent(conn, hours * 3600, buckets)
+        finally:
+            conn.close()
         
-        conn.close()
-        return jsonify({'points': points})
+        # Newest first, as the raw rows were
+        return jsonify({
+            'hours': hours,
+            'bucket_seconds': round(bucket_seconds, 3),
+            'points': points[::-1]
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)})
@@ -231,7 +245,7 @@ def camera_stream():
     """Proxy camera stream from camera service"""
     try:
         def generate():
-            response = requests.get('http://localhost:8090/stream.mjpg', stream=True)
+            response = requests.get(f'{CAMERA_URL}/stream.mjpg', stream=True, timeout=CAMERA_TIMEOUT)
             for chunk in response.iter_content(chunk_size=1024):
                 if chunk:
                     yield chunk
@@ -246,7 +260,7 @@ def camera_stream():
 def camera_snapshot():
     """Proxy camera snapshot from camera service"""
     try:
-        response = requests.get('http://localhost:8090/snapshot')
+        response = requests.get(f'{CAMERA_URL}/snapshot', timeout=CAMERA_TIMEOUT)
         return Response(response.content, 
                        status=response.status_code,
                        headers={'Content-Type': 'application/json'})
@@ -254,27 +268,86 @@ def camera_snapshot():
         print(f"Camera snapshot error: {e}")
         return jsonify({'success': False, 'error': str(e)})
 
+# Subscribed clients' paced delta streams
+live_updates = LiveUpdates(max_rate=LIVE_UPDATE_RATE)
+
 @socketio.on('connect')
 def handle_connect():
     """Handle WebSocket connection"""
     print('Client connected')
+    join_room(FULL_UPDATE_ROOM)
     emit('status', {'msg': 'Connected to motorcycle dashboard'})
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Handle WebSocket disconnection"""
+    live_updates.remove(request.sid)
     print('Client disconnected')
 
+@socketio.on('subscribe')
+def handle_subscribe(options=None):
+    """Switch a client from full broadcasts to its own paced delta stream;
+    acknowledged with the rate and format granted"""
+    leave_room(FULL_UPDATE_ROOM)
+    granted = live_updates.subscribe(request.sid, options)
+    print(f"Client subscribed: {granted['rate']} Hz {granted['format']}")
+    return granted
+
+@socketio.on('resync')
+def handle_resync():
+    """Send the client the full state with its next update"""
+    live_updates.resync(request.sid)
+
+@app.route('/api/live_clients')
+def api_live_clients():
+    """Negotiated rate, round-trip time and traffic of each subscribed client"""
+    return jsonify(live_updates.get_stats())
+
+def send_live(sid, payload, on_ack):
+    socketio.emit(LIVE_EVENT, payload, to=sid, callback=on_ack)
+
+def emit_update(broadcast=True):
+    """Pace the subscribed streams, and broadcast the full state to the
+    clients that haven't subscribed when `broadcast` is set"""
+    state = {
+        'telemetry': telemetry.latest_data,
+        'gps_status': telemetry.gps_status,
+        'system_status': telemetry.system_status
+    }
+    if broadcast:
+        socketio.emit('telemetry_update', state, to=FULL_UPDATE_ROOM)
+    live_updates.publish(state, send_live)
+
 def background_updates():
-    """Background thread for real-time updates"""
+    """Background thread for real-time updates - feeds each sample the
+    telemetry hub delivers to the subscribed streams, and polls every
+    UPDATE_INTERVAL while the hub isn't running. The full broadcast goes out
+    every UPDATE_INTERVAL either way."""
+    # A one-sample queue: a slow emit skips straight to the newest sample
+    subscriber = HubSubscriber(name='dashboard', max_rate=LIVE_UPDATE_RATE, queue=1)
+    next_broadcast = 0.0
     while True:
-        if telemetry.get_latest_telemetry():
-            socketio.emit('telemetry_update', {
-                'telemetry': telemetry.latest_data,
-                'gps_status': telemetry.gps_status,
-                'system_status': telemetry.system_status
-            })
-        time.sleep(UPDATE_INTERVAL)
+        if not subscriber.connected and not subscriber.connect():
+            if telemetry.get_latest_telemetry():
+                emit_update()
+            time.sleep(UPDATE_INTERVAL)
+            continue
+        
+        try:
+            sample = subscriber.recv(timeout=UPDATE_INTERVAL)
+        except ConnectionError:
+            continue
+        if sample:
+            try:
+                telemetry.apply_sample(sample_row(sample))
+            except Exception as e:
+                print(f"Live sample error: {e}")
+        telemetry.update_system_status()
+        now = time.monotonic()
+        broadcast = now >= next_broadcast
+        if broadcast:
+            next_broadcast = now + UPDATE_INTERVAL
+        emit_update(broadcast)
 
 # Start background updates
 def start_background_updates():
@@ -283,13 +356,22 @@ def start_background_updates():
     update_thread.start()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Motorcycle Dashboard")
+    parser.add_argument('--port', type=int, default=SERVER_PORT)
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS, help="Worker threads")
+    parser.add_argument('--dev', action='store_true', help="Use the Werkzeug development server")
+    args = parser.parse_args()
+    
     # Create templates directory if it doesn't exist
     os.makedirs('templates', exist_ok=True)
     os.makedirs('static', exist_ok=True)
     
     print("🏍️ Starting Motorcycle Dashboard...")
-    print("📊 Dashboard: http://0.0.0.0:3000")
-    print("🌐 Remote access: http://100.119.155.66:3000")
+    print(f"📊 Dashboard: http://0.0.0.0:{args.port}")
+    print(f"🌐 Remote access: http://100.119.155.66:{args.port}")
     
     start_background_updates()
-    socketio.run(app, host='0.0.0.0', port=3000, debug=False, allow_unsafe_werkzeug=True, log_output=True) 
\ No newline at end of file
+    if args.dev:
+        socketio.run(app, host='0.0.0.0', port=args.port, debug=False, allow_unsafe_werkzeug=True, log_output=True)
+    else:
+        serve(app, host='0.0.0.0', port=args.port, threads=args.threads) 
\ No newline at end of file
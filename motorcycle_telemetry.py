@@ -4,7 +4,10 @@ Enhanced Motorcycle Telemetry System with Cellular GPS
 Records IMU and GPS data during rides using SIM7600G-H cellular module GPS
 """
 
-import qwiic_icm20948
+try:
+    import qwiic_icm20948
+except ImportError:
+    qwiic_icm20948 = None  # Only needed on the bike - replay and simulation run without it
 # from gps3 import gps3  # Replaced with cellular GPS
 import json
 import time
@@ -17,42 +20,94 @@ from datetime import datetime, timezone
 import requests
 import subprocess
 import logging
+import argparse
 from pathlib import Path
 from collections import deque
 
 # Import our cellular GPS interface
-from cellular_gps import CellularGPS
+from cellular_gps import CellularGPS, NMEAStreamGPS
+from telemetry_writer import TelemetryWriter
+from sampling_scheduler import SamplingScheduler
+from imu_fifo import ICM20948Fifo, FIFO_DRAIN_RATE
+from telemetry_ring import TelemetryRingWriter
+from telemetry_hub import TelemetryHub
+from update_db_schema import apply_migrations
+from ride_stats import RideTracker
 
 # Configuration
 DATA_DIR = Path("/home/pi/motorcycle_data")
 DB_PATH = DATA_DIR / "telemetry.db"
 LOG_PATH = DATA_DIR / "telemetry.log"
+ARCHIVE_DIR = DATA_DIR / "archive"
 HOME_WIFI_SSID = "Ncwf1"
 UPLOAD_URL = "http://your-server.com/api/telemetry"
 
+# GPS backend: 'nmea' streams sentences from the SIM7600 NMEA port,
+# 'mmcli' polls ModemManager with a subprocess per reading
+GPS_BACKEND = 'nmea'
+
 # Engine detection parameters
 SAMPLE_RATE = 5            # Hz - REDUCED from 10 to save CPU
 GPS_UPDATE_RATE = 1        # Hz - GPS updates per second
 
+# Scheduler rates - each task runs against its own absolute deadlines
+IMU_SAMPLE_RATE = SAMPLE_RATE   # Hz - IMU reads
+PERSIST_RATE = SAMPLE_RATE      # Hz - samples recorded to the database
+SCHEDULER_STATS_INTERVAL = 60   # Seconds between timing stat log lines
+
+# IMU acquisition: 'poll' reads one sample per tick, 'fifo' drains the
+# ICM-20948 hardware FIFO in bursts and decimates to IMU_SAMPLE_RATE
+IMU_ACQUISITION_MODE = 'poll'
+IMU_TIMESTAMP_MAX_AGE = 1.0     # Seconds a FIFO sample's sensor time stays the sample's t_ns
+
 # Power monitoring
 POWER_CHECK_INTERVAL = 5
 UPS_HAT_PRESENT = False
 
 class MotorcycleTelemetry:
-    def __init__(self):
+    def __init__(self, data_dir=DATA_DIR, imu=None, gps=None, clock=time):
+        # Paths - overridable so replay and simulation runs don't touch the bike's data
+        self.data_dir = Path(data_dir)
+        self.db_path = self.data_dir / DB_PATH.name
+        self.log_path = self.data_dir / LOG_PATH.name
+        self.archive_dir = self.data_dir / ARCHIVE_DIR.name
+        
+        # Clock driving the scheduler and sample timestamps (time module or a sim clock)
+        self.clock = clock
+        self.run_until = None
+        
         self.setup_logging()
         self.setup_directories()
         self.setup_database()
         
         # Initialize sensors
-        self.imu = None
+        # imu/gps can be injected replay or simulation backends (see sim_backends.py)
+        self.imu = imu
+        self.imu_simulated = imu is not None
+        self.imu_fifo = None
         # self.gps_socket = None  # Replaced with cellular GPS
         # self.data_stream = None
-        self.cellular_gps = CellularGPS()
+        if gps is not None:
+            self.cellular_gps = gps
+        elif GPS_BACKEND == 'nmea':
+            self.cellular_gps = NMEAStreamGPS()
+        else:
+            self.cellular_gps = CellularGPS()
+        self.gps_streaming = False
+        
+        # Write-behind database writer
+        self.writer = TelemetryWriter(self.db_path, archive_dir=self.archive_dir, ride_tracker=RideTracker())
+        
+        # Shared-memory ring the dashboards read live samples from
+        self.ring = None
+        
+        # Unix-socket hub pushing each sample to subscribed consumers
+        self.hub = None
         
         # State tracking
         self.engine_running = False
         self.ride_session_id = None
+        self.last_sample_t_ns = 0
         self.running = True
         
         # Power monitoring
@@ -71,6 +126,11 @@ class MotorcycleTelemetry:
             'satellites_used': 0
         }
         
+        # Latest readings shared between scheduler tasks
+        self.latest_imu_data = None
+        self.fused_gps_data = None
+        self.scheduler = SamplingScheduler(clock=clock.monotonic, sleep=clock.sleep)
+        
         # Threading
         self.data_lock = threading.Lock()
         
@@ -80,12 +140,12 @@ class MotorcycleTelemetry:
         
     def setup_logging(self):
         """Setup logging configuration"""
-        DATA_DIR.mkdir(exist_ok=True)
+        self.data_dir.mkdir(exist_ok=True)
         logging.basicConfig(
             level=logging.INFO,
             format='%(asctime)s - %(levelname)s - %(message)s',
             handlers=[
-                logging.FileHandler(LOG_PATH),
+                logging.FileHandler(self.log_path),
                 logging.StreamHandler()
             ]
         )
@@ -93,11 +153,11 @@ class MotorcycleTelemetry:
         
     def setup_directories(self):
         """Create necessary directories"""
-        DATA_DIR.mkdir(exist_ok=True)
+        self.data_dir.mkdir(exist_ok=True)
         
     def setup_database(self):
         """Initialize SQLite database for local data storage"""
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         # Create tables
@@ -160,11 +220,19 @@ class MotorcycleTelemetry:
         conn.commit()
         conn.close()
         
+        # Indexes and other schema upgrades (resumable if interrupted)
+        version = apply_migrations(self.db_path)
+        self.logger.info(f"🗄️ Database schema version {version}")
+        
     def initialize_sensors(self):
         """Initialize IMU and GPS sensors"""
         # Initialize IMU
         try:
-            self.imu = qwiic_icm20948.QwiicIcm20948()
+            if self.imu is None:
+                if qwiic_icm20948 is None:
+                    self.logger.error("qwiic_icm20948 not installed")
+                    return False
+                self.imu = qwiic_icm20948.QwiicIcm20948()
             if not self.imu.connected:
                 self.logger.error("IMU not detected. Check wiring!")
                 return False
@@ -172,6 +240,13 @@ class MotorcycleTelemetry:
                 self.logger.error("Failed to initialize IMU")
                 return False
             self.logger.info("✅ IMU initialized successfully")
+            
+            if IMU_ACQUISITION_MODE == 'fifo' and not self.imu_simulated:
+                self.imu_fifo = ICM20948Fifo(self.imu, output_rate=IMU_SAMPLE_RATE,
+                                             on_burst=self.publish_imu_burst)
+                if not self.imu_fifo.configure():
+                    self.logger.warning("IMU FIFO unavailable, falling back to polling")
+                    self.imu_fifo = None
         except Exception as e:
             self.logger.error(f"IMU initialization error: {e}")
             return False
@@ -179,9 +254,17 @@ class MotorcycleTelemetry:
         # Initialize Cellular GPS
         try:
             if self.cellular_gps.enable_gps():
-                # Start GPS reading thread
-                self.gps_thread = threading.Thread(target=self.cellular_gps_reader_thread, daemon=True)
-                self.gps_thread.start()
+                if hasattr(self.cellular_gps, 'start'):
+                    self.gps_streaming = self.cellular_gps.start(callback=self.handle_gps_data)
+                    if not self.gps_streaming:
+                        self.logger.warning("NMEA port unavailable, falling back to ModemManager polling")
+                        self.cellular_gps = CellularGPS()
+                        self.cellular_gps.enable_gps()
+                        
+                if not self.gps_streaming:
+                    # Start GPS reading thread
+                    self.gps_thread = threading.Thread(target=self.cellular_gps_reader_thread, daemon=True)
+                    self.gps_thread.start()
                 self.logger.info("✅ Cellular GPS initialized successfully")
             else:
                 self.logger.error("Failed to enable cellular GPS")
@@ -192,6 +275,24 @@ class MotorcycleTelemetry:
             
         return True
     
+    def handle_gps_data(self, gps_data):
+        """Record a new GPS reading from either backend"""
+        with self.gps_lock:
+            # Update latest GPS data
+            self.latest_gps_data = gps_data
+            self.gps_history.append(gps_data)
+            self.gps_stats['total_reads'] += 1
+            
+            if gps_data['gps_fix']:
+                self.gps_stats['successful_reads'] += 1
+                self.gps_stats['last_fix_time'] = datetime.now(timezone.utc)
+            
+            self.gps_stats['satellites_used'] = gps_data['satellites_used']
+            
+        if self.gps_streaming:
+            # Streamed fixes go straight to the sampler instead of waiting for the gps task
+            self.fused_gps_data = gps_data.copy()
+    
     def cellular_gps_reader_thread(self):
         """Cellular GPS reading thread - OPTIMIZED for lower CPU usage"""
         self.logger.info("🛰️ Cellular GPS reader thread started")
@@ -202,17 +303,7 @@ class MotorcycleTelemetry:
                 gps_data = self.cellular_gps.get_location()
                 
                 if gps_data:
-                    with self.gps_lock:
-                        # Update latest GPS data
-                        self.latest_gps_data = gps_data
-                        self.gps_history.append(gps_data)
-                        self.gps_stats['total_reads'] += 1
-                        
-                        if gps_data['gps_fix']:
-                            self.gps_stats['successful_reads'] += 1
-                            self.gps_stats['last_fix_time'] = datetime.now(timezone.utc)
-                        
-                        self.gps_stats['satellites_used'] = gps_data['satellites_used']
+                    self.handle_gps_data(gps_data)
                 
                 # REDUCED frequency: Sleep for 2 seconds instead of 0.5 to reduce CPU load
                 time.sleep(2)
@@ -295,6 +386,25 @@ class MotorcycleTelemetry:
             self.logger.error(f"Error reading IMU: {e}")
             return None
             
+    def read_imu_fifo(self):
+        """Drain the IMU FIFO and return the newest decimated sample"""
+        try:
+            samples = self.imu_fifo.drain()
+            if not samples:
+                return None
+            
+            imu_data = samples[-1]
+            # The magnetometer and temperature aren't in the FIFO
+            self.imu.getAgmt()
+            imu_data.update({
+                'mx': self.imu.mxRaw, 'my': self.imu.myRaw, 'mz': self.imu.mzRaw,
+                'temperature': getattr(self.imu, 'tempRaw', None)
+            })
+            return imu_data
+        except Exception as e:
+            self.logger.error(f"Error reading IMU FIFO: {e}")
+            return None
+            
     def get_latest_gps_data(self):
         """Get the latest GPS data from the continuous reader"""
         with self.gps_lock:
@@ -317,7 +427,7 @@ class MotorcycleTelemetry:
         """Start a new ride session"""
         self.ride_session_id = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute(
             'INSERT INTO rides (session_id, start_time) VALUES (?, ?)',
@@ -336,7 +446,11 @@ class MotorcycleTelemetry:
         if not self.ride_session_id:
             return
             
-        conn = sqlite3.connect(DB_PATH)
+        # Make sure queued samples are on disk before closing the ride
+        self.writer.end_session(self.ride_session_id)
+        self.writer.flush()
+        
+        conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         cursor.execute(
             'UPDATE rides SET end_time = ? WHERE session_id = ?',
@@ -355,56 +469,80 @@ class MotorcycleTelemetry:
             
         self.ride_session_id = None
         
-    def save_telemetry_data(self, imu_data, gps_data):
-        """Save telemetry data to database"""
-        if not self.ride_session_id:
-            return
-            
-        timestamp = datetime.now(timezone.utc)
-        
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
+    def build_sample(self, imu_data, gps_data):
+        """Combine the latest IMU and GPS readings into one telemetry sample"""
         # Get current satellite count
         stats = self.get_gps_stats()
         
-        cursor.execute('''
-            INSERT INTO telemetry_data 
-            (session_id, timestamp, ax, ay, az, gx, gy, gz, mx, my, mz, temperature,
-             vibration_level, power_voltage, on_external_power, 
-             latitude, longitude, speed_mph, heading, gps_fix, satellites_used, hdop)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            self.ride_session_id, timestamp,
-            imu_data.get('ax') if imu_data else None,
-            imu_data.get('ay') if imu_data else None,
-            imu_data.get('az') if imu_data else None,
-            imu_data.get('gx') if imu_data else None,
-            imu_data.get('gy') if imu_data else None,
-            imu_data.get('gz') if imu_data else None,
-            imu_data.get('mx') if imu_data else None,
-            imu_data.get('my') if imu_data else None,
-            imu_data.get('mz') if imu_data else None,
-            imu_data.get('temperature') if imu_data else None,
-            None,  # vibration_level
-            0,  # power_voltage
-            self.external_power,
-            gps_data.get('latitude') if gps_data else None,
-            gps_data.get('longitude') if gps_data else None,
-            gps_data.get('speed_mph') if gps_data else None,
-            gps_data.get('heading') if gps_data else None,
-            gps_data.get('gps_fix', False) if gps_data else False,
-            stats['satellites_used'],
-            gps_data.get('hdop', 99) if gps_data else 99,
-        ))
+        # FIFO samples carry the sensor's own timestamp - keep it unless the IMU has stalled
+        t_ns = self.clock.monotonic_ns()
+        if imu_data and imu_data.get('t_ns') is not None and t_ns - imu_data['t_ns'] < IMU_TIMESTAMP_MAX_AGE * 1e9:
+            t_ns = imu_data['t_ns']
+        # Never step backwards when switching between the two clocks
+        t_ns = self.last_sample_t_ns = max(t_ns, self.last_sample_t_ns)
+        
+        return {
+            'session_id': self.ride_session_id,
+            'timestamp': datetime.fromtimestamp(self.clock.time(), timezone.utc),
+            't_ns': t_ns,
+            'ax': imu_data.get('ax') if imu_data else None,
+            'ay': imu_data.get('ay') if imu_data else None,
+            'az': imu_data.get('az') if imu_data else None,
+            'gx': imu_data.get('gx') if imu_data else None,
+            'gy': imu_data.get('gy') if imu_data else None,
+            'gz': imu_data.get('gz') if imu_data else None,
+            'mx': imu_data.get('mx') if imu_data else None,
+            'my': imu_data.get('my') if imu_data else None,
+            'mz': imu_data.get('mz') if imu_data else None,
+            'temperature': imu_data.get('temperature') if imu_data else None,
+            'vibration_level': imu_data.get('vibration_level') if imu_data else None,
+            'power_voltage': 0,
+            'on_external_power': self.external_power,
+            'latitude': gps_data.get('latitude') if gps_data else None,
+            'longitude': gps_data.get('longitude') if gps_data else None,
+            'speed_mph': gps_data.get('speed_mph') if gps_data else None,
+            'heading': gps_data.get('heading') if gps_data else None,
+            'gps_fix': gps_data.get('gps_fix', False) if gps_data else False,
+            'satellites_used': stats['satellites_used'],
+            'hdop': gps_data.get('hdop', 99) if gps_data else 99,
+        }
         
-        conn.commit()
-        conn.close()
+    def publish_sample(self, sample):
+        """Publish a sample to the live ring and the hub's subscribers"""
+        if not (self.ring or self.hub):
+            return
+        live = dict(
+            sample,
+            t_wall=sample['timestamp'].timestamp(),
+            recording=self.ride_session_id is not None
+        )
+        if self.ring:
+            try:
+                self.ring.publish(live)
+            except Exception as e:
+                self.logger.warning(f"Failed to publish to telemetry ring: {e}")
+        if self.hub:
+            try:
+                self.hub.publish(live)
+            except Exception as e:
+                self.logger.warning(f"Failed to publish to telemetry hub: {e}")
+            
+    def publish_imu_burst(self, frames):
+        """Publish a FIFO drain's full-rate IMU frames to hub subscribers that want them"""
+        if self.hub:
+            self.hub.publish_imu_burst(frames)
+            
+    def save_telemetry_data(self, sample):
+        """Queue telemetry data for the background database writer"""
+        if not self.ride_session_id:
+            return
+            
+        self.writer.submit(sample)
         
     def upload_ride_data(self, session_id):
         """Upload ride data to server"""
         try:
-            conn = sqlite3.connect(DB_PATH)
+            conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
             cursor.execute(
@@ -438,50 +576,120 @@ class MotorcycleTelemetry:
             return
             
         self.logger.info("🏍️ Enhanced Motorcycle telemetry system started")
-        self.logger.info("🛰️ GPS running in continuous mode for better performance")
+        if self.gps_streaming:
+            self.logger.info("🛰️ GPS streaming NMEA from the modem")
+        else:
+            self.logger.info("🛰️ GPS running in continuous mode for better performance")
+        
+        self.writer.start()
+        
+        try:
+            self.ring = TelemetryRingWriter()
+        except Exception as e:
+            self.logger.warning(f"Live telemetry ring unavailable: {e}")
         
-        # Wait for initial GPS fix
-        self.logger.info("⏳ Waiting for GPS fix...")
-        for i in range(30):  # Wait up to 30 seconds
+        try:
+            self.hub = TelemetryHub()
+            self.hub.start()
+        except Exception as e:
+            self.hub = None
+            self.logger.warning(f"Telemetry hub unavailable: {e}")
+        
+        # Wait for initial GPS fix - scheduler-driven backends only deliver once it runs
+        gps_pump = getattr(self.cellular_gps, 'pump', None)
+        if not gps_pump:
+            self.logger.info("⏳ Waiting for GPS fix...")
+        for i in range(0 if gps_pump else 30):  # Wait up to 30 seconds
             if self.get_latest_gps_data():
                 stats = self.get_gps_stats()
                 self.logger.info(f"✅ GPS ready! {stats['satellites_used']} satellites")
                 break
             time.sleep(1)
         
-        while self.running:
-            try:
-                # Read sensor data
-                imu_data = self.read_imu_data()
-                gps_data = self.get_latest_gps_data()  # Get from continuous reader
-                
-                # Detect engine state
-                engine_currently_running = self.detect_engine_state(imu_data)
-                
-                # Handle engine state changes
-                if engine_currently_running and not self.engine_running:
-                    self.engine_running = True
-                    self.start_ride_session()
-                    
-                elif not engine_currently_running and self.engine_running:
-                    self.engine_running = False
-                    self.end_ride_session()
-                    
-                # Save data if engine is running
-                if self.engine_running:
-                    self.save_telemetry_data(imu_data, gps_data)
-                    
-                # Sleep for next sample
-                time.sleep(1.0 / SAMPLE_RATE)
-                
-            except KeyboardInterrupt:
-                break
-            except Exception as e:
-                self.logger.error(f"Error in main loop: {e}")
-                time.sleep(1)
+        imu_rate = FIFO_DRAIN_RATE if self.imu_fifo else IMU_SAMPLE_RATE
+        self.scheduler.add_task('imu', imu_rate, self.imu_task)
+        if gps_pump:
+            self.scheduler.add_task('gps_feed', self.cellular_gps.rate_hz, gps_pump)
+        if not self.gps_streaming:
+            self.scheduler.add_task('gps', GPS_UPDATE_RATE, self.gps_task)
+        self.scheduler.add_task('persist', PERSIST_RATE, self.persist_task)
+        self.scheduler.add_task('stats', 1.0 / SCHEDULER_STATS_INTERVAL, self.log_scheduler_stats)
+        
+        started = time.monotonic()
+        try:
+            self.scheduler.run(self.should_continue)
+        except KeyboardInterrupt:
+            pass
+        
+        elapsed = time.monotonic() - started
+        stats = self.writer.get_stats()
+        self.logger.info(f"🏁 Recorded {stats['submitted']} samples in {elapsed:.1f} s ({stats['submitted'] / max(elapsed, 1e-9):.1f} samples/s)")
                 
+        self.log_scheduler_stats()
+        if self.imu_fifo:
+            stats = self.imu_fifo.get_stats()
+            self.logger.info(f"📈 IMU FIFO Stats: {stats['frames']} frames at {stats['sample_rate']:.1f} Hz, {stats['overflows']} overflows")
         self.cleanup()
         
+    def should_continue(self):
+        """Keep sampling until shutdown, the end of a timed run or the end of a replay"""
+        if self.run_until is not None and self.clock.monotonic() >= self.run_until:
+            return False
+        if getattr(self.cellular_gps, 'finished', False):
+            return False
+        return self.running
+        
+    def imu_task(self):
+        """Scheduler task: sample the IMU"""
+        if self.imu_fifo:
+            imu_data = self.read_imu_fifo()
+        else:
+            imu_data = self.read_imu_data()
+        if imu_data:
+            self.latest_imu_data = imu_data
+            
+    def gps_task(self):
+        """Scheduler task: pick up the latest fix from the continuous reader"""
+        self.fused_gps_data = self.get_latest_gps_data()
+        
+    def persist_task(self):
+        """Scheduler task: track engine state and record a sample"""
+        imu_data = self.latest_imu_data
+        gps_data = self.fused_gps_data
+        
+        # Detect engine state
+        engine_currently_running = self.detect_engine_state(imu_data)
+        
+        # Handle engine state changes
+        if engine_currently_running and not self.engine_running:
+            self.engine_running = True
+            self.start_ride_session()
+            
+        elif not engine_currently_running and self.engine_running:
+            self.engine_running = False
+            self.end_ride_session()
+            
+        # Dashboards see every sample, ride or not
+        sample = self.build_sample(imu_data, gps_data)
+        self.publish_sample(sample)
+            
+        # Save data if engine is running
+        if self.engine_running:
+            self.save_telemetry_data(sample)
+            
+    def log_scheduler_stats(self):
+        """Log sampling jitter and overruns for each task"""
+        for name, stats in self.scheduler.get_stats().items():
+            if name == 'stats' or not stats['ticks']:
+                continue
+            self.logger.info(
+                f"⏱️ {name}: {stats['ticks']} ticks @ {stats['rate_hz']} Hz, "
+                f"jitter mean {stats['mean_jitter_ms']} ms / max {stats['max_jitter_ms']} ms, "
+                f"{stats['late_ticks']} late, "
+                f"duration mean {stats['mean_duration_ms']} ms / max {stats['max_duration_ms']} ms, "
+                f"{stats['overruns']} overruns ({stats['skipped_ticks']} ticks skipped)"
+            )
+        
     def signal_handler(self, signum, frame):
         """Handle shutdown signals"""
         self.logger.info("Received shutdown signal")
@@ -492,10 +700,53 @@ class MotorcycleTelemetry:
         self.running = False
         if self.gps_thread:
             self.gps_thread.join(timeout=2)
+        if self.gps_streaming:
+            self.cellular_gps.stop()
         if self.engine_running:
             self.end_ride_session()
+        self.writer.stop()
+        if self.ring:
+            self.ring.close()
+        if self.hub:
+            self.hub.stop()
+        stats = self.writer.get_stats()
+        self.logger.info(f"💾 Writer Stats: {stats['written']} samples in {stats['batches']} batches, {stats['dropped']} dropped (queue full), {stats['write_dropped']} lost to write errors")
         self.logger.info("🛑 Enhanced Motorcycle telemetry system stopped")
 
+def main():
+    parser = argparse.ArgumentParser(description='Motorcycle telemetry collector')
+    parser.add_argument('--replay', metavar='SOURCE', help='Replay a ride from a telemetry.db or .mtra archive instead of real sensors')
+    parser.add_argument('--session', help='Session to replay from a telemetry.db (default: latest)')
+    parser.add_argument('--simulate', action='store_true', help='Use synthetic IMU and NMEA generators instead of real sensors')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay/simulation speed multiple (default: 1x)')
+    parser.add_argument('--fast', action='store_true', help='Run replay/simulation as fast as possible on a virtual clock')
+    parser.add_argument('--imu-rate', type=float, default=100.0, help='Synthetic IMU output rate in Hz')
+    parser.add_argument('--gps-rate', type=float, default=1.0, help='Synthetic/replayed GPS rate in Hz')
+    parser.add_argument('--duration', type=float, help='Stop after this many (clock) seconds')
+    parser.add_argument('--data-dir', default=str(DATA_DIR), help='Directory for the database, log and archives')
+    args = parser.parse_args()
+    
+    if not (args.replay or args.simulate):
+        telemetry = MotorcycleTelemetry(data_dir=args.data_dir)
+        telemetry.main_loop()
+        return
+        
+    import sim_backends
+    clock = sim_backends.VirtualClock() if args.fast else sim_backends.ScaledClock(args.speed)
+    if args.replay:
+        replay = sim_backends.RideReplay(args.replay, clock, session_id=args.session)
+        imu = sim_backends.ReplayIMU(replay)
+        gps = sim_backends.ReplayGPS(replay, rate_hz=args.gps_rate)
+    else:
+        imu = sim_backends.SyntheticIMU(clock, rate_hz=args.imu_rate)
+        gps = sim_backends.SyntheticNMEA(clock, rate_hz=args.gps_rate)
+        
+    telemetry = MotorcycleTelemetry(data_dir=args.data_dir, imu=imu, gps=gps, clock=clock)
+    if args.duration:
+        telemetry.run_until = clock.monotonic() + args.duration
+    elif args.fast and not args.replay:
+        parser.error("--fast simulation needs --duration")
+    telemetry.main_loop()
+
 if __name__ == "__main__":
-    telemetry = MotorcycleTelemetry()
-    telemetry.main_loop() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Response Cache
+In-memory cache of pre-serialized (and pre-gzipped) JSON responses for data
+that no longer changes, such as the tracks of finished rides
+
+Entries are stored with a version token - typically the source row's columns
+- and only served while the caller's current version matches, so an edited
+ride is re-rendered on its next request. Responses carry a strong ETag - the
+gzip variant's ends in -gz, since its bytes differ - and If-None-Match is
+answered with 304 Not Modified.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+# Cache configuration
+CACHE_MAX_BYTES = 32 * 1024 * 1024   # Body + gzip bytes kept before evicting the least recently used
+GZIP_MIN_SIZE = 1024                 # Smaller bodies aren't worth compressing
+GZIP_LEVEL = 6
+CACHE_CONTROL = 'no-cache'           # Clients revalidate every time - a 304 costs one row lookup
+
+
+class CachedResponse:
+    """One serialized representation"""
+
+    def __init__(self, version, body, mimetype='application/json'):
+        self.version = version
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.gzip_etag = self.etag + '-gz'
+        self.gzipped = gzip.compress(body, GZIP_LEVEL) if len(body) >= GZIP_MIN_SIZE else None
+        self.size = len(body) + (len(self.gzipped) if self.gzipped else 0)
+
+    def respond(self):
+        """Flask response for the current request - 304, gzip or plain"""
+        use_gzip = self.gzipped is not None and 'gzip' in request.accept_encodings
+        etag = self.gzip_etag if use_gzip else self.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif use_gzip:
+            response = Response(self.gzipped, mimetype=self.mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype=self.mimetype)
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = CACHE_CONTROL
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+class ResponseCache:
+    """Thread-safe LRU of CachedResponse entries bounded by total bytes"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key, version):
+        """The entry for key if it was stored for this version"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry.version != version:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    def put(self, key, version, body, mimetype='application/json'):
+        """Store a serialized body and return its entry"""
+        entry = CachedResponse(version, body, mimetype)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old.size
+            if entry.size <= self.max_bytes:
+                self.entries[key] = entry
+                self.size += entry.size
+                self.stats['stores'] += 1
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= evicted.size
+                self.stats['evictions'] += 1
+        return entry
+
+    def invalidate(self, match):
+        """Drop every entry whose key satisfies match(key)"""
+        with self.lock:
+            for key in [key for key in self.entries if match(key)]:
+                self.size -= self.entries.pop(key).size
+
+    def get_stats(self):
+        with self.lock:
+            stats = self.stats.copy()
+            stats.update(entries=len(self.entries), bytes=self.size)
+        return stats
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Columnar Ride Archive
+One file per ride session holding telemetry as fixed-width typed columns in
+chunks, with an index footer so readers can memory-map just the rows and
+columns they need
+
+File layout:
+    header   MAGIC, version, metadata length, JSON metadata (columns, session)
+    chunks   CHUNK_MAGIC, row count, first/last t_ns, then each column's values
+    footer   FOOTER_MAGIC, chunk count, one index entry per chunk
+    trailer  footer offset, MAGIC
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import mmap
+import array
+import bisect
+import struct
+import sqlite3
+import argparse
+from datetime import datetime, timezone
+from pathlib import Path
+
+MAGIC = b'MTRA'
+CHUNK_MAGIC = b'CHNK'
+FOOTER_MAGIC = b'FOOT'
+VERSION = 1
+ALIGNMENT = 8
+
+HEADER_STRUCT = struct.Struct('<4sHHI')          # magic, version, reserved, metadata length
+CHUNK_STRUCT = struct.Struct('<4sIqq')           # magic, rows, first t_ns, last t_ns
+FOOTER_STRUCT = struct.Struct('<4sI')            # magic, chunk count
+INDEX_STRUCT = struct.Struct('<QIIqq')           # offset, rows, reserved, first t_ns, last t_ns
+TRAILER_STRUCT = struct.Struct('<Q4s')           # footer offset, magic
+
+ARCHIVE_CHUNK_ROWS = 4096   # Rows per chunk at most - about 13 minutes at 5 Hz
+ARCHIVE_CHUNK_SECONDS = 10  # Seconds a row may sit buffered before its chunk is written and synced
+ARCHIVE_SUFFIX = '.mtra'
+
+# Archived columns and their array typecodes. t_ns is int64 monotonic nanoseconds.
+ARCHIVE_COLUMNS = (
+    ('t_ns', 'q'),
+    ('ax', 'f'), ('ay', 'f'), ('az', 'f'),
+    ('gx', 'f'), ('gy', 'f'), ('gz', 'f'),
+    ('mx', 'f'), ('my', 'f'), ('mz', 'f'),
+    ('temperature', 'f'),
+    ('vibration_level', 'f'),
+    ('on_external_power', 'b'),
+    ('latitude', 'd'),
+    ('longitude', 'd'),
+    ('speed_mph', 'f'),
+    ('heading', 'f'),
+    ('gps_fix', 'b'),
+    ('satellites_used', 'b'),
+    ('hdop', 'f'),
+)
+
+
+def padded(length):
+    """Round a byte length up to the column alignment"""
+    return (length + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def missing_value(typecode):
+    """Value stored for a missing reading - NaN for floats, 0 for integers"""
+    return math.nan if typecode in 'fd' else 0
+
+
+class RideArchiveWriter:
+    """Appends samples to a ride archive one chunk at a time"""
+
+    def __init__(self, path, session_id, wall_offset_ns=None, columns=ARCHIVE_COLUMNS,
+                 chunk_rows=ARCHIVE_CHUNK_ROWS, chunk_seconds=ARCHIVE_CHUNK_SECONDS, sync=True):
+        self.path = Path(path)
+        self.columns = tuple(columns)
+        self.chunk_rows = chunk_rows
+        self.chunk_seconds = chunk_seconds  # None: chunks close on row count only
+        self.sync = sync                    # fsync each chunk so a live ride survives a power cut
+        self.chunk_started = None   # Host monotonic time the buffered chunk's first row arrived
+        self.index = []
+        self.buffers = self.new_buffers()
+        self.rows_written = 0
+
+        if wall_offset_ns is None:
+            # Maps monotonic t_ns back to wall-clock time: wall = t_ns + offset
+            wall_offset_ns = datetime.now(timezone.utc).timestamp() * 1e9 - time.monotonic_ns()
+
+        metadata = json.dumps({
+            'session_id': session_id,
+            'columns': [list(column) for column in self.columns],
+            'byteorder': sys.byteorder,
+            'wall_offset_ns': int(wall_offset_ns),
+            'created': datetime.now(timezone.utc).isoformat()
+        }).encode()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER_STRUCT.pack(MAGIC, VERSION, 0, len(metadata)))
+        self.file.write(metadata)
+        self.pad_file()
+
+    def new_buffers(self):
+        return [array.array(typecode) for _, typecode in self.columns]
+
+    def pad_file(self):
+        position = self.file.tell()
+        self.file.write(b'\0' * (padded(position) - position))
+
+    def append(self, sample):
+        """Append one sample dict; must carry t_ns, other columns may be missing.
+        The chunk is written once it is full or its oldest row is chunk_seconds old
+        (when chunk_seconds is set)."""
+        now = time.monotonic()
+        if self.chunk_started is None:
+            self.chunk_started = now
+        for (name, typecode), buffer in zip(self.columns, self.buffers):
+            value = sample.get(name)
+            if value is None:
+                value = missing_value(typecode)
+            elif typecode not in 'fd':
+                value = int(value)
+            buffer.append(value)
+
+        if len(self.buffers[0]) >= self.chunk_rows:
+            self.write_chunk()
+        elif self.chunk_seconds is not None and now - self.chunk_started >= self.chunk_seconds:
+            self.write_chunk()
+
+    def write_chunk(self):
+        """Write buffered rows as one chunk"""
+        rows = len(self.buffers[0])
+        if not rows:
+            return
+
+        timestamps = self.buffers[0]
+        offset = self.file.tell()
+        self.file.write(CHUNK_STRUCT.pack(CHUNK_MAGIC, rows, timestamps[0], timestamps[-1]))
+        self.pad_file()
+        for buffer in self.buffers:
+            buffer.tofile(self.file)
+            self.pad_file()
+        self.file.flush()
+        if self.sync:
+            # A reader rebuilds the index from complete chunks after a power cut
+            os.fsync(self.file.fileno())
+
+        self.index.append((offset, rows, timestamps[0], timestamps[-1]))
+        self.rows_written += rows
+        self.buffers = self.new_buffers()
+        self.chunk_started = None
+
+    def close(self):
+        """Write the final chunk and the index footer"""
+        if self.file.closed:
+            return
+        self.write_chunk()
+
+        footer_offset = self.file.tell()
+        self.file.write(FOOTER_STRUCT.pack(FOOTER_MAGIC, len(self.index)))
+        for offset, rows, first, last in self.index:
+            self.file.write(INDEX_STRUCT.pack(offset, rows, 0, first, last))
+        self.file.write(TRAILER_STRUCT.pack(footer_offset, MAGIC))
+        self.file.close()
+
+
+class RideArchiveReader:
+    """Memory-mapped reader for ride archives"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, metadata_length = HEADER_STRUCT.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a version {VERSION} ride archive")
+
+        start = HEADER_STRUCT.size
+        self.metadata = json.loads(self.map[start:start + metadata_length])
+        if self.metadata['byteorder'] != sys.byteorder:
+            raise ValueError(f"{self.path} was written on a {self.metadata['byteorder']}-endian host")
+
+        self.session_id = self.metadata['session_id']
+        self.wall_offset_ns = self.metadata['wall_offset_ns']
+        self.columns = [tuple(column) for column in self.metadata['columns']]
+        self.column_names = [name for name, _ in self.columns]
+        self.data_start = padded(start + metadata_length)
+
+        self.index = self.read_footer()
+        if self.index is None:
+            # Writer never closed (power loss) - rebuild the index by walking the chunks
+            self.index = self.scan_chunks()
+
+        self.chunk_starts = []
+        total = 0
+        for _, rows, _, _ in self.index:
+            self.chunk_starts.append(total)
+            total += rows
+        self.row_count = total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def read_footer(self):
+        """Read the chunk index from the footer, or None if there isn't one"""
+        if len(self.map) < self.data_start + TRAILER_STRUCT.size:
+            return None
+        footer_offset, magic = TRAILER_STRUCT.unpack_from(self.map, len(self.map) - TRAILER_STRUCT.size)
+        if magic != MAGIC or footer_offset < self.data_start:
+            return None
+        if footer_offset + FOOTER_STRUCT.size > len(self.map) - TRAILER_STRUCT.size:
+            return None
+
+        footer_magic, count = FOOTER_STRUCT.unpack_from(self.map, footer_offset)
+        if footer_magic != FOOTER_MAGIC:
+            return None
+        position = footer_offset + FOOTER_STRUCT.size
+        index = []
+        for _ in range(count):
+            offset, rows, _, first, last = INDEX_STRUCT.unpack_from(self.map, position)
+            index.append((offset, rows, first, last))
+            position += INDEX_STRUCT.size
+        return index
+
+    def chunk_size(self, rows):
+        """Bytes taken by a chunk of this many rows"""
+        size = padded(CHUNK_STRUCT.size)
+        for _, typecode in self.columns:
+            size += padded(rows * array.array(typecode).itemsize)
+        return size
+
+    def scan_chunks(self):
+        """Walk complete chunks from the start of the data section"""
+        index = []
+        position = self.data_start
+        while position + CHUNK_STRUCT.size <= len(self.map):
+            magic, rows, first, last = CHUNK_STRUCT.unpack_from(self.map, position)
+            size = self.chunk_size(rows)
+            if magic != CHUNK_MAGIC or position + size > len(self.map):
+                break
+            index.append((position, rows, first, last))
+            position += size
+        return index
+
+    def column_view(self, chunk, name):
+        """Zero-copy memoryview over one column of one chunk"""
+        offset, rows, _, _ = self.index[chunk]
+        position = offset + padded(CHUNK_STRUCT.size)
+        for column, typecode in self.columns:
+            itemsize = array.array(typecode).itemsize
+            if column == name:
+                return memoryview(self.map)[position:position + rows * itemsize].cast(typecode)
+            position += padded(rows * itemsize)
+        raise KeyError(name)
+
+    def iter_column(self, name, start=0, stop=None):
+        """Yield zero-copy memoryviews covering rows [start, stop) of a column"""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        if start >= stop:
+            return
+        chunk = bisect.bisect_right(self.chunk_starts, start) - 1
+        while chunk < len(self.index) and self.chunk_starts[chunk] < stop:
+            chunk_start = self.chunk_starts[chunk]
+            view = self.column_view(chunk, name)
+            yield view[max(start - chunk_start, 0):min(stop - chunk_start, len(view))]
+            chunk += 1
+
+    def read_column(self, name, start=0, stop=None):
+        """Copy rows [start, stop) of a column into an array"""
+        typecode = dict(self.columns)[name]
+        values = array.array(typecode)
+        for view in self.iter_column(name, start, stop):
+            values.frombytes(view.tobytes())
+        return values
+
+    def read_columns(self, names, start=0, stop=None):
+        """Read several columns over the same row range"""
+        return {name: self.read_column(name, start, stop) for name in names}
+
+    def rows_between(self, t_start_ns, t_end_ns):
+        """Row range [start, stop) with t_start_ns <= t_ns < t_end_ns"""
+        start = self.row_count
+        stop = self.row_count
+        for chunk, (_, rows, first, last) in enumerate(self.index):
+            if last < t_start_ns:
+                continue
+            view = self.column_view(chunk, 't_ns')
+            if start == self.row_count:
+                start = self.chunk_starts[chunk] + bisect.bisect_left(view, t_start_ns)
+            if last >= t_end_ns:
+                stop = self.chunk_starts[chunk] + bisect.bisect_left(view, t_end_ns)
+                break
+        return start, max(start, stop)
+
+    def wall_time(self, t_ns):
+        """Convert an archive timestamp to a UTC datetime"""
+        return datetime.fromtimestamp((t_ns + self.wall_offset_ns) / 1e9, timezone.utc)
+
+
+def archive_path(archive_dir, session_id):
+    """Archive file for a ride session"""
+    return Path(archive_dir) / f"{session_id}{ARCHIVE_SUFFIX}"
+
+
+def export_session(db_path, session_id, archive_dir):
+    """Build an archive for a session already stored in telemetry_data"""
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    names = [name for name, _ in ARCHIVE_COLUMNS if name != 't_ns']
+    cursor.execute(
+        f"SELECT timestamp, {', '.join(names)} FROM telemetry_data WHERE session_id = ? ORDER BY id",
+        (session_id,)
+    )
+
+    # SQLite rows only have wall-clock times, so t_ns is nanoseconds since the epoch.
+    # The rows are already durable, so chunks are sized by row count and not fsynced
+    writer = RideArchiveWriter(archive_path(archive_dir, session_id), session_id, wall_offset_ns=0,
+                               chunk_seconds=None, sync=False)
+    try:
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row in rows:
+                sample = dict(row)
+                timestamp = datetime.fromisoformat(str(sample.pop('timestamp')))
+                if timestamp.tzinfo is None:
+                    timestamp = timestamp.replace(tzinfo=timezone.utc)
+                sample['t_ns'] = int(timestamp.timestamp() * 1e9)
+                writer.append(sample)
+    finally:
+        writer.close()
+        conn.close()
+    return writer.rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ride archive tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Archive sessions from telemetry.db')
+    export_parser.add_argument('--db', default='/home/pi/motorcycle_data/telemetry.db')
+    export_parser.add_argument('--out', default='/home/pi/motorcycle_data/archive')
+    export_parser.add_argument('sessions', nargs='*', help='Session IDs (default: all)')
+
+    info_parser = subparsers.add_parser('info', help='Show archive contents')
+    info_parser.add_argument('path')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        sessions = args.sessions
+        if not sessions:
+            conn = sqlite3.connect(args.db)
+            sessions = [row[0] for row in conn.execute(
+                "SELECT DISTINCT session_id FROM telemetry_data WHERE session_id IS NOT NULL")]
+            conn.close()
+        for session_id in sessions:
+            rows = export_session(args.db, session_id, args.out)
+            print(f"📦 {session_id}: {rows} rows -> {archive_path(args.out, session_id)}")
+
+    elif args.command == 'info':
+        with RideArchiveReader(args.path) as reader:
+            print(f"Session: {reader.session_id}")
+            print(f"Rows: {reader.row_count} in {len(reader.index)} chunks")
+            print(f"Columns: {', '.join(reader.column_names)}")
+            if reader.row_count:
+                first = reader.index[0][2]
+                last = reader.index[-1][3]
+                print(f"Span: {reader.wall_time(first).isoformat()} - {reader.wall_time(last).isoformat()}")
+            print(f"Size: {os.path.getsize(args.path) / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Incremental Ride Statistics
+Accumulates distance, speed, moving time, lean and G-force for the ride the
+route tracker is recording as samples are written, and checkpoints them to
+its rides row - so ending or listing a ride never rescans its track
+"""
+
+import math
+import time
+
+from geodesy import haversine_miles
+from track_index import TrackIndexer
+
+# Ride statistics configuration
+TRACK_POINT_INTERVAL = 1.0   # Seconds between points added to the tracks table
+MOVING_SPEED_MPH = 2.0       # Below this the bike counts as stopped (and GPS drift isn't distance)
+MAX_SAMPLE_GAP = 5.0         # Seconds - longer gaps between samples don't count as moving time
+ACCEL_SCALE = 16384          # Raw accelerometer counts per g, as the dashboards assume
+
+# Stats columns kept on the rides row (added by update_db_schema migration 4)
+STATS_COLUMNS = (
+    'distance_miles', 'max_speed_mph', 'avg_speed_mph', 'moving_time_s',
+    'max_lean_deg', 'max_g', 'point_count',
+)
+
+
+def sample_time(sample):
+    """Seconds on the sample's monotonic clock, falling back to its wall timestamp"""
+    if sample.get('t_ns') is not None:
+        return sample['t_ns'] / 1e9
+    timestamp = sample.get('timestamp')
+    return timestamp.timestamp() if timestamp is not None else time.time()
+
+
+class RideStats:
+    """Running statistics for one ride"""
+
+    def __init__(self):
+        self.distance_miles = 0.0
+        self.max_speed_mph = 0.0
+        self.speed_sum = 0.0
+        self.point_count = 0
+        self.moving_time_s = 0.0
+        self.max_lean_deg = 0.0
+        self.max_g = 0.0
+        self.last_time = None
+        self.last_point = None        # (time, latitude, longitude)
+
+    @classmethod
+    def from_row(cls, row):
+        """Resume from a checkpointed rides row (a dict of STATS_COLUMNS)"""
+        stats = cls()
+        if row and row.get('point_count'):
+            stats.distance_miles = row['distance_miles'] or 0.0
+            stats.max_speed_mph = row['max_speed_mph'] or 0.0
+            stats.point_count = row['point_count']
+            stats.speed_sum = (row['avg_speed_mph'] or 0.0) * stats.point_count
+            stats.moving_time_s = row['moving_time_s'] or 0.0
+            stats.max_lean_deg = row['max_lean_deg'] or 0.0
+            stats.max_g = row['max_g'] or 0.0
+        return stats
+
+    @property
+    def avg_speed_mph(self):
+        return self.speed_sum / self.point_count if self.point_count else 0.0
+
+    def update(self, sample):
+        """Fold in one sample; returns True if it should become a track point"""
+        t = sample_time(sample)
+        speed = sample.get('speed_mph') or 0.0
+
+        if self.last_time is not None:
+            dt = t - self.last_time
+            if 0 < dt <= MAX_SAMPLE_GAP and speed >= MOVING_SPEED_MPH:
+                self.moving_time_s += dt
+        self.last_time = t
+
+        # Lean and G-force from the accelerometer, as the dashboard derives them
+        ax, ay = sample.get('ax'), sample.get('ay')
+        if ax is not None and ay is not None:
+            forward_g = ax / ACCEL_SCALE
+            lateral_g = ay / ACCEL_SCALE
+            lean = abs(math.degrees(math.asin(max(-1.0, min(1.0, lateral_g)))))
+            self.max_lean_deg = max(self.max_lean_deg, lean)
+            self.max_g = max(self.max_g, math.hypot(forward_g, lateral_g))
+
+        lat, lon = sample.get('latitude'), sample.get('longitude')
+        if not sample.get('gps_fix') or lat is None or lon is None:
+            return False
+        self.max_speed_mph = max(self.max_speed_mph, speed)
+        if self.last_point and t - self.last_point[0] < TRACK_POINT_INTERVAL:
+            return False
+
+        if self.last_point and speed >= MOVING_SPEED_MPH:
+            self.distance_miles += haversine_miles(self.last_point[1], self.last_point[2], lat, lon)
+        self.last_point = (t, lat, lon)
+        self.speed_sum += speed
+        self.point_count += 1
+        return True
+
+    def to_row(self):
+        """Values for STATS_COLUMNS"""
+        return {
+            'distance_miles': self.distance_miles,
+            'max_speed_mph': self.max_speed_mph,
+            'avg_speed_mph': self.avg_speed_mph,
+            'moving_time_s': self.moving_time_s,
+            'max_lean_deg': self.max_lean_deg,
+            'max_g': self.max_g,
+            'point_count': self.point_count,
+        }
+
+
+class RideTracker:
+    """Writer-thread hook feeding the route tracker's active ride: adds track
+    points, indexes them spatially and checkpoints its RideStats with every batch"""
+
+    def __init__(self):
+        self.ride_id = None
+        self.stats = None
+        self.indexer = TrackIndexer()
+
+    def active_ride(self, conn):
+        row = conn.execute("SELECT current_ride_id FROM status WHERE id=1 AND tracking_active=1").fetchone()
+        return row[0] if row else None
+
+    def load_stats(self, conn, ride_id):
+        """Resume a ride's stats after a restart, or start fresh"""
+        cursor = conn.execute(f"SELECT {', '.join(STATS_COLUMNS)} FROM rides WHERE ride_id=?", (ride_id,))
+        row = cursor.fetchone()
+        return RideStats.from_row(dict(zip(STATS_COLUMNS, row)) if row else None)
+
+    def process_batch(self, conn, batch):
+        """Update the active ride from a batch of samples (inside the caller's transaction)"""
+        ride_id = self.active_ride(conn)
+        if ride_id != self.ride_id:
+            self.ride_id = ride_id
+            self.stats = self.load_stats(conn, ride_id) if ride_id else None
+        if ride_id is None:
+            return
+
+        track_points = []
+        for sample in batch:
+            if self.stats.update(sample):
+                track_points.append((
+                    ride_id, sample.get('timestamp'), sample['latitude'], sample['longitude'],
+                    sample.get('altitude'), sample.get('speed_mph')
+                ))
+
+        for point in track_points:
+            cursor = conn.execute(
+                "INSERT INTO tracks (ride_id, timestamp, latitude, longitude, altitude, speed_mph) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                point
+            )
+            self.indexer.add(ride_id, cursor.lastrowid, point[2], point[3])
+        self.indexer.flush(conn)
+        values = self.stats.to_row()
+        values['ride_id'] = ride_id
+        conn.execute(
+            "UPDATE rides SET {}, stats_updated=CURRENT_TIMESTAMP WHERE ride_id=:ride_id".format(
+                ', '.join(f"{column}=:{column}" for column in STATS_COLUMNS)),
+            values
+        )
@@ -11,33 +11,67 @@ import sqlite3
 import logging
 from datetime import datetime
 from pathlib import Path
-from flask import Flask, jsonify, request, send_file, abort
+from flask import Flask, Response, jsonify, request, send_file, abort
 from flask_cors import CORS
 import threading
-import math
+import base64
+import binascii
+import argparse
+from itertools import chain
+
+from update_db_schema import apply_migrations
+from geodesy import haversine_miles, track_distance
+from track_simplify import (FULL_DETAIL_ZOOM, build_track_levels, load_track_level,
+                            mean_latitude, simplify, tolerance_for_zoom)
+from response_cache import ResponseCache
+from wsgi_server import serve, time_left
+from json_stream import chunked, close_object, dumps, open_object, stream_array, stream_response
+from heat_tiles import MAX_ZOOM as TILE_MAX_ZOOM, TileCache
+from track_index import points_in_bbox, radius_bbox, rides_in_bbox
+from track_codec import (BINARY_MIMETYPE, POLYLINE_MIMETYPE, POLYLINE_PRECISION,
+                         encode_polyline, encode_track)
+
+# Data directory - MOTO_DATA_DIR overrides it for benchmarks and off-bike runs
+DATA_DIR = Path(os.environ.get('MOTO_DATA_DIR', '/home/pi/motorcycle_data'))
+DB_PATH = DATA_DIR / 'telemetry.db'
+TILE_CACHE_DIR = DATA_DIR / 'tiles'
 
 # Setup logging
 logging.basicConfig(
-    filename='/home/pi/motorcycle_data/route_tracker.log',
+    filename=str(DATA_DIR / 'route_tracker.log'),
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-# Create data directory if it doesn't exist
-DATA_DIR = Path('/home/pi/motorcycle_data')
-DB_PATH = DATA_DIR / 'telemetry.db'
-
 app = Flask(__name__)
 CORS(app)  # Enable cross-origin requests
 
-# Database connection parameters
-DB_TIMEOUT = 30.0  # Seconds to wait for database lock
+# API server - long polls each hold a worker for up to LONG_POLL_MAX
+API_PORT = 5001
+API_THREADS = 16
+
+# Database connection parameters - every wait is also cut to what is left of
+# the request's REQUEST_BUDGET, so a locked database can't hold a worker past it
+DB_TIMEOUT = 5.0   # Seconds to wait for database lock
 DB_RETRIES = 3     # Number of retries for database operations
 DB_RETRY_DELAY = 1 # Seconds between retries
 
+# Ride list pages for /api/rides
+RIDES_PAGE_SIZE = 50
+RIDES_MAX_PAGE_SIZE = 500
+
+# Spatial search parameters for /api/search/bbox and /api/search/radius
+SEARCH_MAX_POINTS = 5000      # Points returned by a search with ?points=1
+SEARCH_MAX_RADIUS_M = 100000  # Largest radius search, in meters
+METERS_PER_MILE = 1609.344
+
+# Long-poll parameters for /api/current_ride_track
+LONG_POLL_MAX = 25.0        # Longest a ?wait= request may block, in seconds
+LONG_POLL_INTERVAL = 0.25   # Seconds between checks for new points
+
 def get_db_connection():
     """Get a database connection with timeout settings"""
-    return sqlite3.connect(str(DB_PATH), timeout=DB_TIMEOUT)
+    return sqlite3.connect(str(DB_PATH), timeout=min(DB_TIMEOUT, time_left()))
 
 def execute_with_retry(func, *args, **kwargs):
     """Execute a database function with retry logic"""
@@ -47,8 +81,11 @@ def execute_with_retry(func, *args, **kwargs):
             return func(*args, **kwargs)
         except sqlite3.OperationalError as e:
             if "database is locked" in str(e):
-                logging.warning(f"Database locked, retrying ({attempt+1}/{DB_RETRIES})...")
                 last_error = e
+                if time_left() <= DB_RETRY_DELAY:
+                    # Out of request budget - fail now rather than retry past it
+                    break
+                logging.warning(f"Database locked, retrying ({attempt+1}/{DB_RETRIES})...")
                 time.sleep(DB_RETRY_DELAY)
             else:
                 # Re-raise if it's not a locking error
@@ -107,6 +144,9 @@ def setup_database():
         
         conn.commit()
         conn.close()
+        
+        # Indexes and other schema upgrades shared with the collector
+        apply_migrations(DB_PATH)
         logging.info("Route tracker database setup complete")
         return True
     except Exception as e:
@@ -117,29 +157,7 @@ def setup_database():
 
 def calculate_distance(points):
     """Calculate distance in miles from a list of GPS coordinates"""
-    if len(points) < 2:
-        return 0
-        
-    # Haversine formula for calculating distance between coordinates
-    distance = 0
-    for i in range(1, len(points)):
-        # Approximate radius of earth in miles
-        R = 3958.8
-        
-        lat1 = math.radians(points[i-1][0])
-        lon1 = math.radians(points[i-1][1])
-        lat2 = math.radians(points[i][0])
-        lon2 = math.radians(points[i][1])
-        
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        
-        a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2)**2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        distance += R * c
-        
-    return distance
+    return track_distance(points)
 
 def start_ride_db_operations(ride_id, ride_name):
     """Database operations for starting a ride with retry logic"""
@@ -198,51 +216,66 @@ def start_ride():
             'message': f"Failed to start ride: {str(e)}"
         }), 500
 
+def update_ride_stats_from_tracks(cursor, ride_id):
+    """Compute a ride's stats by scanning its track - for rides recorded
+    without the collector's incremental statistics"""
+    cursor.execute(
+        """
+        SELECT 
+            MAX(speed_mph) as max_speed,
+            AVG(speed_mph) as avg_speed,
+            COUNT(*) as points
+        FROM tracks 
+        WHERE ride_id=?
+        """, 
+        (ride_id,)
+    )
+    
+    stats = cursor.fetchone()
+    max_speed = stats[0] if stats[0] else 0
+    avg_speed = stats[1] if stats[1] else 0
+    
+    # Get all track points to calculate distance
+    cursor.execute(
+        "SELECT latitude, longitude FROM tracks WHERE ride_id=? ORDER BY timestamp",
+        (ride_id,)
+    )
+    
+    points = cursor.fetchall()
+    distance = calculate_distance(points)
+    
+    # Update the ride record
+    cursor.execute(
+        """
+        UPDATE rides SET 
+            end_time=CURRENT_TIMESTAMP,
+            max_speed_mph=?,
+            avg_speed_mph=?,
+            distance_miles=?,
+            point_count=?,
+            active=0
+        WHERE ride_id=?
+        """,
+        (max_speed, avg_speed, distance, stats[2], ride_id)
+    )
+
 def end_ride_db_operations(ride_id):
     """Database operations for ending a ride with retry logic"""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         
-        # Calculate ride statistics
-        cursor.execute(
-            """
-            SELECT 
-                MAX(speed_mph) as max_speed,
-                AVG(speed_mph) as avg_speed,
-                COUNT(*) as points
-            FROM tracks 
-            WHERE ride_id=?
-            """, 
-            (ride_id,)
-        )
-        
+        # The collector keeps the stats current while the ride is tracked
+        cursor.execute("SELECT point_count FROM rides WHERE ride_id=?", (ride_id,))
         stats = cursor.fetchone()
-        max_speed = stats[0] if stats[0] else 0
-        avg_speed = stats[1] if stats[1] else 0
         
-        # Get all track points to calculate distance
-        cursor.execute(
-            "SELECT latitude, longitude FROM tracks WHERE ride_id=? ORDER BY timestamp",
-            (ride_id,)
-        )
-        
-        points = cursor.fetchall()
-        distance = calculate_distance(points)
-        
-        # Update the ride record
-        cursor.execute(
-            """
-            UPDATE rides SET 
-                end_time=CURRENT_TIMESTAMP,
-                max_speed_mph=?,
-                avg_speed_mph=?,
-                distance_miles=?,
-                active=0
-            WHERE ride_id=?
-            """,
-            (max_speed, avg_speed, distance, ride_id)
-        )
+        if stats and stats[0]:
+            cursor.execute(
+                "UPDATE rides SET end_time=CURRENT_TIMESTAMP, active=0 WHERE ride_id=?",
+                (ride_id,)
+            )
+        else:
+            update_ride_stats_from_tracks(cursor, ride_id)
         
         # Update status table
         cursor.execute(
@@ -291,6 +324,9 @@ def end_ride():
             
         ride_info = execute_with_retry(db_operations)
         
+        # Precompute the simplified map levels without holding up the response
+        threading.Thread(target=cache_track_levels, args=(ride_id,), daemon=True).start()
+        
         if ride_info:
             logging.info(f"Ended ride: {ride_id}")
             return jsonify({
@@ -325,7 +361,9 @@ def tracking_status():
             cursor = conn.cursor()
             
             cursor.execute("""
-                SELECT s.tracking_active, s.current_ride_id, r.name, r.start_time
+                SELECT s.tracking_active, s.current_ride_id, r.name, r.start_time,
+                       r.distance_miles, r.max_speed_mph, r.avg_speed_mph,
+                       r.moving_time_s, r.max_lean_deg, r.max_g, r.point_count
                 FROM status s
                 LEFT JOIN rides r ON s.current_ride_id = r.ride_id
                 WHERE s.id=1
@@ -349,7 +387,14 @@ def tracking_status():
                 response.update({
                     'ride_id': ride_id,
                     'name': result[2],
-                    'start_time': result[3]
+                    'start_time': result[3],
+                    'distance_miles': result[4] or 0,
+                    'max_speed_mph': result[5] or 0,
+                    'avg_speed_mph': result[6] or 0,
+                    'moving_time_s': result[7] or 0,
+                    'max_lean_deg': result[8] or 0,
+                    'max_g': result[9] or 0,
+                    'point_count': result[10] or 0
                 })
                 
             return jsonify(response)
@@ -365,40 +410,93 @@ def tracking_status():
             'message': f"Failed to get tracking status: {str(e)}"
         }), 500
 
+def fetch_current_track(cursor, since=None):
+    """(ride_id, points, total points) for the active ride - only the points
+    after since (a tracks id, or a timestamp) when given"""
+    cursor.execute("""
+        SELECT s.current_ride_id, r.point_count
+        FROM status s
+        LEFT JOIN rides r ON s.current_ride_id = r.ride_id
+        WHERE s.id=1 AND s.tracking_active=1
+    """)
+    result = cursor.fetchone()
+    
+    if not result or not result[0]:
+        return None, None, None
+        
+    ride_id = result[0]
+    
+    # Get track points for this ride
+    if since is None:
+        cursor.execute(
+            """
+            SELECT id, latitude, longitude, altitude, speed_mph, timestamp
+            FROM tracks
+            WHERE ride_id=?
+            ORDER BY timestamp
+            """,
+            (ride_id,)
+        )
+    elif isinstance(since, int):
+        cursor.execute(
+            "SELECT id, latitude, longitude, altitude, speed_mph, timestamp FROM tracks "
+            "WHERE ride_id=? AND id>? ORDER BY id",
+            (ride_id, since)
+        )
+    else:
+        cursor.execute(
+            "SELECT id, latitude, longitude, altitude, speed_mph, timestamp FROM tracks "
+            "WHERE ride_id=? AND timestamp>? ORDER BY timestamp",
+            (ride_id, since)
+        )
+        
+    return ride_id, cursor.fetchall(), result[1]
+
+def wait_for_track_points(since, wait):
+    """fetch_current_track, blocking up to wait seconds for points after since"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        deadline = time.monotonic() + wait
+        while True:
+            ride_id, points, total = fetch_current_track(cursor, since)
+            if ride_id is None or points or since is None or time.monotonic() >= deadline:
+                return ride_id, points, total
+                
+            # data_version changes whenever another connection commits - a cheap
+            # check that avoids re-running the query until the writer has written
+            cursor.execute("PRAGMA data_version")
+            version = cursor.fetchone()[0]
+            while time.monotonic() < deadline:
+                time.sleep(LONG_POLL_INTERVAL)
+                cursor.execute("PRAGMA data_version")
+                if cursor.fetchone()[0] != version:
+                    break
+    finally:
+        conn.close()
+
+def parse_since(value):
+    """since cursor: a tracks id, or a timestamp string"""
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
 @app.route('/api/current_ride_track', methods=['GET'])
 def current_ride_track():
-    """API endpoint to get track points for the current ride"""
+    """API endpoint to get track points for the current ride
+    (?since=<cursor> for only new points, &wait=<seconds> to long-poll for them)"""
     try:
+        since = parse_since(request.args.get('since'))
+        wait = max(0.0, min(request.args.get('wait', 0, type=float), LONG_POLL_MAX))
+        
         def get_track_points():
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Get current ride ID
-            cursor.execute("SELECT current_ride_id FROM status WHERE id=1 AND tracking_active=1")
-            result = cursor.fetchone()
-            
-            if not result or not result[0]:
-                conn.close()
-                return None, None
-                
-            ride_id = result[0]
-            
-            # Get track points for this ride
-            cursor.execute(
-                """
-                SELECT latitude, longitude, altitude, speed_mph, timestamp
-                FROM tracks
-                WHERE ride_id=?
-                ORDER BY timestamp
-                """,
-                (ride_id,)
-            )
+            # Leave room for the final query - a retry only waits out what is left
+            return wait_for_track_points(since, max(0.0, min(wait, time_left() - DB_TIMEOUT)))
             
-            points = cursor.fetchall()
-            conn.close()
-            return ride_id, points
-            
-        ride_id, points = execute_with_retry(get_track_points)
+        ride_id, points, total = execute_with_retry(get_track_points)
         
         if ride_id is None:
             return jsonify({
@@ -406,23 +504,28 @@ def current_ride_track():
                 'message': "No active ride found"
             }), 404
         
+        # Next cursor - the newest point sent, or the client's own if nothing is new
+        cursor = max(point[0] for point in points) if points else since
+        
         # Format points for GeoJSON LineString
         if points:
             track_points = []
             for point in points:
                 track_points.append({
-                    'lat': point[0],
-                    'lon': point[1],
-                    'alt': point[2],
-                    'speed': point[3],
-                    'time': point[4]
+                    'lat': point[1],
+                    'lon': point[2],
+                    'alt': point[3],
+                    'speed': point[4],
+                    'time': point[5]
                 })
                 
             return jsonify({
                 'success': True,
                 'ride_id': ride_id,
                 'points': track_points,
-                'point_count': len(track_points)
+                'point_count': len(track_points),
+                'total_point_count': total,
+                'cursor': cursor
             })
         else:
             return jsonify({
@@ -430,7 +533,9 @@ def current_ride_track():
                 'ride_id': ride_id,
                 'points': [],
                 'point_count': 0,
-                'message': "No track points recorded yet"
+                'total_point_count': total,
+                'cursor': cursor,
+                'message': "No new track points" if since is not None else "No track points recorded yet"
             })
     except Exception as e:
         logging.error(f"Error getting current ride track: {e}")
@@ -439,23 +544,73 @@ def current_ride_track():
             'message': f"Failed to get track: {str(e)}"
         }), 500
 
+# Ride list filters - query parameter, column and comparison
+RIDE_FILTERS = (
+    ('from', 'start_time', '>=', str),           # Rides starting at or after (ISO date/time)
+    ('to', 'start_time', '<', str),              # Rides starting before
+    ('min_distance', 'distance_miles', '>=', float),
+    ('max_distance', 'distance_miles', '<=', float),
+    ('min_speed', 'max_speed_mph', '>=', float), # By the ride's top speed
+    ('max_speed', 'max_speed_mph', '<=', float),
+)
+
+def encode_ride_cursor(start_time, ride_id):
+    """Opaque token for the position after a ride in the list"""
+    return base64.urlsafe_b64encode(json.dumps([start_time, ride_id]).encode()).decode()
+
+def decode_ride_cursor(token):
+    """(start_time, ride_id) of a cursor token; ValueError if it isn't one"""
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError(f"Invalid cursor: {token}")
+    if not (isinstance(position, list) and len(position) == 2 and all(isinstance(v, str) for v in position)):
+        raise ValueError(f"Invalid cursor: {token}")
+    start_time, ride_id = position
+    return start_time, ride_id
+
 @app.route('/api/rides', methods=['GET'])
 def get_rides():
-    """API endpoint to get list of recorded rides"""
+    """API endpoint to get list of recorded rides, newest first
+    (?limit=, ?cursor=<next_cursor of the previous page>, and the RIDE_FILTERS)"""
     try:
+        limit = max(1, min(request.args.get('limit', RIDES_PAGE_SIZE, type=int), RIDES_MAX_PAGE_SIZE))
+        conditions = ["ride_id IS NOT NULL", "start_time IS NOT NULL"]
+        params = []
+        try:
+            for name, column, operator, convert in RIDE_FILTERS:
+                value = request.args.get(name)
+                if value is not None:
+                    conditions.append(f"{column} {operator} ?")
+                    params.append(convert(value))
+            cursor_token = request.args.get('cursor')
+            if cursor_token:
+                # Keyset pagination - seek past the last ride of the previous page
+                conditions.append("(start_time, ride_id) < (?, ?)")
+                params.extend(decode_ride_cursor(cursor_token))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': f"Invalid filter: {str(e)}"
+            }), 400
+            
         def get_ride_list():
             conn = get_db_connection()
             cursor = conn.cursor()
             
+            # One extra row tells whether there is another page
             cursor.execute(
-                """
+                f"""
                 SELECT 
                     ride_id, name, start_time, end_time, 
-                    distance_miles, max_speed_mph, avg_speed_mph, active
+                    distance_miles, max_speed_mph, avg_speed_mph, active,
+                    moving_time_s, max_lean_deg, max_g
                 FROM rides
-                ORDER BY start_time DESC
-                LIMIT 50
-                """
+                WHERE {' AND '.join(conditions)}
+                ORDER BY start_time DESC, ride_id DESC
+                LIMIT ?
+                """,
+                params + [limit + 1]
             )
             
             rides = cursor.fetchall()
@@ -463,6 +618,8 @@ def get_rides():
             return rides
             
         rides = execute_with_retry(get_ride_list)
+        has_more = len(rides) > limit
+        rides = rides[:limit]
         
         ride_list = []
         for ride in rides:
@@ -474,13 +631,17 @@ def get_rides():
                 'distance_miles': ride[4],
                 'max_speed_mph': ride[5],
                 'avg_speed_mph': ride[6],
-                'active': bool(ride[7])
+                'active': bool(ride[7]),
+                'moving_time_s': ride[8],
+                'max_lean_deg': ride[9],
+                'max_g': ride[10]
             })
             
         return jsonify({
             'success': True,
             'rides': ride_list,
-            'count': len(ride_list)
+            'count': len(ride_list),
+            'next_cursor': encode_ride_cursor(rides[-1][2], rides[-1][0]) if has_more else None
         })
     except Exception as e:
         logging.error(f"Error getting rides: {e}")
@@ -489,38 +650,278 @@ def get_rides():
             'message': f"Failed to get rides: {str(e)}"
         }), 500
 
-@app.route('/api/ride/<ride_id>/track', methods=['GET'])
-def get_ride_track(ride_id):
-    """API endpoint to get track points for a specific ride"""
+def search_track_points(bbox, ride_id=None, center=None, radius_m=None, with_points=False):
+    """Rides with points inside bbox (and within radius_m of center when given),
+    using the track_segments R*Tree. Returns (rides, points, truncated)"""
+    conn = get_db_connection()
     try:
-        def get_track_data():
-            conn = get_db_connection()
+        rides = {}
+        points = []
+        truncated = False
+        
+        # A plain area search is counted by SQLite without reading the points out
+        if not center and not with_points:
+            for ride_id_, count, first_time, last_time in rides_in_bbox(conn, *bbox, ride_id=ride_id):
+                rides[ride_id_] = {'ride_id': ride_id_, 'points_in_area': count,
+                                   'first_time': first_time, 'last_time': last_time}
+        else:
+            for ride_id_, track_id, timestamp, lat, lon, speed in points_in_bbox(conn, *bbox, ride_id=ride_id):
+                distance = None
+                if center:
+                    distance = haversine_miles(center[0], center[1], lat, lon) * METERS_PER_MILE
+                    if distance > radius_m:
+                        continue
+                        
+                summary = rides.get(ride_id_)
+                if summary is None:
+                    summary = rides[ride_id_] = {'ride_id': ride_id_, 'points_in_area': 0, 'first_time': timestamp}
+                    if center:
+                        summary['closest_m'] = distance
+                summary['points_in_area'] += 1
+                summary['last_time'] = timestamp
+                if center:
+                    summary['closest_m'] = min(summary['closest_m'], distance)
+                    
+                if not with_points:
+                    continue
+                if len(points) < SEARCH_MAX_POINTS:
+                    points.append({'ride_id': ride_id_, 'lat': lat, 'lon': lon, 'speed': speed, 'time': timestamp})
+                else:
+                    truncated = True
+                    
+        # Ride names and start times for the matches
+        if rides:
             cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT ride_id, name, start_time, active FROM rides WHERE ride_id IN ({', '.join('?' * len(rides))})",
+                list(rides)
+            )
+            for ride_id_, name, start_time, active in cursor.fetchall():
+                rides[ride_id_].update(name=name, start_time=start_time, active=bool(active))
+                
+        ride_list = sorted(rides.values(), key=lambda ride: ride['first_time'] or '', reverse=True)
+        return ride_list, points, truncated
+    finally:
+        conn.close()
+
+def want_search_points():
+    return bool(request.args.get('points', type=int))
+
+def search_response(rides, points, truncated, **area):
+    """JSON response of a spatial search - points only with ?points=1"""
+    response = dict(area, success=True, rides=rides, count=len(rides))
+    if want_search_points():
+        response['points'] = points
+        response['truncated'] = truncated
+    return jsonify(response)
+
+@app.route('/api/search/bbox', methods=['GET'])
+def search_bbox():
+    """API endpoint to find the rides that passed through a map area
+    (?bbox=min_lon,min_lat,max_lon,max_lat[&ride_id=...][&points=1])"""
+    try:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in request.args['bbox'].split(','))
+        except (KeyError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': "bbox=min_lon,min_lat,max_lon,max_lat is required"
+            }), 400
             
-            # Verify ride exists
-            cursor.execute("SELECT name FROM rides WHERE ride_id=?", (ride_id,))
-            ride = cursor.fetchone()
+        def get_matches():
+            return search_track_points((min_lat, min_lon, max_lat, max_lon), request.args.get('ride_id'),
+                                       with_points=want_search_points())
             
-            if not ride:
+        rides, points, truncated = execute_with_retry(get_matches)
+        return search_response(rides, points, truncated, bbox=[min_lon, min_lat, max_lon, max_lat])
+    except Exception as e:
+        logging.error(f"Error searching bbox: {e}")
+        return jsonify({
+            'success': False,
+            'message': f"Failed to search area: {str(e)}"
+        }), 500
+
+@app.route('/api/search/radius', methods=['GET'])
+def search_radius():
+    """API endpoint to find the rides that passed within radius_m of a point
+    (?lat=..&lon=..&radius_m=..[&ride_id=...][&points=1])"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        radius_m = request.args.get('radius_m', 500.0, type=float)
+        if lat is None or lon is None or not 0 < radius_m <= SEARCH_MAX_RADIUS_M:
+            return jsonify({
+                'success': False,
+                'message': f"lat, lon and radius_m (up to {SEARCH_MAX_RADIUS_M} m) are required"
+            }), 400
+            
+        def get_matches():
+            return search_track_points(radius_bbox(lat, lon, radius_m), request.args.get('ride_id'),
+                                       center=(lat, lon), radius_m=radius_m, with_points=want_search_points())
+            
+        rides, points, truncated = execute_with_retry(get_matches)
+        return search_response(rides, points, truncated, center=[lat, lon], radius_m=radius_m)
+    except Exception as e:
+        logging.error(f"Error searching radius: {e}")
+        return jsonify({
+            'success': False,
+            'message': f"Failed to search radius: {str(e)}"
+        }), 500
+
+def get_simplification_args():
+    """zoom / tolerance (meters) query parameters of the track endpoints"""
+    return request.args.get('zoom', type=int), request.args.get('tolerance', type=float)
+
+def open_ride_track(conn, ride_id, zoom=None, tolerance=None):
+    """Ride name and track points, simplified for a map zoom level or a
+    tolerance in meters when one is given.
+    Returns (ride, points, simplification) - ride is None if it doesn't exist.
+    Full-detail points are an open cursor on conn, to be streamed"""
+    cursor = conn.cursor()
+    
+    # Verify ride exists
+    cursor.execute("SELECT name, active, point_count FROM rides WHERE ride_id=?", (ride_id,))
+    ride = cursor.fetchone()
+    
+    if not ride:
+        return None, None, None
+        
+    full_detail = (zoom is None and tolerance is None) or (zoom is not None and zoom >= FULL_DETAIL_ZOOM)
+    
+    # Finished rides are served from the cached levels, built on first use
+    if not full_detail and not ride[1]:
+        level = load_track_level(conn, ride_id, zoom, tolerance, ride[2])
+        if level is None:
+            build_track_levels(conn, ride_id, ride[2])
+            conn.commit()
+            level = load_track_level(conn, ride_id, zoom, tolerance, ride[2])
+        if level and level[2] is not None:
+            return ride, level[2], {'zoom': level[0], 'tolerance_m': level[1]}
+        full_detail = True
+        
+    # Get track points for this ride
+    cursor.execute(
+        """
+        SELECT latitude, longitude, altitude, speed_mph, timestamp
+        FROM tracks
+        WHERE ride_id=?
+        ORDER BY timestamp
+        """,
+        (ride_id,)
+    )
+    
+    if full_detail:
+        return ride, cursor, None
+        
+    # Active ride - the track is still growing, so simplify on the fly
+    points = [point for point in cursor if point[0] is not None and point[1] is not None]
+    if tolerance is None:
+        tolerance = tolerance_for_zoom(zoom, mean_latitude(points))
+    return ride, simplify(points, tolerance), {'zoom': zoom, 'tolerance_m': tolerance}
+
+def cache_track_levels(ride_id):
+    """Precompute the simplified levels of a finished ride"""
+    try:
+        def build():
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("SELECT point_count FROM rides WHERE ride_id=?", (ride_id,))
+                row = cursor.fetchone()
+                count = build_track_levels(conn, ride_id, row[0] if row else None)
+                conn.commit()
+                return count
+            finally:
                 conn.close()
-                return None, None
                 
-            # Get track points for this ride
-            cursor.execute(
-                """
-                SELECT latitude, longitude, altitude, speed_mph, timestamp
-                FROM tracks
-                WHERE ride_id=?
-                ORDER BY timestamp
-                """,
-                (ride_id,)
-            )
-            
-            points = cursor.fetchall()
+        count = execute_with_retry(build)
+        logging.info(f"Cached simplified track levels for {ride_id} ({count} points)")
+    except Exception as e:
+        logging.error(f"Error caching track levels for {ride_id}: {e}")
+
+# Serialized track and GeoJSON responses of finished rides
+ride_cache = ResponseCache()
+CACHED_TRACK_MAX_POINTS = 50000   # Longer full-detail tracks are streamed on every request instead
+
+# Formats of /api/ride/<ride_id>/track, chosen by ?format= or the Accept header
+TRACK_FORMATS = {
+    'json': 'application/json',
+    'polyline': POLYLINE_MIMETYPE,   # Encoded lat/lon path plus the ride fields
+    'binary': BINARY_MIMETYPE,       # Delta-encoded position, altitude, speed and time
+}
+
+def finished_ride_version(ride_id):
+    """Version token for a finished ride's cached responses - its rides row,
+    so any edit re-renders them - or None while the ride is active or missing"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT active, name, start_time, end_time, point_count, distance_miles, stats_updated "
+            "FROM rides WHERE ride_id=?",
+            (ride_id,)
+        )
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+    if not row or row[0]:
+        return None
+    return row[1:]
+
+def get_track_format():
+    """Requested track format name, or None if it isn't one of TRACK_FORMATS"""
+    name = request.args.get('format')
+    if name:
+        return name if name in TRACK_FORMATS else None
+    mimetype = request.accept_mimetypes.best_match(list(TRACK_FORMATS.values()), default='application/json')
+    return next(name for name, value in TRACK_FORMATS.items() if value == mimetype)
+
+def ride_response(cache_key, version, ride, simplification, text, conn):
+    """Response for a streamed track representation - collected and cached
+    for a finished ride, else streamed straight from the cursor"""
+    if version and (simplification or (ride[2] or 0) <= CACHED_TRACK_MAX_POINTS):
+        try:
+            body = ''.join(text).encode()
+        finally:
             conn.close()
-            return ride, points
+        return ride_cache.put(cache_key, version, body).respond()
+    return stream_response(text, on_close=conn.close)
+
+@app.route('/api/ride/<ride_id>/track', methods=['GET'])
+def get_ride_track(ride_id):
+    """API endpoint to get track points for a specific ride
+    (?zoom=<map zoom> or ?tolerance=<meters> for a simplified track,
+    ?format=polyline|binary or an Accept of their media type for a compact one)"""
+    conn = None
+    try:
+        zoom, tolerance = get_simplification_args()
+        track_format = get_track_format()
+        if track_format is None:
+            return jsonify({
+                'success': False,
+                'message': f"Unknown format - use one of {', '.join(TRACK_FORMATS)}"
+            }), 400
+        
+        # Finished rides never change - serve the stored serialization
+        def get_version():
+            return finished_ride_version(ride_id)
+            
+        version = execute_with_retry(get_version)
+        cache_key = (ride_id, track_format, zoom, tolerance)
+        cached = ride_cache.get(cache_key, version) if version else None
+        if cached:
+            response = cached.respond()
+            response.vary.add('Accept')
+            return response
+        
+        conn = get_db_connection()
+        
+        def get_track_data():
+            ride, points, simplification = open_ride_track(conn, ride_id, zoom, tolerance)
+            chunks = chunked(points) if ride else None
+            return ride, chunks, next(chunks, None) if ride else None, simplification
             
-        ride, points = execute_with_retry(get_track_data)
+        ride, chunks, first, simplification = execute_with_retry(get_track_data)
         
         if ride is None:
             return jsonify({
@@ -528,25 +929,54 @@ def get_ride_track(ride_id):
                 'message': "Ride not found"
             }), 404
             
-        # Format points for GeoJSON LineString
-        if points:
-            track_points = []
-            for point in points:
-                track_points.append({
+        # Stream the points as the cursor is read
+        if first:
+            fields = {
+                'success': True,
+                'ride_id': ride_id,
+                'ride_name': ride[0],
+                'simplified': simplification is not None
+            }
+            if simplification:
+                fields.update(simplification)
+                fields['total_point_count'] = ride[2]
+                
+            # Compact formats are small enough to encode whole
+            if track_format != 'json':
+                points = [point for chunk in chain([first], chunks) for point in chunk
+                          if point[0] is not None and point[1] is not None]
+                if track_format == 'polyline':
+                    fields.update(point_count=len(points), precision=POLYLINE_PRECISION,
+                                  polyline=encode_polyline(points))
+                    body = dumps(fields).encode()
+                else:
+                    body = encode_track(points)
+                mimetype = TRACK_FORMATS[track_format]
+                if version:
+                    response = ride_cache.put(cache_key, version, body, mimetype).respond()
+                else:
+                    response = Response(body, mimetype=mimetype)
+                response.vary.add('Accept')
+                return response
+                
+            def track_point(point):
+                return {
                     'lat': point[0],
                     'lon': point[1],
                     'alt': point[2],
                     'speed': point[3],
                     'time': point[4]
-                })
+                }
                 
-            return jsonify({
-                'success': True,
-                'ride_id': ride_id,
-                'ride_name': ride[0],
-                'points': track_points,
-                'point_count': len(track_points)
-            })
+            text = stream_array(
+                chain([first], chunks), track_point,
+                prefix=open_object(fields, 'points'),
+                suffix=lambda count: close_object({'point_count': count})
+            )
+            response = ride_response(cache_key, version, ride, simplification, text, conn)
+            conn = None  # Closed by ride_response or once the stream is sent
+            response.vary.add('Accept')
+            return response
         else:
             return jsonify({
                 'success': True,
@@ -562,39 +992,36 @@ def get_ride_track(ride_id):
             'success': False,
             'message': f"Failed to get track: {str(e)}"
         }), 500
+    finally:
+        if conn:
+            conn.close()
 
 @app.route('/api/ride/<ride_id>/geojson', methods=['GET'])
 def get_ride_geojson(ride_id):
-    """API endpoint to get track points as GeoJSON for a specific ride"""
+    """API endpoint to get track points as GeoJSON for a specific ride
+    (?zoom=<map zoom> or ?tolerance=<meters> for a simplified track)"""
+    conn = None
     try:
-        def get_geojson_data():
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            
-            # Verify ride exists
-            cursor.execute("SELECT name FROM rides WHERE ride_id=?", (ride_id,))
-            ride = cursor.fetchone()
-            
-            if not ride:
-                conn.close()
-                return None, None
-                
-            # Get track points for this ride
-            cursor.execute(
-                """
-                SELECT latitude, longitude, altitude, speed_mph, timestamp
-                FROM tracks
-                WHERE ride_id=?
-                ORDER BY timestamp
-                """,
-                (ride_id,)
-            )
+        zoom, tolerance = get_simplification_args()
+        
+        # Finished rides never change - serve the stored serialization
+        def get_version():
+            return finished_ride_version(ride_id)
             
-            points = cursor.fetchall()
-            conn.close()
-            return ride, points
+        version = execute_with_retry(get_version)
+        cache_key = (ride_id, 'geojson', zoom, tolerance)
+        cached = ride_cache.get(cache_key, version) if version else None
+        if cached:
+            return cached.respond()
+        
+        conn = get_db_connection()
+        
+        def get_geojson_data():
+            ride, points, simplification = open_ride_track(conn, ride_id, zoom, tolerance)
+            chunks = chunked(points) if ride else None
+            return ride, chunks, next(chunks, None) if ride else None, simplification
             
-        ride, points = execute_with_retry(get_geojson_data)
+        ride, chunks, first, simplification = execute_with_retry(get_geojson_data)
         
         if ride is None:
             return jsonify({
@@ -603,46 +1030,89 @@ def get_ride_geojson(ride_id):
             }), 404
             
         # Format as GeoJSON
-        if not points:
+        if not first:
             return jsonify({
                 'success': False,
                 'message': "No track points for this ride"
             }), 404
             
-        # Create GeoJSON LineString
-        coordinates = [[point[1], point[0]] for point in points]  # GeoJSON uses [lon, lat]
-        
-        geojson = {
-            "type": "Feature",
-            "properties": {
-                "name": ride[0],
-                "ride_id": ride_id
-            },
-            "geometry": {
-                "type": "LineString",
-                "coordinates": coordinates
-            }
+        properties = {
+            "name": ride[0],
+            "ride_id": ride_id
         }
-        
-        return jsonify(geojson)
+        if simplification:
+            properties.update(simplification)
+            
+        # Stream a GeoJSON LineString as the cursor is read
+        text = stream_array(
+            chain([first], chunks),
+            lambda point: [point[1], point[0]],  # GeoJSON uses [lon, lat]
+            prefix=open_object({"type": "Feature", "properties": properties}, "geometry")
+                   + open_object({"type": "LineString"}, "coordinates"),
+            suffix='}}'
+        )
+        response = ride_response(cache_key, version, ride, simplification, text, conn)
+        conn = None  # Closed by ride_response or once the stream is sent
+        return response
     except Exception as e:
         logging.error(f"Error getting ride GeoJSON: {e}")
         return jsonify({
             'success': False,
             'message': f"Failed to get GeoJSON: {str(e)}"
         }), 500
+    finally:
+        if conn:
+            conn.close()
+
+# Rendered heatmap tiles, regenerated when the set of finished rides changes
+heat_tiles = TileCache(TILE_CACHE_DIR)
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>', methods=['GET'])
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_heat_tile(z, x, y):
+    """API endpoint for a 256 px PNG heatmap tile of every finished ride"""
+    if z > TILE_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        abort(404)
+    try:
+        def get_tile():
+            conn = get_db_connection()
+            try:
+                return heat_tiles.get(conn, z, x, y)
+            finally:
+                conn.close()
+                
+        path = execute_with_retry(get_tile)
+        response = send_file(str(path), mimetype='image/png', conditional=True, max_age=0)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    except Exception as e:
+        logging.error(f"Error rendering tile {z}/{x}/{y}: {e}")
+        return jsonify({
+            'success': False,
+            'message': f"Failed to render tile: {str(e)}"
+        }), 500
 
-def run_api_server():
-    """Run the Flask API server"""
+def run_api_server(port=API_PORT, threads=API_THREADS, dev=False):
+    """Run the Flask API server - the pooled production server, or Flask's
+    development server with dev=True"""
     try:
-        app.run(host='0.0.0.0', port=5001)
+        if dev:
+            app.run(host='0.0.0.0', port=port, threaded=True)
+        else:
+            serve(app, host='0.0.0.0', port=port, threads=threads)
     except Exception as e:
         logging.error(f"API server error: {e}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Route Tracker API server")
+    parser.add_argument('--port', type=int, default=API_PORT)
+    parser.add_argument('--threads', type=int, default=API_THREADS, help="Worker threads")
+    parser.add_argument('--dev', action='store_true', help="Use Flask's development server")
+    args = parser.parse_args()
+    
     # Setup database
     setup_database()
     
     # Start API server
     logging.info("Starting Route Tracker API server")
-    run_api_server() 
\ No newline at end of file
+    run_api_server(args.port, args.threads, args.dev)
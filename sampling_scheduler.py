@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Deadline-Based Sampling Scheduler
+Runs periodic tasks at independent rates from a monotonic clock using absolute
+deadlines, so slow iterations don't stretch the sampling period
+"""
+
+import time
+import logging
+
+# Ticks starting later than this fraction of a period count as late
+LATE_THRESHOLD = 0.5
+
+
+class ScheduledTask:
+    """A callback run at a fixed rate against absolute deadlines"""
+
+    def __init__(self, name, rate_hz, callback, start_time):
+        self.name = name
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.callback = callback
+        self.start_time = start_time
+        self.tick_index = 0
+        self.next_deadline = start_time
+
+        self.ticks = 0
+        self.late_ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.errors = 0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+
+    def advance(self, now):
+        """Move to the next deadline, skipping any that have already passed"""
+        self.tick_index += 1
+        self.next_deadline = self.start_time + self.tick_index * self.period
+
+        if self.next_deadline <= now:
+            # Can't keep up - drop the missed ticks instead of bursting to catch up
+            self.overruns += 1
+            missed = int((now - self.next_deadline) / self.period) + 1
+            self.skipped_ticks += missed
+            self.tick_index += missed
+            self.next_deadline = self.start_time + self.tick_index * self.period
+
+    def get_stats(self):
+        """Get timing statistics for this task"""
+        ticks = max(self.ticks, 1)
+        return {
+            'rate_hz': self.rate_hz,
+            'ticks': self.ticks,
+            'late_ticks': self.late_ticks,
+            'overruns': self.overruns,
+            'skipped_ticks': self.skipped_ticks,
+            'errors': self.errors,
+            'mean_jitter_ms': round(self.total_jitter / ticks * 1000, 3),
+            'max_jitter_ms': round(self.max_jitter * 1000, 3),
+            'mean_duration_ms': round(self.total_duration / ticks * 1000, 3),
+            'max_duration_ms': round(self.max_duration * 1000, 3)
+        }
+
+
+class SamplingScheduler:
+    """Runs registered tasks at their own rates until told to stop"""
+
+    def __init__(self, clock=time.monotonic, sleep=time.sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.tasks = []
+        self.logger = logging.getLogger(__name__)
+
+    def add_task(self, name, rate_hz, callback):
+        """Register a callback to run rate_hz times per second"""
+        if rate_hz <= 0:
+            raise ValueError(f"Rate for task '{name}' must be positive")
+        task = ScheduledTask(name, rate_hz, callback, self.clock())
+        self.tasks.append(task)
+        return task
+
+    def run(self, should_continue):
+        """Run tasks until should_continue() returns False"""
+        if not self.tasks:
+            return
+
+        # All tasks share one start time so their ticks line up
+        start = self.clock()
+        for task in self.tasks:
+            task.start_time = start
+            task.tick_index = 0
+            task.next_deadline = start
+
+        while should_continue():
+            task = min(self.tasks, key=lambda t: t.next_deadline)
+
+            delay = task.next_deadline - self.clock()
+            if delay > 0:
+                self.sleep(delay)
+
+            self.run_task(task)
+
+    def run_task(self, task):
+        """Run one tick of a task and record its timing"""
+        started = self.clock()
+        jitter = started - task.next_deadline
+
+        try:
+            task.callback()
+        except Exception as e:
+            task.errors += 1
+            self.logger.error(f"Error in {task.name} task: {e}")
+
+        finished = self.clock()
+        duration = finished - started
+
+        task.ticks += 1
+        task.total_jitter += jitter
+        task.max_jitter = max(task.max_jitter, jitter)
+        task.total_duration += duration
+        task.max_duration = max(task.max_duration, duration)
+        if jitter > task.period * LATE_THRESHOLD:
+            task.late_ticks += 1
+
+        task.advance(finished)
+
+    def get_stats(self):
+        """Get timing statistics for all tasks"""
+        return {task.name: task.get_stats() for task in self.tasks}
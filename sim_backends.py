@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Replay and Simulation Sensor Backends
+Stand-ins for the ICM-20948 and the SIM7600 GPS so the telemetry pipeline can
+run end-to-end off the bike - replaying a recorded ride from telemetry.db or a
+ride archive, or generating synthetic IMU and NMEA data at configurable rates
+
+IMU backends mimic the qwiic_icm20948 API (dataReady/getAgmt/axRaw...). GPS
+backends mimic NMEAStreamGPS (enable_gps/start/stop/get_location) and add
+pump(), which the telemetry scheduler calls at rate_hz to deliver fixes that
+are due - so they follow the scheduler's clock instead of running a thread.
+"""
+
+import math
+import time
+import random
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+
+from cellular_gps import NMEAStreamGPS
+from ride_archive import RideArchiveReader, ARCHIVE_SUFFIX
+
+# Synthetic ride defaults
+SYNTHETIC_ORIGIN = (42.809586, -70.867404)   # Matches the dashboard map default
+SYNTHETIC_SPEED_MPH = 45.0
+SYNTHETIC_LOOP_MILES = 5.0
+SYNTHETIC_LEAN_PERIOD = 8.0                  # Seconds per left-right lean cycle
+SYNTHETIC_MAX_LEAN = 35.0                    # Degrees
+ACCEL_SCALE = 16384                          # Raw counts per g, as the dashboards assume
+MILES_PER_DEGREE_LAT = 69.0
+KNOTS_PER_MPH = 1 / 1.15078
+
+IMU_FIELDS = ('ax', 'ay', 'az', 'gx', 'gy', 'gz', 'mx', 'my', 'mz', 'temperature')
+# qwiic_icm20948 attribute holding each field after getAgmt()
+IMU_ATTRIBUTES = {name: name + 'Raw' for name in IMU_FIELDS}
+IMU_ATTRIBUTES['temperature'] = 'tempRaw'
+GPS_FIELDS = ('latitude', 'longitude', 'speed_mph', 'heading', 'gps_fix', 'satellites_used', 'hdop')
+
+
+class VirtualClock:
+    """Clock whose sleep() just advances time, for running as fast as possible"""
+
+    def __init__(self, start_wall=None):
+        self.now = 0.0
+        self.start_wall = time.time() if start_wall is None else start_wall
+
+    def monotonic(self):
+        return self.now
+
+    def monotonic_ns(self):
+        return int(self.now * 1e9)
+
+    def time(self):
+        return self.start_wall + self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class ScaledClock:
+    """Real clock running speed times faster than wall time"""
+
+    def __init__(self, speed=1.0):
+        self.speed = speed
+        self.origin = time.monotonic()
+        self.start_wall = time.time()
+
+    def monotonic(self):
+        return (time.monotonic() - self.origin) * self.speed
+
+    def monotonic_ns(self):
+        return int(self.monotonic() * 1e9)
+
+    def time(self):
+        return self.start_wall + self.monotonic()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speed)
+
+
+def parse_timestamp(value):
+    """Seconds since the epoch for a telemetry_data timestamp string"""
+    timestamp = datetime.fromisoformat(str(value))
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.timestamp()
+
+
+def iter_recorded_samples(source, session_id=None):
+    """Yield (seconds since ride start, sample dict) from telemetry.db or an archive"""
+    source = Path(source)
+
+    if source.suffix == ARCHIVE_SUFFIX:
+        with RideArchiveReader(source) as reader:
+            names = [name for name in IMU_FIELDS + GPS_FIELDS if name in reader.column_names]
+            start = None
+            for begin in range(0, reader.row_count, 1000):
+                columns = reader.read_columns(['t_ns'] + names, begin, begin + 1000)
+                for i, t_ns in enumerate(columns['t_ns']):
+                    start = t_ns if start is None else start
+                    sample = {}
+                    for name in names:
+                        value = columns[name][i]
+                        sample[name] = None if isinstance(value, float) and math.isnan(value) else value
+                    yield (t_ns - start) / 1e9, sample
+        return
+
+    conn = sqlite3.connect(str(source))
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    if session_id is None:
+        cursor.execute("SELECT session_id FROM telemetry_data ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+        session_id = row[0] if row else None
+
+    cursor.execute(
+        f"SELECT timestamp, {', '.join(IMU_FIELDS + GPS_FIELDS)} FROM telemetry_data "
+        "WHERE session_id = ? ORDER BY id",
+        (session_id,)
+    )
+    start = None
+    try:
+        for row in cursor:
+            sample = dict(row)
+            t = parse_timestamp(sample.pop('timestamp'))
+            start = t if start is None else start
+            yield t - start, sample
+    finally:
+        conn.close()
+
+
+class RideReplay:
+    """Shared cursor over a recorded ride, positioned by clock time"""
+
+    def __init__(self, source, clock, session_id=None, loop=False):
+        self.source = source
+        self.session_id = session_id
+        self.clock = clock
+        self.loop = loop
+        self.samples = None
+        self.next_sample = None
+        self.current = None
+        self.generation = 0   # Bumped whenever current changes
+        self.start = None
+        self.offset = 0.0
+        self.finished = False
+
+    def restart(self):
+        self.samples = iter_recorded_samples(self.source, self.session_id)
+        self.next_sample = next(self.samples, None)
+        if self.next_sample is None:
+            self.finished = True
+
+    def advance(self):
+        """Move to the newest recorded sample at or before the current clock time"""
+        if self.samples is None:
+            self.start = self.clock.monotonic()
+            self.restart()
+
+        elapsed = self.clock.monotonic() - self.start - self.offset
+        changed = False
+        while self.next_sample is not None and self.next_sample[0] <= elapsed:
+            self.current = self.next_sample[1]
+            self.next_sample = next(self.samples, None)
+            self.generation += 1
+            changed = True
+
+        if self.next_sample is None and not self.finished:
+            if self.loop:
+                self.offset += elapsed
+                self.restart()
+            else:
+                self.finished = True
+        return changed
+
+
+class ReplayIMU:
+    """qwiic_icm20948 stand-in that replays recorded IMU readings"""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.seen_generation = 0
+        self.connected = True
+        for attribute in IMU_ATTRIBUTES.values():
+            setattr(self, attribute, 0)
+
+    def begin(self):
+        return True
+
+    def dataReady(self):
+        self.replay.advance()
+        return self.replay.generation != self.seen_generation
+
+    def getAgmt(self):
+        self.seen_generation = self.replay.generation
+        sample = self.replay.current or {}
+        for name, attribute in IMU_ATTRIBUTES.items():
+            setattr(self, attribute, sample.get(name) or 0)
+        return True
+
+
+class ReplayGPS:
+    """GPS stand-in that replays recorded fixes"""
+
+    def __init__(self, replay, rate_hz=1.0):
+        self.replay = replay
+        self.rate_hz = rate_hz
+        self.callback = None
+        self.latest = None
+        self.last_position = None
+
+    @property
+    def finished(self):
+        """True once the recording has been played out"""
+        return self.replay.finished
+
+    def enable_gps(self):
+        return True
+
+    def start(self, callback=None):
+        self.callback = callback
+        return True
+
+    def stop(self):
+        pass
+
+    def pump(self):
+        """Publish the recorded fix when the position has moved on"""
+        self.replay.advance()
+        sample = self.replay.current
+        if not sample:
+            return
+        position = (sample.get('latitude'), sample.get('longitude'), sample.get('gps_fix'))
+        if position == self.last_position:
+            return
+        self.last_position = position
+
+        gps_data = {name: sample.get(name) for name in GPS_FIELDS}
+        gps_data['gps_fix'] = bool(gps_data['gps_fix'])
+        gps_data['speed_mph'] = gps_data['speed_mph'] or 0
+        gps_data['satellites_used'] = gps_data['satellites_used'] or 0
+        gps_data['hdop'] = gps_data['hdop'] if gps_data['hdop'] is not None else 99
+        gps_data['timestamp'] = datetime.now()
+        self.latest = gps_data
+        if self.callback:
+            self.callback(gps_data)
+
+    def get_location(self):
+        return dict(self.latest) if self.latest else None
+
+
+class SyntheticIMU:
+    """qwiic_icm20948 stand-in producing a weaving ride with engine vibration"""
+
+    def __init__(self, clock, rate_hz=100.0, seed=None):
+        self.clock = clock
+        self.period = 1.0 / rate_hz
+        self.random = random.Random(seed)
+        self.next_time = 0.0
+        self.connected = True
+        for attribute in IMU_ATTRIBUTES.values():
+            setattr(self, attribute, 0)
+
+    def begin(self):
+        return True
+
+    def dataReady(self):
+        return self.clock.monotonic() >= self.next_time
+
+    def getAgmt(self):
+        t = self.clock.monotonic()
+        self.next_time = t + self.period
+
+        phase = 2 * math.pi * t / SYNTHETIC_LEAN_PERIOD
+        lean = math.radians(SYNTHETIC_MAX_LEAN) * math.sin(phase)
+        self.axRaw = int(self.vibration())
+        self.ayRaw = int(math.sin(lean) * ACCEL_SCALE + self.vibration())
+        self.azRaw = int(math.cos(lean) * ACCEL_SCALE + self.vibration())
+        lean_rate = SYNTHETIC_MAX_LEAN * 2 * math.pi / SYNTHETIC_LEAN_PERIOD * math.cos(phase)
+        self.gxRaw = int(lean_rate * 131)    # 131 LSB per deg/s at +/-250 dps
+        self.gyRaw = int(self.random.gauss(0, 50))
+        self.gzRaw = int(self.random.gauss(0, 50))
+        self.mxRaw, self.myRaw, self.mzRaw = 200, -150, 400
+        self.tempRaw = 2500
+        return True
+
+    def vibration(self):
+        """Engine vibration noise in raw accelerometer counts"""
+        return self.random.gauss(0, 0.02 * ACCEL_SCALE)
+
+
+class SyntheticNMEA(NMEAStreamGPS):
+    """GPS stand-in generating GGA/RMC sentences for a loop and parsing them
+    through the real NMEA streaming path"""
+
+    def __init__(self, clock, rate_hz=1.0, speed_mph=SYNTHETIC_SPEED_MPH,
+                 origin=SYNTHETIC_ORIGIN, loop_miles=SYNTHETIC_LOOP_MILES):
+        super().__init__()
+        self.clock = clock
+        self.rate_hz = rate_hz
+        self.speed_mph = speed_mph
+        self.origin = origin
+        self.radius_miles = loop_miles / (2 * math.pi)
+        self.next_epoch = 0.0
+
+    def enable_gps(self):
+        return True
+
+    def start(self, callback=None):
+        self.callback = callback
+        return True
+
+    def stop(self):
+        pass
+
+    def pump(self):
+        """Emit and parse every epoch that is due"""
+        now = self.clock.monotonic()
+        while self.next_epoch <= now:
+            for sentence in self.epoch_sentences(self.next_epoch):
+                self.handle_sentence(sentence)
+            self.next_epoch += 1.0 / self.rate_hz
+
+    def position(self, t):
+        """Latitude, longitude and course at time t on the loop"""
+        angle = self.speed_mph / 3600 * t / self.radius_miles
+        lat = self.origin[0] + self.radius_miles * math.sin(angle) / MILES_PER_DEGREE_LAT
+        lon = self.origin[1] + self.radius_miles * (1 - math.cos(angle)) / (
+            MILES_PER_DEGREE_LAT * math.cos(math.radians(self.origin[0])))
+        course = (90 - math.degrees(angle)) % 360
+        return lat, lon, course
+
+    def epoch_sentences(self, t):
+        """One GGA + RMC pair for time t"""
+        lat, lon, course = self.position(t)
+        utc = datetime.fromtimestamp(self.clock.time() - self.clock.monotonic() + t, timezone.utc)
+        hhmmss = utc.strftime('%H%M%S.00')
+        lat_field = f"{int(abs(lat)):02d}{abs(lat) % 1 * 60:09.6f},{'N' if lat >= 0 else 'S'}"
+        lon_field = f"{int(abs(lon)):03d}{abs(lon) % 1 * 60:09.6f},{'E' if lon >= 0 else 'W'}"
+        knots = self.speed_mph * KNOTS_PER_MPH
+
+        return [
+            nmea_sentence(f"GPGGA,{hhmmss},{lat_field},{lon_field},1,09,0.8,30.0,M,-33.0,M,,"),
+            nmea_sentence(f"GPRMC,{hhmmss},A,{lat_field},{lon_field},{knots:.1f},{course:.1f},{utc.strftime('%d%m%y')},,,A"),
+        ]
+
+
+def nmea_sentence(body):
+    """Wrap a sentence body with $ and its checksum"""
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Cached System Status
+Background collector for the dashboard's service, record-count and storage
+figures, so a request reads a snapshot instead of forking systemctl and
+counting the whole telemetry table
+
+Service state comes from systemd over D-Bus (dbus-python) when it is
+installed, else from a single `systemctl is-active` call for every unit.
+Record counts and ingest rates come from the counters the telemetry writer
+maintains (telemetry_metrics); on a database without them yet they advance
+incrementally by rowid, with a full recount now and then.
+"""
+
+import os
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+import subprocess
+from collections import deque
+
+from telemetry_metrics import read_metrics
+
+try:
+    import dbus
+except ImportError:
+    dbus = None  # Falls back to systemctl
+
+# Refresh cadence in seconds
+SERVICE_INTERVAL = 10
+COUNT_INTERVAL = 2            # The maintained counters are a few row reads
+STORAGE_INTERVAL = 30
+RECOUNT_INTERVAL = 600        # Full COUNT(*), to notice archived or deleted rows
+RECENT_WINDOW = 300           # Seconds counted as "recent" records
+
+SERVICES = [
+    'motorcycle-telemetry',
+    'gpsd',
+    'gps-proxy',
+    'route-tracker',
+    'tailscaled'
+]
+
+
+class ServiceStates:
+    """ActiveState of systemd units"""
+
+    def __init__(self, services):
+        self.services = services
+        self.bus = None
+        self.manager = None
+        self.logger = logging.getLogger(__name__)
+
+    def dbus_states(self):
+        if self.manager is None:
+            self.bus = dbus.SystemBus()
+            self.manager = dbus.Interface(
+                self.bus.get_object('org.freedesktop.systemd1', '/org/freedesktop/systemd1'),
+                'org.freedesktop.systemd1.Manager'
+            )
+        states = {}
+        for service in self.services:
+            try:
+                path = self.manager.GetUnit(f"{service}.service")
+            except dbus.DBusException:
+                # Not loaded - systemd only keeps units that are running or referenced
+                states[service] = False
+                continue
+            unit = self.bus.get_object('org.freedesktop.systemd1', path)
+            state = unit.Get('org.freedesktop.systemd1.Unit', 'ActiveState',
+                             dbus_interface='org.freedesktop.DBus.Properties')
+            states[service] = str(state) == 'active'
+        return states
+
+    def systemctl_states(self):
+        result = subprocess.run(['systemctl', 'is-active'] + self.services,
+                                capture_output=True, text=True, timeout=10)
+        lines = result.stdout.split()
+        return {service: i < len(lines) and lines[i] == 'active' for i, service in enumerate(self.services)}
+
+    def get(self):
+        """{service: running}"""
+        if dbus is not None:
+            try:
+                return self.dbus_states()
+            except Exception as e:
+                self.logger.warning(f"systemd D-Bus query failed, using systemctl: {e}")
+                self.manager = None
+        try:
+            return self.systemctl_states()
+        except Exception:
+            return {service: False for service in self.services}
+
+
+class RecordCounter:
+    """Total and recent telemetry_data rows, counted incrementally by rowid"""
+
+    def __init__(self):
+        self.total = None
+        self.last_rowid = 0
+        self.recounted = 0
+        self.marks = deque()     # (monotonic time, MAX(rowid)) of each refresh
+
+    def refresh(self, conn):
+        now = time.monotonic()
+        max_rowid = conn.execute("SELECT MAX(rowid) FROM telemetry_data").fetchone()[0] or 0
+
+        if self.total is None or max_rowid < self.last_rowid or now - self.recounted > RECOUNT_INTERVAL:
+            self.total = conn.execute("SELECT COUNT(*) FROM telemetry_data").fetchone()[0]
+            self.recounted = now
+            if not self.marks or max_rowid < self.last_rowid:
+                # Seed the recent window once from the timestamps
+                first = conn.execute(
+                    "SELECT MIN(rowid) FROM telemetry_data WHERE timestamp > datetime('now', ?)",
+                    (f"-{RECENT_WINDOW} seconds",)
+                ).fetchone()[0]
+                self.marks = deque([(now - RECENT_WINDOW, first - 1 if first else max_rowid)])
+        elif max_rowid > self.last_rowid:
+            self.total += conn.execute(
+                "SELECT COUNT(*) FROM telemetry_data WHERE rowid > ?", (self.last_rowid,)
+            ).fetchone()[0]
+        self.last_rowid = max_rowid
+
+        self.marks.append((now, max_rowid))
+        # Keep the newest mark at or before the window start as its boundary
+        while len(self.marks) > 1 and self.marks[1][0] <= now - RECENT_WINDOW:
+            self.marks.popleft()
+        recent = conn.execute(
+            "SELECT COUNT(*) FROM telemetry_data WHERE rowid > ?", (self.marks[0][1],)
+        ).fetchone()[0]
+        return self.total, recent
+
+
+class StatusCollector:
+    """Refreshes each part of the status on its own cadence in a daemon thread"""
+
+    def __init__(self, db_path, services=SERVICES):
+        self.db_path = db_path
+        self.services = ServiceStates(services)
+        self.counter = RecordCounter()
+        self.status = {
+            'services': {service: False for service in services},
+            'recent_records': 0,
+            'total_records': 0,
+            'ingest_rates': {},
+            'storage_used_gb': 0,
+            'storage_free_gb': 0,
+            'storage_total_gb': 0,
+            'storage_percent': 0,
+            'database_size_mb': 0,
+        }
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread:
+                return
+            self.thread = threading.Thread(target=self.run, name='status-collector', daemon=True)
+            self.thread.start()
+
+    def snapshot(self):
+        """Copy of the latest status, starting the collector on first use"""
+        self.start()
+        with self.lock:
+            return dict(self.status, services=dict(self.status['services']),
+                        ingest_rates=dict(self.status['ingest_rates']))
+
+    def update(self, **values):
+        with self.lock:
+            self.status.update(values)
+
+    def refresh_services(self):
+        self.update(services=self.services.get())
+
+    def refresh_counts(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            metrics = read_metrics(conn)
+            if metrics is None:
+                total, recent = self.counter.refresh(conn)
+                self.update(total_records=total, recent_records=recent)
+                return
+        finally:
+            conn.close()
+        self.update(total_records=metrics['total_records'], recent_records=metrics['recent']['5m'],
+                    ingest_rates=metrics['rates'])
+
+    def refresh_storage(self):
+        total, used, free = shutil.disk_usage('/')
+        db_size_mb = 0
+        try:
+            db_size_mb = os.stat(self.db_path).st_size / (1024**2)
+        except OSError:
+            pass
+        self.update(
+            storage_used_gb=round(used / (1024**3), 1),
+            storage_free_gb=round(free / (1024**3), 1),
+            storage_total_gb=round(total / (1024**3), 1),
+            storage_percent=round(used / total * 100, 1),
+            database_size_mb=round(db_size_mb, 1)
+        )
+
+    def run(self):
+        tasks = [
+            [self.refresh_counts, COUNT_INTERVAL, 0],
+            [self.refresh_storage, STORAGE_INTERVAL, 0],
+            [self.refresh_services, SERVICE_INTERVAL, 0],
+        ]
+        while True:
+            now = time.monotonic()
+            for task in tasks:
+                refresh, interval, due = task
+                if now >= due:
+                    try:
+                        refresh()
+                    except Exception as e:
+                        logging.getLogger(__name__).warning(f"Status refresh failed ({refresh.__name__}): {e}")
+                    task[2] = now + interval
+            time.sleep(max(0.1, min(task[2] for task in tasks) - time.monotonic()))
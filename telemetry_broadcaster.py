@@ -11,9 +11,14 @@ import requests
 import threading
 import queue
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 import socket
 
+from telemetry_hub import HubSubscriber
+from telemetry_writer import TELEMETRY_COLUMNS
+
+SESSION_LOOKUP_INTERVAL = 10.0  # Seconds a looked-up ride session is trusted before checking again
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +31,8 @@ class TelemetryBroadcaster:
         self.data_queue = queue.Queue(maxsize=1000)
         self.running = False
         self.last_row_id = self.get_last_row_id()
+        self.session_id = None
+        self.session_checked = 0
         
         # Server configuration - can be changed to your server
         self.server_url = "http://your-server.com/api/telemetry"  # Change this
@@ -47,43 +54,103 @@ class TelemetryBroadcaster:
             return 0
     
     def collect_data(self):
-        """Continuously collect new data from database"""
+        """Continuously collect new data - pushed by the telemetry hub, or
+        polled from the database while the hub isn't running"""
         logging.info("📊 Starting data collection...")
+        # Only samples the collector is saving - idle samples aren't uploaded
+        subscriber = HubSubscriber(name='broadcaster', recording_only=True)
         
+        while self.running:
+            if subscriber.connected or subscriber.connect():
+                self.collect_from_hub(subscriber)
+                # Hub gone - resume polling from the newest row
+                self.last_row_id = self.get_last_row_id()
+            else:
+                self.poll_database()
+        subscriber.close()
+    
+    def collect_from_hub(self, subscriber):
+        """Queue samples as the hub pushes them, until it goes away"""
+        logging.info("📡 Receiving samples from the telemetry hub")
+        dropped = subscriber.dropped
         while self.running:
+            try:
+                sample = subscriber.recv(timeout=1)
+            except ConnectionError:
+                logging.warning("Telemetry hub disconnected - polling the database")
+                return
+            
+            if subscriber.dropped != dropped:
+                logging.warning(f"Fell behind the hub: {subscriber.dropped - dropped} samples dropped")
+                dropped = subscriber.dropped
+            if sample:
+                data = self.sample_row(sample)
+                
+                # Add to queue if not full
+                if not self.data_queue.full():
+                    self.data_queue.put(data)
+    
+    def sample_row(self, sample):
+        """A hub sample in the shape of the telemetry_data row it is saved as"""
+        row = {column: sample.get(column) for column in TELEMETRY_COLUMNS}
+        row['session_id'] = self.current_session_id()
+        # As sqlite3 stores a datetime
+        row['timestamp'] = datetime.fromtimestamp(sample['t_wall'], timezone.utc).isoformat(' ')
+        return row
+    
+    def current_session_id(self):
+        """Session of the ride being recorded - hub samples don't carry it"""
+        now = time.monotonic()
+        if self.session_id is None or now - self.session_checked >= SESSION_LOOKUP_INTERVAL:
             try:
                 conn = sqlite3.connect(self.db_path)
-                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT session_id FROM rides WHERE end_time IS NULL ORDER BY start_time DESC LIMIT 1"
+                )
+                result = cursor.fetchone()
+                conn.close()
+                self.session_id = result[0] if result else None
+                self.session_checked = now
+            except Exception as e:
+                logging.error(f"Error looking up ride session: {e}")
+        return self.session_id
+    
+    def poll_database(self):
+        """Queue rows written since the last check"""
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            
+            # Get new rows since last check
+            cursor.execute("""
+                SELECT rowid, * FROM telemetry_data 
+                WHERE rowid > ? 
+                ORDER BY rowid 
+                LIMIT 100
+            """, (self.last_row_id,))
+            
+            rows = cursor.fetchall()
+            
+            for row in rows:
+                # Convert row to dict
+                data = dict(row)
+                self.last_row_id = data['rowid']
                 
-                # Get new rows since last check
-                cursor.execute("""
-                    SELECT rowid, * FROM telemetry_data 
-                    WHERE rowid > ? 
-                    ORDER BY rowid 
-                    LIMIT 100
-                """, (self.last_row_id,))
-                
-                rows = cursor.fetchall()
+                # Add to queue if not full
+                if not self.data_queue.full():
+                    self.data_queue.put(data)
                 
-                for row in rows:
-                    # Convert row to dict
-                    data = dict(row)
-                    self.last_row_id = data['rowid']
-                    
-                    # Add to queue if not full
-                    if not self.data_queue.full():
-                        self.data_queue.put(data)
-                    
-                conn.close()
+            conn.close()
+            
+            # Sleep if no new data
+            if not rows:
+                time.sleep(1)
                 
-                # Sleep if no new data
-                if not rows:
-                    time.sleep(1)
-                    
-            except Exception as e:
-                logging.error(f"Error collecting data: {e}")
-                time.sleep(5)
+        except Exception as e:
+            logging.error(f"Error collecting data: {e}")
+            time.sleep(5)
     
     def send_http(self, data_batch):
         """Send data via HTTP POST"""
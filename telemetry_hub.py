@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Telemetry Pub/Sub Hub
+The telemetry process pushes every sample to subscribers over a Unix-domain
+socket the moment it is taken; dashboards and the broadcaster consume
+samples from here instead of polling SQLite, which is left to persistence
+
+Frames (both directions):
+    u32 payload length, u8 frame type, payload
+    SUBSCRIBE  client -> hub  JSON options (see HubSubscriber)
+    HELLO      hub -> client  JSON {version, fields, sample_size}
+    SAMPLE     hub -> client  u64 sequence + the telemetry ring's packed sample
+    DROPPED    hub -> client  u64 samples dropped for this subscriber since the last notice
+    IMU_BURST  hub -> client  u64 burst sequence + IMU_FRAME_STRUCT per full-rate IMU frame
+                              (i64 sensor t_ns, accel XYZ, gyro XYZ), to subscribers
+                              that asked for imu_bursts
+
+Each subscriber has its own bounded queue and sender thread, so a slow
+consumer never delays the collector or the other subscribers. When its
+queue is full the subscriber's policy applies: drop_oldest (live views want
+the newest sample), drop_newest (keep a contiguous run), or disconnect.
+
+Command line (for Node-RED exec nodes in spawn mode):
+    python3 telemetry_hub.py --follow [--rate 5] [--imu]   one JSON sample per line
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import struct
+import logging
+import argparse
+import threading
+from collections import deque
+
+from telemetry_ring import PAYLOAD_STRUCT, FIELD_NAMES, sample_values, values_sample
+
+HUB_SOCKET_PATH = os.environ.get('MOTO_HUB_SOCKET', '/tmp/motorcycle_telemetry.sock')
+HUB_VERSION = 1
+HUB_QUEUE = 256              # Samples a subscriber may fall behind by before its policy applies
+HUB_MAX_SUBSCRIBERS = 16
+HANDSHAKE_TIMEOUT = 2.0      # Seconds a new connection has to send SUBSCRIBE
+RECONNECT_DELAY = 1.0        # Seconds between a subscriber's connection attempts
+
+FRAME_HEADER = struct.Struct('<IB')
+SEQUENCE_STRUCT = struct.Struct('<Q')
+FRAME_SUBSCRIBE, FRAME_HELLO, FRAME_SAMPLE, FRAME_DROPPED, FRAME_IMU_BURST = 1, 2, 3, 4, 5
+IMU_FRAME_STRUCT = struct.Struct('<q6h')
+MAX_FRAME_SIZE = 64 * 1024
+
+POLICIES = ('drop_oldest', 'drop_newest', 'disconnect')
+
+
+def encode_frame(frame_type, payload):
+    return FRAME_HEADER.pack(len(payload), frame_type) + payload
+
+
+def encode_sample(sequence, sample):
+    return encode_frame(FRAME_SAMPLE, SEQUENCE_STRUCT.pack(sequence) + PAYLOAD_STRUCT.pack(*sample_values(sample)))
+
+
+def encode_imu_burst(sequence, frames):
+    return encode_frame(FRAME_IMU_BURST, SEQUENCE_STRUCT.pack(sequence) +
+                        b''.join(IMU_FRAME_STRUCT.pack(*frame) for frame in frames))
+
+
+def decode_imu_burst(payload):
+    return {
+        'sequence': SEQUENCE_STRUCT.unpack_from(payload)[0],
+        'imu_burst': list(IMU_FRAME_STRUCT.iter_unpack(payload[SEQUENCE_STRUCT.size:])),
+    }
+
+
+def decode_sample(payload):
+    sample = values_sample(PAYLOAD_STRUCT.unpack_from(payload, SEQUENCE_STRUCT.size))
+    sample['sequence'] = SEQUENCE_STRUCT.unpack_from(payload)[0]
+    return sample
+
+
+class FrameReader:
+    """Reassembles frames from a stream socket"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def read(self):
+        """(type, payload) of the next frame, None if the socket timed out
+        first; raises ConnectionError when the peer has gone"""
+        while True:
+            if len(self.buffer) >= FRAME_HEADER.size:
+                length, frame_type = FRAME_HEADER.unpack_from(self.buffer)
+                if length > MAX_FRAME_SIZE:
+                    raise ConnectionError(f"Oversized frame ({length} bytes)")
+                end = FRAME_HEADER.size + length
+                if len(self.buffer) >= end:
+                    payload = bytes(self.buffer[FRAME_HEADER.size:end])
+                    del self.buffer[:end]
+                    return frame_type, payload
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                return None
+            if not data:
+                raise ConnectionError("Connection closed")
+            self.buffer += data
+
+
+class Subscription:
+    """Hub side of one subscriber: filters, bounded queue and sender thread"""
+
+    def __init__(self, hub, sock, options):
+        self.hub = hub
+        self.sock = sock
+        self.name = options.get('name', 'subscriber')
+        self.policy = options.get('policy', 'drop_oldest')
+        if self.policy not in POLICIES:
+            raise ValueError(f"Unknown policy {self.policy}")
+        self.max_queue = max(1, int(options.get('queue', HUB_QUEUE)))
+        max_rate = options.get('max_rate')
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.require_fix = bool(options.get('require_fix'))
+        self.recording_only = bool(options.get('recording_only'))
+        self.imu_bursts = bool(options.get('imu_bursts'))
+
+        self.queue = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.dropped_total = 0
+        self.sent = 0
+        self.last_accepted = None
+        self.running = True
+
+    def wants(self, sample, now):
+        if self.require_fix and not sample.get('gps_fix'):
+            return False
+        if self.recording_only and not sample.get('recording'):
+            return False
+        if self.min_interval and self.last_accepted is not None and now - self.last_accepted < self.min_interval:
+            return False
+        self.last_accepted = now
+        return True
+
+    def offer(self, frame):
+        """Queue a frame (publisher thread) - never blocks"""
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                if self.policy == 'drop_oldest':
+                    self.queue.popleft()
+                elif self.policy == 'drop_newest':
+                    self.dropped += 1
+                    self.dropped_total += 1
+                    return
+                else:
+                    self.running = False
+                    self.condition.notify()
+                    return
+                self.dropped += 1
+                self.dropped_total += 1
+            self.queue.append(frame)
+            self.condition.notify()
+
+    def run(self):
+        """Send queued frames until the subscriber goes away"""
+        try:
+            while True:
+                with self.condition:
+                    while self.running and self.hub.running and not self.queue:
+                        self.condition.wait(1.0)
+                    if not (self.running and self.hub.running):
+                        break
+                    frames = list(self.queue)
+                    self.queue.clear()
+                    dropped, self.dropped = self.dropped, 0
+                if dropped:
+                    frames.insert(0, encode_frame(FRAME_DROPPED, SEQUENCE_STRUCT.pack(dropped)))
+                self.sock.sendall(b''.join(frames))
+                self.sent += len(frames)
+        except OSError:
+            pass
+        finally:
+            self.close()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.hub.remove(self)
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class TelemetryHub:
+    """Publisher side, run inside the telemetry process"""
+
+    def __init__(self, path=HUB_SOCKET_PATH):
+        self.path = path
+        self.server = None
+        self.subscriptions = []
+        self.lock = threading.Lock()
+        self.sequence = 0
+        self.burst_sequence = 0
+        self.running = False
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        """Listen on the socket path, replacing a stale socket from a previous run"""
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(HUB_MAX_SUBSCRIBERS)
+        self.running = True
+        threading.Thread(target=self.accept_loop, name='hub-accept', daemon=True).start()
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self.handshake, args=(sock,), name='hub-subscriber', daemon=True).start()
+
+    def handshake(self, sock):
+        """Read SUBSCRIBE, answer HELLO, then serve the subscription in this thread"""
+        subscription = None
+        try:
+            sock.settimeout(HANDSHAKE_TIMEOUT)
+            frame = FrameReader(sock).read()
+            if frame is None or frame[0] != FRAME_SUBSCRIBE:
+                raise ConnectionError("Expected SUBSCRIBE")
+            subscription = Subscription(self, sock, json.loads(frame[1] or b'{}'))
+            with self.lock:
+                if len(self.subscriptions) >= HUB_MAX_SUBSCRIBERS:
+                    raise ConnectionError("Too many subscribers")
+                self.subscriptions.append(subscription)
+            sock.settimeout(None)
+            hello = {'version': HUB_VERSION, 'fields': FIELD_NAMES, 'sample_size': PAYLOAD_STRUCT.size,
+                     'imu_frame_size': IMU_FRAME_STRUCT.size}
+            sock.sendall(encode_frame(FRAME_HELLO, json.dumps(hello).encode()))
+        except (OSError, ValueError, ConnectionError) as e:
+            self.logger.warning(f"Hub subscriber rejected: {e}")
+            if subscription is not None:
+                # Registered before HELLO so no sample is missed - give the slot back
+                with self.lock:
+                    if subscription in self.subscriptions:
+                        self.subscriptions.remove(subscription)
+            sock.close()
+            return
+        self.logger.info(f"Hub subscriber connected: {subscription.name} ({subscription.policy})")
+        subscription.run()
+
+    def remove(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+                self.logger.info(f"Hub subscriber left: {subscription.name} "
+                                 f"({subscription.sent} frames sent, {subscription.dropped_total} dropped)")
+
+    def publish(self, sample):
+        """Push a sample dict to every subscriber that wants it"""
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        if not subscriptions:
+            return
+        self.sequence += 1
+        now = time.monotonic()
+        frame = None
+        for subscription in subscriptions:
+            if subscription.wants(sample, now):
+                if frame is None:
+                    frame = encode_sample(self.sequence, sample)
+                subscription.offer(frame)
+
+    def publish_imu_burst(self, frames):
+        """Push one drain of full-rate IMU frames to the subscribers that asked for them"""
+        with self.lock:
+            subscriptions = [s for s in self.subscriptions if s.imu_bursts]
+        self.burst_sequence += 1
+        if not subscriptions or not frames:
+            return
+        # Keep each frame under MAX_FRAME_SIZE however long the drain was
+        per_frame = (MAX_FRAME_SIZE - SEQUENCE_STRUCT.size) // IMU_FRAME_STRUCT.size
+        encoded = [encode_imu_burst(self.burst_sequence, frames[i:i + per_frame])
+                   for i in range(0, len(frames), per_frame)]
+        for subscription in subscriptions:
+            for frame in encoded:
+                subscription.offer(frame)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'published': self.sequence,
+                'imu_bursts': self.burst_sequence,
+                'subscribers': [
+                    {'name': s.name, 'queued': len(s.queue), 'sent': s.sent, 'dropped': s.dropped_total}
+                    for s in self.subscriptions
+                ],
+            }
+
+    def stop(self):
+        self.running = False
+        if self.server:
+            self.server.close()
+            self.server = None
+        for subscription in list(self.subscriptions):
+            subscription.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+class HubSubscriber:
+    """Consumer side. Options are applied by the hub:
+        max_rate        at most this many samples per second (decimated)
+        require_fix     only samples with a GPS fix
+        recording_only  only samples taken while a ride is being recorded
+        policy          drop_oldest / drop_newest / disconnect when this subscriber falls behind
+        queue           how far behind (in samples) it may fall first
+        imu_bursts      also receive every full-rate IMU FIFO frame, as
+                        {'sequence', 'imu_burst': [(t_ns, ax, ay, az, gx, gy, gz), ...]}
+                        (not subject to the sample filters above)"""
+
+    def __init__(self, path=HUB_SOCKET_PATH, name='subscriber', max_rate=None, require_fix=False,
+                 recording_only=False, policy='drop_oldest', queue=HUB_QUEUE, imu_bursts=False):
+        self.path = path
+        self.options = {
+            'name': name, 'max_rate': max_rate, 'require_fix': require_fix,
+            'recording_only': recording_only, 'policy': policy, 'queue': queue,
+            'imu_bursts': imu_bursts,
+        }
+        self.sock = None
+        self.reader = None
+        self.dropped = 0
+
+    def connect(self):
+        """Subscribe; False if the hub isn't running"""
+        self.close()
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(HANDSHAKE_TIMEOUT)
+            sock.connect(self.path)
+            sock.sendall(encode_frame(FRAME_SUBSCRIBE, json.dumps(self.options).encode()))
+            reader = FrameReader(sock)
+            frame = reader.read()
+            if frame is None or frame[0] != FRAME_HELLO:
+                raise ConnectionError("No HELLO from hub")
+            hello = json.loads(frame[1])
+            if hello.get('version') != HUB_VERSION or hello.get('sample_size') != PAYLOAD_STRUCT.size:
+                raise ConnectionError(f"Incompatible hub: {hello}")
+        except (OSError, ValueError, ConnectionError):
+            try:
+                sock.close()
+            except OSError:
+                pass
+            return False
+        self.sock = sock
+        self.reader = reader
+        return True
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def recv(self, timeout=None):
+        """Next sample dict (or IMU burst, if subscribed to them), or None if
+        none arrived within timeout; raises
+        ConnectionError (and disconnects) if the hub went away"""
+        if self.sock is None:
+            raise ConnectionError("Not subscribed")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                self.sock.settimeout(remaining)
+                frame = self.reader.read()
+                if frame is None:
+                    return None
+                frame_type, payload = frame
+                if frame_type == FRAME_SAMPLE:
+                    return decode_sample(payload)
+                if frame_type == FRAME_IMU_BURST:
+                    return decode_imu_burst(payload)
+                if frame_type == FRAME_DROPPED:
+                    self.dropped += SEQUENCE_STRUCT.unpack(payload)[0]
+        except (OSError, ConnectionError) as e:
+            self.close()
+            raise ConnectionError(str(e))
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self.reader = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Follow live samples from the telemetry hub')
+    parser.add_argument('--follow', action='store_true', help='Print every sample as a JSON line')
+    parser.add_argument('--rate', type=float, help='At most this many samples per second')
+    parser.add_argument('--fix', action='store_true', help='Only samples with a GPS fix')
+    parser.add_argument('--imu', action='store_true', help='Also print the full-rate IMU FIFO bursts')
+    parser.add_argument('--path', default=HUB_SOCKET_PATH, help='Hub socket path')
+    args = parser.parse_args()
+
+    subscriber = HubSubscriber(args.path, name='cli', max_rate=args.rate, require_fix=args.fix,
+                               imu_bursts=args.imu)
+    while True:
+        if not subscriber.connected and not subscriber.connect():
+            if not args.follow:
+                print(json.dumps({'error': 'telemetry hub not available'}))
+                sys.exit(1)
+            time.sleep(RECONNECT_DELAY)
+            continue
+        try:
+            sample = subscriber.recv()
+        except ConnectionError:
+            continue
+        print(json.dumps(sample), flush=True)
+        if not args.follow:
+            break
+
+
+if __name__ == "__main__":
+    main()
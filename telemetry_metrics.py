@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Telemetry Row Metrics
+Row counts and ingest rates kept current by the telemetry writer, so the
+dashboards read a few rows instead of COUNT(*) over the whole history
+
+    telemetry_counts  rows and last timestamp per session, plus a total row
+    ingest_minutes    rows written per minute of sample time, for the last day
+
+The writer adds each committed batch's counts (one upsert per session and
+minute touched, not per row); migration 9 backfills both tables from what
+was recorded before. Rows written by anything other than the writer are not
+counted until the migration's backfill is run again.
+"""
+
+import time
+import sqlite3
+from datetime import datetime, timezone
+
+# Metrics configuration
+TOTAL_KEY = '*'              # telemetry_counts row holding the table total
+NO_SESSION_KEY = ''          # Samples recorded outside a session
+RATE_WINDOWS = (1, 5, 15)    # Minutes averaged for the ingest rates
+KEEP_MINUTES = 24 * 60       # ingest_minutes history kept
+
+
+def create_metrics_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS telemetry_counts (
+            session_id TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL DEFAULT 0,
+            last_timestamp TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingest_minutes (
+            minute INTEGER PRIMARY KEY,
+            rows INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def sample_epoch(timestamp):
+    """Epoch seconds of a sample timestamp (datetime or ISO string)"""
+    if isinstance(timestamp, datetime):
+        return timestamp.timestamp()
+    return datetime.fromisoformat(str(timestamp)).timestamp()
+
+
+def record_batch(conn, batch):
+    """Add a committed batch of samples to the counters (inside the caller's transaction)"""
+    sessions = {}
+    minutes = {}
+    for sample in batch:
+        timestamp = sample.get('timestamp')
+        key = sample.get('session_id') or NO_SESSION_KEY
+        rows, _ = sessions.get(key, (0, None))
+        sessions[key] = (rows + 1, timestamp)
+        if timestamp is not None:
+            minute = int(sample_epoch(timestamp) // 60)
+            minutes[minute] = minutes.get(minute, 0) + 1
+
+    sessions[TOTAL_KEY] = (len(batch), batch[-1].get('timestamp'))
+    conn.executemany("""
+        INSERT INTO telemetry_counts (session_id, rows, last_timestamp) VALUES (?, ?, ?)
+        ON CONFLICT (session_id) DO UPDATE SET
+            rows = rows + excluded.rows,
+            last_timestamp = COALESCE(excluded.last_timestamp, last_timestamp)
+    """, [(key, rows, str(timestamp) if timestamp is not None else None)
+          for key, (rows, timestamp) in sessions.items()])
+    conn.executemany("""
+        INSERT INTO ingest_minutes (minute, rows) VALUES (?, ?)
+        ON CONFLICT (minute) DO UPDATE SET rows = rows + excluded.rows
+    """, list(minutes.items()))
+    if minutes:
+        conn.execute("DELETE FROM ingest_minutes WHERE minute < ?", (max(minutes) - KEEP_MINUTES,))
+
+
+def backfill_metrics(conn):
+    """Recount both tables from telemetry_data (inside the caller's transaction)"""
+    conn.execute("DELETE FROM telemetry_counts")
+    conn.execute("""
+        INSERT INTO telemetry_counts (session_id, rows, last_timestamp)
+        SELECT COALESCE(session_id, ?), COUNT(*), MAX(timestamp) FROM telemetry_data
+        GROUP BY COALESCE(session_id, ?)
+    """, (NO_SESSION_KEY, NO_SESSION_KEY))
+    conn.execute("""
+        INSERT INTO telemetry_counts (session_id, rows, last_timestamp)
+        SELECT ?, COALESCE(SUM(rows), 0), MAX(last_timestamp) FROM telemetry_counts
+    """, (TOTAL_KEY,))
+
+    # Per-minute history from the newest sample back - a range read of idx_telemetry_time
+    conn.execute("DELETE FROM ingest_minutes")
+    newest = conn.execute("SELECT MAX(timestamp) FROM telemetry_data").fetchone()[0]
+    if newest is None:
+        return
+    newest_minute = int(sample_epoch(newest) // 60)
+    # Compare on the date alone - stored timestamps use both 'T' and ' ' separators
+    since = datetime.fromtimestamp((newest_minute - KEEP_MINUTES) * 60, timezone.utc).strftime('%Y-%m-%d')
+    conn.execute("""
+        INSERT INTO ingest_minutes (minute, rows)
+        SELECT CAST(strftime('%s', timestamp) AS INTEGER) / 60 AS minute, COUNT(*) FROM telemetry_data
+        WHERE timestamp >= ? GROUP BY minute
+    """, (since,))
+    conn.execute("DELETE FROM ingest_minutes WHERE minute < ?", (newest_minute - KEEP_MINUTES,))
+
+
+def read_metrics(conn, now=None):
+    """Total rows, rows in the last RATE_WINDOWS minutes and the ingest rate
+    (rows/s) over each, or None if the metrics tables don't exist yet"""
+    try:
+        row = conn.execute(
+            "SELECT rows, last_timestamp FROM telemetry_counts WHERE session_id = ?", (TOTAL_KEY,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    now = time.time() if now is None else now
+    current = int(now // 60)
+    minutes = dict(conn.execute(
+        "SELECT minute, rows FROM ingest_minutes WHERE minute >= ?", (current - max(RATE_WINDOWS),)
+    ).fetchall())
+
+    metrics = {
+        'total_records': row[0] if row else 0,
+        'last_timestamp': row[1] if row else None,
+        'recent': {},
+        'rates': {},
+    }
+    for window in RATE_WINDOWS:
+        # The last `window` whole minutes plus the part of the current one
+        rows = sum(count for minute, count in minutes.items() if minute >= current - window)
+        elapsed = window * 60 + (now - current * 60)
+        metrics['recent'][f"{window}m"] = rows
+        metrics['rates'][f"{window}m"] = round(rows / elapsed, 2)
+    return metrics
+
+
+def session_counts(conn, session_ids=None):
+    """{session_id: rows} for the given sessions, or all of them"""
+    if session_ids is None:
+        rows = conn.execute(
+            "SELECT session_id, rows FROM telemetry_counts WHERE session_id != ?", (TOTAL_KEY,)
+        ).fetchall()
+    else:
+        session_ids = list(session_ids)
+        rows = conn.execute(
+            f"SELECT session_id, rows FROM telemetry_counts WHERE session_id IN ({', '.join('?' * len(session_ids))})",
+            session_ids
+        ).fetchall() if session_ids else []
+    return dict(rows)
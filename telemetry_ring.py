@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory Telemetry Ring Buffer
+The telemetry process publishes every sample into a fixed-layout ring in
+/dev/shm; dashboards read the latest samples from it without touching SQLite
+
+Layout:
+    header  MAGIC, version, capacity, slot size, write sequence (uint64)
+    slots   capacity x (sequence, sample fields, sequence)
+
+Each slot is framed by its sequence number before and after the payload.
+The writer stamps the leading copy, writes the payload, then the trailing
+copy; a reader accepts a slot only if both copies match the sequence it
+expected, so no locks are needed on either side.
+
+Command line (for Node-RED exec nodes):
+    python3 telemetry_ring.py            latest sample as JSON
+    python3 telemetry_ring.py --count 10 latest 10 samples as a JSON list
+"""
+
+import sys
+import json
+import math
+import time
+import struct
+import argparse
+from multiprocessing import shared_memory, resource_tracker
+
+RING_NAME = 'motorcycle_telemetry'
+RING_CAPACITY = 512          # Samples kept - about 100 s at 5 Hz
+RING_STALE_AFTER = 3.0       # Seconds without a new sample before readers treat the ring as stopped
+MAGIC = b'MTRB'
+VERSION = 1
+
+HEADER_STRUCT = struct.Struct('<4sHHII')
+SEQUENCE_STRUCT = struct.Struct('<Q')
+WRITE_SEQUENCE_OFFSET = HEADER_STRUCT.size
+HEADER_SIZE = 32
+
+# Sample fields in slot order
+RING_FIELDS = (
+    ('t_wall', 'd'), ('t_ns', 'q'),
+    ('ax', 'f'), ('ay', 'f'), ('az', 'f'),
+    ('gx', 'f'), ('gy', 'f'), ('gz', 'f'),
+    ('mx', 'f'), ('my', 'f'), ('mz', 'f'),
+    ('temperature', 'f'), ('vibration_level', 'f'),
+    ('latitude', 'd'), ('longitude', 'd'),
+    ('speed_mph', 'f'), ('heading', 'f'), ('hdop', 'f'),
+    ('gps_fix', 'b'), ('satellites_used', 'b'),
+    ('on_external_power', 'b'), ('recording', 'b'),
+)
+PAYLOAD_STRUCT = struct.Struct('<' + ''.join(typecode for _, typecode in RING_FIELDS))
+SLOT_SIZE = (SEQUENCE_STRUCT.size * 2 + PAYLOAD_STRUCT.size + 7) // 8 * 8
+FIELD_NAMES = [name for name, _ in RING_FIELDS]
+INTEGER_FIELDS = {name for name, typecode in RING_FIELDS if typecode not in 'fd'}
+
+
+def attach_shared_memory(name, create=False, size=0):
+    """Open a segment without letting this process's resource tracker unlink it on exit"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no track argument - unregister by hand
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def unlink_shared_memory(shm):
+    """Remove a segment opened with attach_shared_memory"""
+    if not hasattr(shm, '_track'):
+        # Python < 3.13 unregisters on unlink - register first so the tracker stays consistent
+        resource_tracker.register(shm._name, 'shared_memory')
+    shm.unlink()
+
+
+def sample_values(sample):
+    """Payload values of a sample dict - missing numbers become NaN, missing flags 0"""
+    values = []
+    for name, typecode in RING_FIELDS:
+        value = sample.get(name)
+        if value is None:
+            value = 0 if name in INTEGER_FIELDS else math.nan
+        elif name in INTEGER_FIELDS:
+            value = int(value)
+        values.append(value)
+    return values
+
+
+def values_sample(values):
+    """Sample dict of payload values, with NaN back to None"""
+    sample = dict(zip(FIELD_NAMES, values))
+    for name in FIELD_NAMES:
+        value = sample[name]
+        if isinstance(value, float) and math.isnan(value):
+            sample[name] = None
+    return sample
+
+
+def ring_size(capacity):
+    return HEADER_SIZE + capacity * SLOT_SIZE
+
+
+class TelemetryRingWriter:
+    """Single-producer side of the ring"""
+
+    def __init__(self, name=RING_NAME, capacity=RING_CAPACITY):
+        self.name = name
+        self.capacity = capacity
+        self.shm = self.open_segment()
+        self.buf = self.shm.buf
+        self.sequence = SEQUENCE_STRUCT.unpack_from(self.buf, WRITE_SEQUENCE_OFFSET)[0]
+
+    def open_segment(self):
+        """Reuse a compatible segment from a previous run so attached readers keep working"""
+        try:
+            shm = attach_shared_memory(self.name)
+            header = HEADER_STRUCT.unpack_from(shm.buf, 0)
+            if header == (MAGIC, VERSION, 0, self.capacity, SLOT_SIZE) and shm.size >= ring_size(self.capacity):
+                return shm
+            shm.close()
+            unlink_shared_memory(shm)
+        except FileNotFoundError:
+            pass
+
+        shm = attach_shared_memory(self.name, create=True, size=ring_size(self.capacity))
+        shm.buf[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        HEADER_STRUCT.pack_into(shm.buf, 0, MAGIC, VERSION, 0, self.capacity, SLOT_SIZE)
+        return shm
+
+    def publish(self, sample):
+        """Write a sample dict into the next slot"""
+        values = sample_values(sample)
+
+        sequence = self.sequence + 1
+        offset = HEADER_SIZE + (sequence % self.capacity) * SLOT_SIZE
+        SEQUENCE_STRUCT.pack_into(self.buf, offset, sequence)
+        PAYLOAD_STRUCT.pack_into(self.buf, offset + SEQUENCE_STRUCT.size, *values)
+        SEQUENCE_STRUCT.pack_into(self.buf, offset + SEQUENCE_STRUCT.size + PAYLOAD_STRUCT.size, sequence)
+        SEQUENCE_STRUCT.pack_into(self.buf, WRITE_SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+
+    def close(self):
+        """Detach - the segment stays for readers and the next run"""
+        self.buf = None
+        self.shm.close()
+
+
+class TelemetryRingReader:
+    """Lock-free reader for dashboards; raises FileNotFoundError if no writer has run"""
+
+    def __init__(self, name=RING_NAME):
+        self.shm = attach_shared_memory(name)
+        magic, version, _, self.capacity, slot_size = HEADER_STRUCT.unpack_from(self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION or slot_size != SLOT_SIZE:
+            self.shm.close()
+            raise ValueError(f"Shared memory segment {name} is not a version {VERSION} telemetry ring")
+
+    def write_sequence(self):
+        """Sequence number of the newest published sample (0 = none yet)"""
+        return SEQUENCE_STRUCT.unpack_from(self.shm.buf, WRITE_SEQUENCE_OFFSET)[0]
+
+    def read_slot(self, sequence):
+        """Read one sample by sequence number, or None if it was overwritten mid-read"""
+        offset = HEADER_SIZE + (sequence % self.capacity) * SLOT_SIZE
+        buf = self.shm.buf
+        trailing = SEQUENCE_STRUCT.unpack_from(buf, offset + SEQUENCE_STRUCT.size + PAYLOAD_STRUCT.size)[0]
+        values = PAYLOAD_STRUCT.unpack_from(buf, offset + SEQUENCE_STRUCT.size)
+        leading = SEQUENCE_STRUCT.unpack_from(buf, offset)[0]
+        if leading != sequence or trailing != sequence:
+            return None
+
+        sample = values_sample(values)
+        sample['sequence'] = sequence
+        return sample
+
+    def latest(self, count=1):
+        """Up to count newest samples, oldest first"""
+        newest = self.write_sequence()
+        oldest = max(1, newest - min(count, self.capacity - 1) + 1)
+        samples = []
+        for sequence in range(oldest, newest + 1):
+            sample = self.read_slot(sequence)
+            if sample:
+                samples.append(sample)
+        return samples
+
+    def latest_sample(self, max_age=None):
+        """The newest sample, or None - also None if it is more than max_age seconds old,
+        since a stopped collector leaves its last sample in the ring"""
+        samples = self.latest(1)
+        if not samples:
+            return None
+        sample = samples[-1]
+        if max_age is not None and (sample['t_wall'] is None or time.time() - sample['t_wall'] > max_age):
+            return None
+        return sample
+
+    def read_since(self, sequence):
+        """Samples published after the given sequence number, oldest first"""
+        newest = self.write_sequence()
+        return self.latest(newest - sequence) if newest > sequence else []
+
+    def close(self):
+        self.shm.close()
+
+
+def open_reader(name=RING_NAME):
+    """Attach to the ring, or None if the telemetry process hasn't created it"""
+    try:
+        return TelemetryRingReader(name)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read the live telemetry ring')
+    parser.add_argument('--count', type=int, default=1, help='Number of samples to print')
+    args = parser.parse_args()
+
+    reader = open_reader()
+    if reader is None:
+        print(json.dumps({'error': 'telemetry ring not available'}))
+        sys.exit(1)
+
+    samples = reader.latest(args.count)
+    reader.close()
+    if args.count == 1:
+        print(json.dumps(samples[-1] if samples else {}))
+    else:
+        print(json.dumps(samples))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Telemetry Write-Behind Writer
+Persists telemetry samples to SQLite from a dedicated thread, batching rows
+into short transactions instead of committing once per sample, appends them
+to a per-ride columnar archive and keeps the row counters and the tracked
+ride's statistics current
+"""
+
+import sqlite3
+import threading
+import queue
+import time
+import logging
+
+from ride_archive import RideArchiveWriter, archive_path
+from telemetry_metrics import record_batch
+
+# Writer configuration
+WRITER_QUEUE_SIZE = 2000      # Samples buffered before new ones are dropped
+WRITER_BATCH_SIZE = 50        # Flush once this many samples are pending
+WRITER_FLUSH_INTERVAL = 1.0   # Seconds - flush at least this often
+DB_TIMEOUT = 30.0             # Seconds to wait for database lock
+WRITE_RETRIES = 3             # Immediate retries of a batch the database was too busy for
+WRITE_RETRY_DELAY = 0.1       # Seconds before the first retry, doubling after each
+WRITE_MAX_ATTEMPTS = 10       # Flushes a busy batch is carried over before it is dropped
+
+# Columns written for every sample, in table order
+TELEMETRY_COLUMNS = (
+    'session_id', 'timestamp',
+    'ax', 'ay', 'az', 'gx', 'gy', 'gz', 'mx', 'my', 'mz',
+    'temperature', 'vibration_level', 'power_voltage', 'on_external_power',
+    'latitude', 'longitude', 'speed_mph', 'heading', 'gps_fix',
+    'satellites_used', 'hdop',
+)
+
+INSERT_SQL = 'INSERT INTO telemetry_data ({}) VALUES ({})'.format(
+    ', '.join(TELEMETRY_COLUMNS),
+    ', '.join(':' + column for column in TELEMETRY_COLUMNS)
+)
+
+
+def is_busy_error(error):
+    """Whether an SQLite error is a lock that may clear on its own"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in message or 'busy' in message)
+
+
+# Queue marker telling the writer thread to drain and exit
+_STOP = object()
+# Queue marker prefix for closing a session's archive: (_END_SESSION, session_id)
+_END_SESSION = 'end_session'
+
+
+class TelemetryWriter:
+    """Background writer owning a single long-lived WAL connection"""
+
+    def __init__(self, db_path, archive_dir=None, ride_tracker=None, queue_size=WRITER_QUEUE_SIZE,
+                 batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.ride_tracker = ride_tracker
+        self.archives = {}
+        self.unwritten = []      # Archived samples the database was too busy to take
+        self.unwritten_attempts = 0
+        self.retry_at = None
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.running = False
+        self.thread = None
+        self.logger = logging.getLogger(__name__)
+
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'batches': 0,
+            'errors': 0,
+            'retries': 0,
+            'write_dropped': 0,
+            'last_flush_time': None,
+            'last_batch_size': 0
+        }
+
+    def open_connection(self):
+        """Open the writer connection in WAL mode"""
+        conn = sqlite3.connect(str(self.db_path), timeout=DB_TIMEOUT)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL only syncs at checkpoints, not on every commit
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def start(self):
+        """Start the writer thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.writer_loop, name='telemetry-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, sample):
+        """Queue a sample dict for writing - never blocks the caller"""
+        try:
+            self.queue.put_nowait(sample)
+        except queue.Full:
+            with self.stats_lock:
+                self.stats['dropped'] += 1
+            return False
+
+        with self.stats_lock:
+            self.stats['submitted'] += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """Block until every sample submitted so far has been committed"""
+        if not self.thread or not self.thread.is_alive():
+            return False
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def end_session(self, session_id):
+        """Finish the archive for a session once its queued samples are written"""
+        try:
+            self.queue.put((_END_SESSION, session_id), timeout=5.0)
+        except queue.Full:
+            self.logger.warning(f"Writer queue full, archive for {session_id} left open")
+
+    def stop(self, timeout=10.0):
+        """Flush pending samples and stop the writer thread"""
+        if not self.thread:
+            return
+        self.running = False
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            self.logger.warning("Writer queue full during shutdown")
+        self.thread.join(timeout=timeout)
+        if self.thread.is_alive():
+            self.logger.warning("Writer thread did not stop cleanly")
+        self.thread = None
+
+    def get_stats(self):
+        """Get writer statistics"""
+        with self.stats_lock:
+            stats = self.stats.copy()
+        stats['queued'] = self.queue.qsize()
+        return stats
+
+    def writer_loop(self):
+        """Drain the queue in time- or size-bounded batches"""
+        self.logger.info("💾 Telemetry writer thread started")
+        conn = self.open_connection()
+        batch = []
+        batch_deadline = None
+
+        try:
+            while True:
+                timeout = None
+                if batch:
+                    timeout = max(0.0, batch_deadline - time.monotonic())
+                elif self.unwritten:
+                    timeout = max(0.0, self.retry_at - time.monotonic())
+
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    self.write_batch(conn, batch)
+                    break
+
+                if isinstance(item, threading.Event):
+                    self.write_batch(conn, batch)
+                    batch = []
+                    item.set()
+                    continue
+
+                if isinstance(item, tuple) and item[0] == _END_SESSION:
+                    self.write_batch(conn, batch)
+                    batch = []
+                    self.close_archive(item[1])
+                    continue
+
+                if item is not None:
+                    if not batch:
+                        batch_deadline = time.monotonic() + self.flush_interval
+                    batch.append(item)
+
+                if batch and (len(batch) >= self.batch_size or time.monotonic() >= batch_deadline):
+                    self.write_batch(conn, batch)
+                    batch = []
+                elif self.unwritten and not batch and time.monotonic() >= self.retry_at:
+                    self.write_batch(conn, [])
+        finally:
+            if self.unwritten:
+                self.drop_unwritten("writer stopped with the database still busy")
+            conn.close()
+            for session_id in list(self.archives):
+                self.close_archive(session_id)
+            self.logger.info("🛑 Telemetry writer thread stopped")
+
+    def write_batch(self, conn, batch):
+        """Insert a batch of samples, plus any carried over, in a single
+        transaction. A busy or locked database is retried with backoff and
+        the rows carried to the next flush; other errors drop the rows."""
+        if self.archive_dir and batch:
+            self.archive_batch(batch)
+
+        rows = self.unwritten + batch
+        if not rows:
+            return
+
+        error = None
+        delay = WRITE_RETRY_DELAY
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with conn:
+                    conn.executemany(INSERT_SQL, rows)
+                error = None
+                break
+            except sqlite3.Error as e:
+                error = e
+                if not is_busy_error(e) or attempt == WRITE_RETRIES:
+                    break
+                with self.stats_lock:
+                    self.stats['retries'] += 1
+                time.sleep(delay)
+                delay *= 2
+
+        if error is not None:
+            with self.stats_lock:
+                self.stats['errors'] += 1
+            if not is_busy_error(error):
+                self.unwritten = rows
+                self.drop_unwritten(error)
+                return
+            self.unwritten_attempts += 1
+            self.unwritten = rows[-self.queue_size:]
+            if len(rows) > self.queue_size:
+                self.count_write_dropped(len(rows) - self.queue_size)
+            if self.unwritten_attempts >= WRITE_MAX_ATTEMPTS:
+                self.drop_unwritten(error)
+                return
+            self.retry_at = time.monotonic() + self.flush_interval
+            self.logger.warning(f"Database busy, {len(self.unwritten)} samples carried to the next flush: {error}")
+            return
+
+        self.unwritten = []
+        self.unwritten_attempts = 0
+        with self.stats_lock:
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+            self.stats['last_batch_size'] = len(rows)
+            self.stats['last_flush_time'] = time.time()
+
+        self.count_batch(conn, rows)
+        if self.ride_tracker:
+            self.track_batch(conn, rows)
+
+    def drop_unwritten(self, reason):
+        """Give up on the carried-over rows"""
+        self.logger.error(f"Dropped {len(self.unwritten)} samples that could not be written: {reason}")
+        self.count_write_dropped(len(self.unwritten))
+        self.unwritten = []
+        self.unwritten_attempts = 0
+
+    def count_write_dropped(self, rows):
+        with self.stats_lock:
+            self.stats['write_dropped'] += rows
+
+    def count_batch(self, conn, batch):
+        """Add a committed batch to the row counters in its own transaction"""
+        try:
+            with conn:
+                record_batch(conn, batch)
+        except (sqlite3.Error, ValueError) as e:
+            self.logger.error(f"Failed to update row counters: {e}")
+
+    def track_batch(self, conn, batch):
+        """Feed a committed batch to the ride tracker in its own transaction"""
+        try:
+            with conn:
+                self.ride_tracker.process_batch(conn, batch)
+        except sqlite3.Error as e:
+            self.logger.error(f"Failed to update ride statistics: {e}")
+
+    def archive_batch(self, batch):
+        """Append a batch to each sample's ride archive"""
+        for sample in batch:
+            session_id = sample['session_id']
+            archive = self.archives.get(session_id)
+            if archive is None:
+                try:
+                    archive = RideArchiveWriter(archive_path(self.archive_dir, session_id), session_id)
+                except OSError as e:
+                    self.logger.error(f"Failed to create archive for {session_id}: {e}")
+                    continue
+                self.archives[session_id] = archive
+            try:
+                archive.append(sample)
+            except OSError as e:
+                self.logger.error(f"Failed to archive sample for {session_id}: {e}")
+
+    def close_archive(self, session_id):
+        """Write the footer of a session's archive"""
+        archive = self.archives.pop(session_id, None)
+        if archive is None:
+            return
+        try:
+            archive.close()
+            self.logger.info(f"📦 Archived {archive.rows_written} samples to {archive.path}")
+        except OSError as e:
+            self.logger.error(f"Failed to close archive for {session_id}: {e}")
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The modules live as flat scripts at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Modules that log or keep data under MOTO_DATA_DIR at import time stay off the bike's paths
+os.environ.setdefault('MOTO_DATA_DIR', tempfile.mkdtemp(prefix='motorcycle_tests_'))
@@ -0,0 +1,100 @@
+import pytest
+
+from cellular_gps import CellularGPS, NMEAStreamGPS, nmea_checksum_ok
+
+
+def sentence(body):
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
+
+
+def gga(utc, quality=1, satellites=9, hdop=0.9):
+    return sentence(f"GNGGA,{utc},4807.038,N,01131.000,E,{quality},{satellites:02d},{hdop},545.4,M,46.9,M,,")
+
+
+def rmc(utc, status='A'):
+    return sentence(f"GNRMC,{utc},{status},4807.038,N,01131.000,W,22.4,84.4,230394,003.1,W")
+
+
+def streaming_gps():
+    published = []
+    gps = NMEAStreamGPS()
+    gps.callback = published.append
+    return gps, published
+
+
+def test_checksum():
+    assert nmea_checksum_ok(gga('123519.00'))
+    assert not nmea_checksum_ok(gga('123519.00')[:-2] + '00')
+    assert nmea_checksum_ok('$GPGGA,no,checksum')
+
+
+def test_parse_rmc_converts_position_and_speed():
+    parsed = CellularGPS().parse_rmc(rmc('123519.00'))
+    assert parsed['latitude'] == pytest.approx(48 + 7.038 / 60)
+    assert parsed['longitude'] == pytest.approx(-(11 + 31.0 / 60))
+    assert parsed['speed_mph'] == pytest.approx(22.4 * 1.15078)
+    assert parsed['heading'] == 84.4
+    assert parsed['gps_fix']
+    assert CellularGPS().parse_rmc(rmc('123519.00', status='V')) is None
+
+
+def test_parse_gga_quality():
+    assert CellularGPS().parse_gga(gga('123519.00')) == {'satellites_used': 9, 'hdop': 0.9}
+    assert CellularGPS().parse_gga(gga('123519.00', quality=0)) is None
+
+
+def test_publishes_once_gga_and_rmc_share_an_epoch():
+    gps, published = streaming_gps()
+    gps.handle_sentence(rmc('123519.00'))
+    assert published == []
+
+    gps.handle_sentence(gga('123519.00', satellites=7))
+    assert len(published) == 1
+    assert published[0]['gps_fix']
+    assert published[0]['satellites_used'] == 7
+
+    # GGA first works too, and a repeat sentence does not republish
+    gps.handle_sentence(gga('123520.00', satellites=8))
+    gps.handle_sentence(rmc('123520.00'))
+    gps.handle_sentence(rmc('123520.00'))
+    assert len(published) == 2
+    assert published[1]['satellites_used'] == 8
+    assert gps.get_location() == published[1]
+    assert gps.stats['fixes_published'] == 2
+
+
+def test_sentences_from_different_epochs_do_not_pair():
+    gps, published = streaming_gps()
+    gps.handle_sentence(gga('123519.00'))
+    gps.handle_sentence(rmc('123520.00'))
+    assert published == []
+
+    gps.handle_sentence(gga('123520.00'))
+    assert len(published) == 1
+
+
+def test_lost_fix_is_published_and_keeps_last_fix():
+    gps, published = streaming_gps()
+    gps.handle_sentence(gga('123519.00'))
+    gps.handle_sentence(rmc('123519.00'))
+    gps.handle_sentence(gga('123520.00', quality=0, satellites=0))
+    gps.handle_sentence(rmc('123520.00', status='V'))
+
+    assert len(published) == 2
+    assert not published[1]['gps_fix']
+    assert published[1]['latitude'] is None
+    assert published[1]['hdop'] == 99
+    assert gps.last_fix['gps_fix']
+
+
+def test_bad_checksums_and_other_sentences_are_ignored():
+    gps, published = streaming_gps()
+    gps.handle_sentence(gga('123519.00')[:-2] + '00')
+    gps.handle_sentence(sentence('GPGSV,3,1,11,03,03,111,00'))
+    gps.handle_sentence(rmc('123519.00'))
+    assert published == []
+    assert gps.stats['checksum_errors'] == 1
+    assert gps.stats['sentences'] == 3
@@ -0,0 +1,31 @@
+import pytest
+
+import geodesy
+from geodesy import haversine_miles, track_distance
+
+
+TRACK = [(51.5000, -0.1200), (51.5010, -0.1210), (51.5025, -0.1190), (51.5040, -0.1180)]
+
+
+def expected_length(points):
+    return sum(haversine_miles(*a, *b) for a, b in zip(points, points[1:]))
+
+
+@pytest.fixture(params=['numpy', 'python'])
+def backend(request, monkeypatch):
+    if request.param == 'python':
+        monkeypatch.setattr(geodesy, 'np', None)
+    elif geodesy.np is None:
+        pytest.skip("NumPy not installed")
+
+
+def test_track_distance_matches_haversine(backend):
+    assert track_distance(TRACK) == pytest.approx(expected_length(TRACK))
+    assert track_distance(TRACK[:1]) == 0.0
+    assert track_distance([]) == 0.0
+
+
+def test_rows_without_a_fix_are_skipped(backend):
+    rows = [TRACK[0], (None, None), TRACK[1], (51.6, None), TRACK[2], TRACK[3]]
+    assert track_distance(rows) == pytest.approx(expected_length(TRACK))
+    assert track_distance([(None, None), TRACK[0]]) == 0.0
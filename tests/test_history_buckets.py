@@ -0,0 +1,108 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import cellular_web_dashboard
+from history_buckets import bucket_window, bucket_recent, MAX_HISTORY_BUCKETS
+
+START = datetime(2026, 5, 1, 10, 0, 0, tzinfo=timezone.utc)
+END = START + timedelta(minutes=10)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""CREATE TABLE telemetry_data (id INTEGER PRIMARY KEY, timestamp TIMESTAMP,
+                    latitude REAL, longitude REAL, speed_mph REAL, ax REAL, ay REAL)""")
+    yield conn
+    conn.close()
+
+
+def add(conn, moment, speed=10.0, lat=51.5, lon=-0.12, ay=0, separator='T'):
+    timestamp = moment.strftime(f'%Y-%m-%d{separator}%H:%M:%S.%f')
+    conn.execute("INSERT INTO telemetry_data (timestamp, latitude, longitude, speed_mph, ax, ay) "
+                 "VALUES (?, ?, ?, ?, ?, ?)", (timestamp, lat, lon, speed, 0, ay))
+
+
+def starts(points):
+    return [point['start'] for point in points]
+
+
+@pytest.mark.parametrize('separator', ['T', ' '])
+def test_samples_on_a_boundary_open_the_next_bucket(conn, separator):
+    for second in range(0, 600, 60):
+        add(conn, START + timedelta(seconds=second), separator=separator)
+    width, points = bucket_window(conn, START, END, 10)
+    assert width == 60
+    assert starts(points) == [(START + timedelta(seconds=s)).isoformat() for s in range(0, 600, 60)]
+    assert all(point['samples'] == 1 for point in points)
+
+
+def test_window_includes_start_and_excludes_end(conn):
+    add(conn, START - timedelta(milliseconds=1), speed=1)
+    add(conn, START, speed=2)
+    add(conn, END - timedelta(milliseconds=1), speed=3)
+    add(conn, END, speed=4)
+    _, points = bucket_window(conn, START, END, 10)
+    assert [(point['min_speed'], point['max_speed']) for point in points] == [(2, 2), (3, 3)]
+    assert starts(points) == [START.isoformat(), (START + timedelta(seconds=540)).isoformat()]
+
+
+def test_bucket_summary(conn):
+    # Oldest to newest within one 60 s bucket; the last sample is its position
+    add(conn, START + timedelta(seconds=5), speed=20, lat=51.1, ay=100)
+    add(conn, START + timedelta(seconds=30), speed=40, lat=51.2, ay=-16384)
+    add(conn, START + timedelta(seconds=59.999), speed=30, lat=51.3, ay=0, separator=' ')
+    add(conn, START + timedelta(seconds=45), speed=99, lat=0)          # no fix
+    _, points = bucket_window(conn, START, END, 10)
+    assert len(points) == 1
+    point = points[0]
+    assert point['samples'] == 3
+    assert (point['lat'], point['last_speed']) == (51.3, 30)
+    assert (point['min_speed'], point['max_speed'], point['speed']) == (20, 40, 30.0)
+    assert point['max_lean'] == 90.0
+
+
+def test_uneven_bucket_widths(conn):
+    # 7 buckets over 10 minutes - 85.714... s each
+    for second in range(600):
+        add(conn, START + timedelta(seconds=second))
+    width, points = bucket_window(conn, START, END, 7)
+    assert width == pytest.approx(600 / 7)
+    assert [point['samples'] for point in points] == [86, 86, 86, 85, 86, 86, 85]
+    assert sum(point['samples'] for point in points) == 600
+
+
+def test_bucket_count_and_empty_windows(conn):
+    add(conn, START)
+    assert bucket_window(conn, START, START, 10) == (0.0, [])
+    assert bucket_window(conn, END, START, 10) == (0.0, [])
+    width, _ = bucket_window(conn, START, END, 10**6)
+    assert width == pytest.approx(600 / MAX_HISTORY_BUCKETS)
+    width, points = bucket_window(conn, START, END, 0)
+    assert width == 600 and len(points) == 1
+
+
+def test_bucket_recent_ends_now(conn):
+    add(conn, END - timedelta(seconds=1))
+    add(conn, START - timedelta(seconds=1))
+    _, points = bucket_recent(conn, 600, 10, now=END)
+    assert [point['samples'] for point in points] == [1]
+
+
+def test_cellular_history_keeps_row_fields_newest_first(tmp_path, monkeypatch):
+    path = tmp_path / 'telemetry.db'
+    db = sqlite3.connect(path)
+    db.execute("""CREATE TABLE telemetry_data (id INTEGER PRIMARY KEY, timestamp TIMESTAMP,
+                  latitude REAL, longitude REAL, speed_mph REAL, ax REAL, ay REAL)""")
+    now = datetime.now(timezone.utc)
+    for second in (50, 30, 10):
+        add(db, now - timedelta(seconds=second), speed=second)
+    db.commit()
+    db.close()
+    monkeypatch.setattr(cellular_web_dashboard.telemetry_server, 'db_path', str(path))
+
+    rows = cellular_web_dashboard.app.test_client().get('/api/history/1?buckets=60').get_json()
+    assert [row['speed_mph'] for row in rows] == [10, 30, 50]
+    assert {'timestamp', 'latitude', 'longitude', 'speed_mph', 'ax', 'ay'} <= set(rows[0])
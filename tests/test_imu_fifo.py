@@ -0,0 +1,104 @@
+import struct
+
+import imu_fifo
+from imu_fifo import (ICM20948Fifo, FCHOICE_DLPF_EN, FRAME_FORMAT, FRAME_SIZE, FIFO_SIZE,
+                      REG_ACCEL_CONFIG, REG_ACCEL_SMPLRT_DIV_2, REG_BANK_SEL, REG_FIFO_COUNTH,
+                      REG_FIFO_R_W, REG_FIFO_RST, REG_GYRO_CONFIG_1, REG_GYRO_SMPLRT_DIV,
+                      REG_USER_CTRL, USER_CTRL_FIFO_EN)
+
+
+class FakeI2C:
+    """Banked register file with a FIFO behind FIFO_R_W, recording every write"""
+
+    def __init__(self):
+        self.bank = 0
+        self.registers = {}
+        self.writes = []
+        self.fifo = bytearray()
+
+    def writeByte(self, address, register, value):
+        if register == REG_BANK_SEL:
+            self.bank = value >> 4
+            return
+        self.writes.append((self.bank, register, value))
+        self.registers[(self.bank, register)] = value
+        if (self.bank, register) == (0, REG_FIFO_RST) and value:
+            self.fifo.clear()
+
+    def readByte(self, address, register):
+        return self.registers.get((self.bank, register), 0)
+
+    def readBlock(self, address, register, length):
+        assert self.bank == 0
+        if register == REG_FIFO_COUNTH:
+            return [(len(self.fifo) >> 8) & 0x1F, len(self.fifo) & 0xFF]
+        assert register == REG_FIFO_R_W
+        data = list(self.fifo[:length])
+        del self.fifo[:length]
+        return data
+
+
+class FakeIMU:
+    address = 0x69
+
+    def __init__(self):
+        self._i2c = FakeI2C()
+
+
+def push_frames(imu, count, value=100):
+    for i in range(count):
+        imu._i2c.fifo.extend(struct.pack(FRAME_FORMAT, value + i, 0, 16384, 1, 2, 3))
+
+
+def test_configure_enables_dlpf_before_setting_dividers():
+    imu = FakeIMU()
+    # begin() leaves the FCHOICE bits clear but other config bits set
+    imu._i2c.registers[(2, REG_GYRO_CONFIG_1)] = 0x06
+    imu._i2c.registers[(2, REG_ACCEL_CONFIG)] = 0x06
+    fifo = ICM20948Fifo(imu, output_rate=20, sample_rate_div=5)
+    assert fifo.configure()
+
+    writes = imu._i2c.writes
+    assert (2, REG_GYRO_CONFIG_1, 0x06 | FCHOICE_DLPF_EN) in writes
+    assert (2, REG_ACCEL_CONFIG, 0x06 | FCHOICE_DLPF_EN) in writes
+    dlpf_on = max(writes.index((2, REG_GYRO_CONFIG_1, 0x07)),
+                  writes.index((2, REG_ACCEL_CONFIG, 0x07)))
+    assert dlpf_on < writes.index((2, REG_GYRO_SMPLRT_DIV, 5))
+    assert dlpf_on < writes.index((2, REG_ACCEL_SMPLRT_DIV_2, 5))
+    assert imu._i2c.registers[(0, REG_USER_CTRL)] & USER_CTRL_FIFO_EN
+
+
+def test_drain_decimates_with_sensor_timestamps(monkeypatch):
+    imu = FakeIMU()
+    bursts = []
+    fifo = ICM20948Fifo(imu, output_rate=37.5, sample_rate_div=5, on_burst=bursts.append)
+    assert fifo.decimation == 5
+    monkeypatch.setattr(imu_fifo.time, 'monotonic_ns', lambda: 10_000_000_000)
+
+    push_frames(imu, 12)
+    samples = fifo.drain()
+    assert len(samples) == 2
+    assert [s['samples'] for s in samples] == [5, 5]
+    assert samples[0]['ax'] == 102
+    assert len(fifo.pending) == 2
+
+    burst = bursts[0]
+    assert len(burst) == 12
+    steps = {b[0] - a[0] for a, b in zip(burst, burst[1:])}
+    assert steps == {fifo.period_ns}
+    assert burst[-1][0] < 10_000_000_000
+
+
+def test_overflow_resets_fifo_and_timebase():
+    imu = FakeIMU()
+    fifo = ICM20948Fifo(imu, output_rate=37.5)
+    push_frames(imu, 3)
+    fifo.drain()
+    assert fifo.anchor_ns is not None
+
+    push_frames(imu, FIFO_SIZE // FRAME_SIZE)
+    assert fifo.drain() == []
+    assert fifo.stats['overflows'] == 1
+    assert fifo.anchor_ns is None
+    assert fifo.pending == []
+    assert not imu._i2c.fifo
@@ -0,0 +1,143 @@
+import json
+import struct
+
+import pytest
+
+from live_updates import (ACK_TIMEOUT, DELTA_HEADER, LiveClient, LiveUpdates, flatten, nest)
+
+
+def state(speed=10.0, lean=0, fix=True, services=None):
+    return flatten({
+        'telemetry': {'speed': speed, 'lean_angle': lean},
+        'gps_status': {'has_gps_fix': fix},
+        'system_status': {'services': services or {'gpsd': True}},
+    })
+
+
+def decode_delta(payload, fields):
+    """The browser's decoding of a binary update, by field table"""
+    names = {i: name for name, i in fields.items()}
+    seq, count = DELTA_HEADER.unpack_from(payload)
+    offset = DELTA_HEADER.size
+    changes = {}
+    for _ in range(count):
+        index, kind = payload[offset], chr(payload[offset + 1])
+        offset += 2
+        if kind in 'ntf':
+            value = {'n': None, 't': True, 'f': False}[kind]
+        elif kind in 'ied':
+            fmt = {'i': '<i', 'e': '<f', 'd': '<d'}[kind]
+            value = struct.unpack_from(fmt, payload, offset)[0]
+            offset += struct.calcsize(fmt)
+        else:
+            length = struct.unpack_from('<H', payload, offset)[0]
+            data = payload[offset + 2:offset + 2 + length].decode()
+            value = data if kind == 's' else json.loads(data)
+            offset += 2 + length
+        changes[names[index]] = value
+    return seq, changes
+
+
+def test_json_updates_diff_against_acked_state():
+    client = LiveClient('sid', rate=10, encoding='json')
+    first = client.update(state(), now=0.0)
+    assert first['full'] and first['changes'] == nest(state())
+
+    # One update in flight at a time
+    assert not client.due(0.5)
+    client.acked(first['seq'], now=0.05)
+    assert client.due(0.5)
+    second = client.update(state(speed=12.5), now=0.5)
+    assert not second['full']
+    assert second['changes'] == {'telemetry': {'speed': 12.5}}
+    client.acked(second['seq'], now=0.55)
+
+    # Nothing changed since the last acknowledged update
+    assert client.update(state(speed=12.5), now=1.0) is None
+
+
+def test_lost_update_is_resent_with_the_next():
+    client = LiveClient('sid', rate=10, encoding='json')
+    client.acked(client.update(state(), now=0.0)['seq'], now=0.01)
+
+    lost = client.update(state(speed=20.0), now=1.0)
+    assert lost['changes'] == {'telemetry': {'speed': 20.0}}
+    assert not client.due(1.0 + ACK_TIMEOUT - 0.1)
+    assert client.due(1.0 + ACK_TIMEOUT)
+    assert client.stats['timeouts'] == 1
+
+    # Only the lean angle changed since the lost update, but the speed is resent too
+    retry = client.update(state(speed=20.0, lean=15), now=1.0 + ACK_TIMEOUT)
+    assert retry['changes'] == {'telemetry': {'speed': 20.0, 'lean_angle': 15}}
+    assert retry['seq'] == lost['seq'] + 1
+
+
+def test_late_ack_of_a_timed_out_update_is_ignored():
+    client = LiveClient('sid', rate=10, encoding='json')
+    first = client.update(state(), now=0.0)
+    assert client.due(ACK_TIMEOUT)
+    second = client.update(state(speed=11.0), now=ACK_TIMEOUT)
+    client.acked(first['seq'], now=ACK_TIMEOUT + 0.1)
+    assert client.in_flight[0] == second['seq']
+    # The first update was never acknowledged, so the second is still full
+    assert second['full']
+    client.acked(second['seq'], now=ACK_TIMEOUT + 0.2)
+    assert client.stats['acks'] == 1
+
+
+def test_backoff_on_timeout_and_recovery_on_ack():
+    client = LiveClient('sid', rate=10, encoding='json')
+    client.update(state(), now=0.0)
+    assert client.due(ACK_TIMEOUT)
+    assert client.effective_interval() == pytest.approx(0.2)
+    payload = client.update(state(speed=1.0), now=ACK_TIMEOUT)
+    client.acked(payload['seq'], now=ACK_TIMEOUT + 0.01)
+    assert client.effective_interval() == pytest.approx(0.1)
+
+
+def test_binary_deltas_use_the_acked_field_table():
+    client = LiveClient('sid', rate=10, encoding='binary')
+    full = client.update(state(), now=0.0)
+    assert full['full'] and full['fields'] == sorted(state())
+    fields = {name: i for i, name in enumerate(full['fields'])}
+    client.acked(full['seq'], now=0.01)
+
+    payload = client.update(state(speed=33.3, fix=False, services={'gpsd': False}), now=1.0)
+    assert isinstance(payload, bytes)
+    seq, changes = decode_delta(payload, fields)
+    assert seq == full['seq'] + 1
+    assert changes['telemetry.speed'] == pytest.approx(33.3, abs=1e-3)
+    assert changes['gps_status.has_gps_fix'] is False
+    assert changes['system_status.services'] == {'gpsd': False}
+
+
+def test_binary_full_update_is_repeated_until_acked():
+    client = LiveClient('sid', rate=10, encoding='binary')
+    client.acked(client.update(state(), now=0.0)['seq'], now=0.01)
+
+    # A new field forces a full update with a new table, which is lost
+    extended = dict(state(), **{'telemetry.heading': 90})
+    lost = client.update(extended, now=1.0)
+    assert lost['full'] and 'telemetry.heading' in lost['fields']
+    assert client.due(1.0 + ACK_TIMEOUT)
+
+    # The client may not have the new table, so the next update is full again
+    retry = client.update(extended, now=1.0 + ACK_TIMEOUT)
+    assert isinstance(retry, dict) and retry['full']
+    client.acked(retry['seq'], now=1.0 + ACK_TIMEOUT + 0.01)
+    assert isinstance(client.update(dict(extended, **{'telemetry.heading': 91}), now=10.0), bytes)
+
+
+def test_publish_and_resync():
+    live = LiveUpdates(max_rate=10)
+    granted = live.subscribe('a', {'rate': 50, 'format': 'json'})
+    assert granted['rate'] == 10
+    sent = []
+    live.publish({'telemetry': {'speed': 1}}, lambda sid, payload, on_ack: sent.append((payload, on_ack)))
+    payload, on_ack = sent.pop()
+    assert payload['full']
+    on_ack()
+
+    live.resync('a')
+    live.publish({'telemetry': {'speed': 1}}, lambda sid, payload, on_ack: sent.append((payload, on_ack)))
+    assert sent and sent[0][0]['full']
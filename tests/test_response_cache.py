@@ -0,0 +1,87 @@
+import gzip
+
+from flask import Flask
+
+from response_cache import ResponseCache, GZIP_MIN_SIZE
+
+
+BIG_BODY = b'[' + b','.join(b'[51.5, -0.12]' for _ in range(200)) + b']'
+
+
+def cached_app(cache):
+    app = Flask(__name__)
+
+    @app.route('/track')
+    def track():
+        entry = cache.get('track', 1) or cache.put('track', 1, BIG_BODY)
+        return entry.respond()
+
+    return app.test_client()
+
+
+def test_gzip_and_plain_variants_have_distinct_etags():
+    client = cached_app(ResponseCache())
+
+    plain = client.get('/track', headers={'Accept-Encoding': 'identity'})
+    zipped = client.get('/track', headers={'Accept-Encoding': 'gzip'})
+    assert plain.data == BIG_BODY
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == BIG_BODY
+    assert zipped.get_etag() == (plain.get_etag()[0] + '-gz', False)
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+
+
+def test_if_none_match_only_matches_the_same_variant():
+    client = cached_app(ResponseCache())
+    plain_etag = client.get('/track').get_etag()[0]
+    gzip_etag = client.get('/track', headers={'Accept-Encoding': 'gzip'}).get_etag()[0]
+
+    revalidated = client.get('/track', headers={'If-None-Match': f'"{gzip_etag}"', 'Accept-Encoding': 'gzip'})
+    assert revalidated.status_code == 304
+    assert revalidated.get_etag()[0] == gzip_etag
+
+    # A plain-body ETag must not validate a cached gzip body, or vice versa
+    assert client.get('/track', headers={'If-None-Match': f'"{plain_etag}"',
+                                         'Accept-Encoding': 'gzip'}).status_code == 200
+    assert client.get('/track', headers={'If-None-Match': f'"{gzip_etag}"'}).status_code == 200
+    assert client.get('/track', headers={'If-None-Match': f'"{plain_etag}"'}).status_code == 304
+
+
+def test_version_mismatch_is_a_miss():
+    cache = ResponseCache()
+    cache.put('ride', ('2026-05-01', 10), b'{}')
+    assert cache.get('ride', ('2026-05-01', 10)) is not None
+    assert cache.get('ride', ('2026-05-01', 11)) is None
+    assert cache.get_stats()['hits'] == 1
+    assert cache.get_stats()['misses'] == 1
+
+
+def test_lru_eviction_is_bounded_by_bytes():
+    body = b'x' * (GZIP_MIN_SIZE - 1)    # Not gzipped, so size == len(body)
+    cache = ResponseCache(max_bytes=len(body) * 3)
+    for key in 'abc':
+        cache.put(key, 1, body)
+    cache.get('a', 1)                    # a is now the most recently used
+    cache.put('d', 1, body)
+
+    assert cache.get('b', 1) is None
+    assert all(cache.get(key, 1) for key in 'acd')
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['entries'] == 3
+    assert stats['bytes'] == len(body) * 3
+
+    # An entry larger than the whole cache is served but never stored
+    cache.put('huge', 1, b'y' * (len(body) * 4))
+    assert cache.get('huge', 1) is None
+    assert cache.get_stats()['bytes'] <= cache.max_bytes
+
+
+def test_invalidate_releases_bytes():
+    cache = ResponseCache()
+    cache.put(('ride', 1), 1, b'{}')
+    cache.put(('ride', 2), 1, b'[]')
+    cache.invalidate(lambda key: key[1] == 1)
+    assert cache.get(('ride', 1), 1) is None
+    assert cache.get_stats()['bytes'] == 2
@@ -0,0 +1,69 @@
+import sqlite3
+
+import ride_archive
+from ride_archive import RideArchiveWriter, RideArchiveReader
+
+
+def sample(i):
+    return {'t_ns': i * 200_000_000, 'ax': float(i), 'latitude': 51.5 + i * 1e-5, 'gps_fix': 1}
+
+
+def test_rows_survive_power_cut_after_chunk_seconds(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ride_archive.time, 'monotonic', lambda: clock[0])
+    path = tmp_path / 'ride.mtra'
+    writer = RideArchiveWriter(path, 'ride', wall_offset_ns=0, chunk_seconds=5)
+
+    for i in range(30):
+        writer.append(sample(i))
+        clock[0] += 0.2
+    # Power cut: the writer is never closed, so there is no footer
+    writer.file.flush()
+
+    with RideArchiveReader(path) as reader:
+        assert reader.row_count >= 25
+        assert list(reader.read_column('ax')) == [float(i) for i in range(reader.row_count)]
+    writer.close()
+
+
+def test_closed_archive_round_trip(tmp_path):
+    path = tmp_path / 'ride.mtra'
+    writer = RideArchiveWriter(path, 'ride', wall_offset_ns=0, chunk_rows=8)
+    for i in range(20):
+        writer.append(sample(i))
+    writer.close()
+
+    with RideArchiveReader(path) as reader:
+        assert reader.row_count == 20
+        assert len(reader.index) == 3
+        assert reader.rows_between(sample(5)['t_ns'], sample(9)['t_ns']) == (5, 9)
+
+
+def test_export_chunks_by_rows_without_fsync(tmp_path, monkeypatch):
+    db_path = tmp_path / 'telemetry.db'
+    conn = sqlite3.connect(db_path)
+    names = [name for name, _ in ride_archive.ARCHIVE_COLUMNS if name != 't_ns']
+    conn.execute(f"CREATE TABLE telemetry_data (id INTEGER PRIMARY KEY, session_id TEXT, "
+                 f"timestamp TIMESTAMP, {', '.join(names)})")
+    conn.executemany(
+        "INSERT INTO telemetry_data (session_id, timestamp, ax) VALUES ('ride', ?, ?)",
+        [(f"2026-05-01T10:00:{i // 10:02d}.{i % 10}00000", float(i)) for i in range(250)]
+    )
+    conn.commit()
+    conn.close()
+
+    # A slow export must not cut time-based chunks, nor fsync each one
+    clock = [1000.0]
+    def slow_monotonic():
+        clock[0] += 60
+        return clock[0]
+    fsyncs = []
+    monkeypatch.setattr(ride_archive.time, 'monotonic', slow_monotonic)
+    monkeypatch.setattr(ride_archive.os, 'fsync', fsyncs.append)
+
+    assert ride_archive.export_session(db_path, 'ride', tmp_path) == 250
+    assert fsyncs == []
+    with RideArchiveReader(ride_archive.archive_path(tmp_path, 'ride')) as reader:
+        assert reader.row_count == 250
+        assert len(reader.index) == -(-250 // ride_archive.ARCHIVE_CHUNK_ROWS)
+        assert list(reader.read_column('ax')) == [float(i) for i in range(250)]
@@ -0,0 +1,85 @@
+import pytest
+
+from sampling_scheduler import SamplingScheduler
+
+
+class FakeClock:
+    """Monotonic clock that only moves when slept on or when a task takes time"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def run_for(scheduler, clock, seconds):
+    end = clock.now + seconds
+    scheduler.run(lambda: clock.now < end)
+
+
+def test_tasks_run_at_their_own_rates():
+    clock = FakeClock()
+    scheduler = SamplingScheduler(clock=clock.monotonic, sleep=clock.sleep)
+    ticks = {'fast': [], 'slow': []}
+    scheduler.add_task('fast', 10, lambda: ticks['fast'].append(clock.now))
+    scheduler.add_task('slow', 2, lambda: ticks['slow'].append(clock.now))
+
+    run_for(scheduler, clock, 0.85)
+    assert len(ticks['fast']) == 10
+    assert len(ticks['slow']) == 2
+    # Absolute deadlines - no drift between ticks
+    assert ticks['fast'][9] - ticks['fast'][0] == pytest.approx(0.9)
+    stats = scheduler.get_stats()
+    assert stats['fast']['mean_jitter_ms'] == 0
+    assert stats['fast']['late_ticks'] == 0
+    assert stats['fast']['overruns'] == 0
+
+
+def test_slow_callbacks_skip_ticks_instead_of_bursting():
+    clock = FakeClock()
+    scheduler = SamplingScheduler(clock=clock.monotonic, sleep=clock.sleep)
+    durations = iter([0.0, 0.35] + [0.0] * 100)
+
+    def work():
+        clock.now += next(durations)
+
+    scheduler.add_task('imu', 10, work)
+    run_for(scheduler, clock, 0.85)
+    stats = scheduler.get_stats()['imu']
+    assert stats['overruns'] == 1
+    assert stats['skipped_ticks'] == 3
+    assert stats['ticks'] == 7
+    assert stats['max_duration_ms'] == pytest.approx(350)
+    assert stats['mean_duration_ms'] == pytest.approx(50)
+
+
+def test_late_ticks_and_errors_are_counted():
+    clock = FakeClock()
+    scheduler = SamplingScheduler(clock=clock.monotonic, sleep=clock.sleep)
+    calls = []
+
+    def other():
+        # Takes 0.07 s, making the 10 Hz task's next start 0.07 s (> half a period) late
+        clock.now += 0.07
+        calls.append('other')
+
+    def failing():
+        raise RuntimeError('sensor gone')
+
+    scheduler.add_task('other', 1, other)
+    scheduler.add_task('sample', 10, lambda: None)
+    scheduler.add_task('broken', 1, failing)
+    run_for(scheduler, clock, 0.5)
+    stats = scheduler.get_stats()
+    assert stats['sample']['late_ticks'] == 1
+    assert stats['sample']['max_jitter_ms'] == pytest.approx(70)
+    assert stats['broken']['errors'] == 1
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        SamplingScheduler().add_task('bad', 0, lambda: None)
@@ -0,0 +1,27 @@
+import sqlite3
+
+from telemetry_broadcaster import TelemetryBroadcaster
+from telemetry_writer import TELEMETRY_COLUMNS
+
+
+def test_hub_samples_are_uploaded_in_row_shape(tmp_path):
+    db_path = tmp_path / 'telemetry.db'
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE telemetry_data (id INTEGER PRIMARY KEY, session_id TEXT, timestamp TIMESTAMP)")
+    conn.execute("CREATE TABLE rides (session_id TEXT, start_time TIMESTAMP, end_time TIMESTAMP)")
+    conn.execute("INSERT INTO rides VALUES ('20260501_090000', '2026-05-01 09:00:00', '2026-05-01 09:30:00')")
+    conn.execute("INSERT INTO rides VALUES ('20260501_100000', '2026-05-01 10:00:00', NULL)")
+    conn.commit()
+    conn.close()
+
+    broadcaster = TelemetryBroadcaster(str(db_path))
+    sample = {'t_wall': 1777629600.5, 't_ns': 123, 'sequence': 9, 'recording': 1,
+              'ax': 12.0, 'latitude': 51.5, 'gps_fix': 1, 'satellites_used': 8}
+    row = broadcaster.sample_row(sample)
+
+    assert list(row) == list(TELEMETRY_COLUMNS)
+    assert row['session_id'] == '20260501_100000'
+    assert row['timestamp'] == '2026-05-01 10:00:00.500000+00:00'
+    assert row['ax'] == 12.0
+    assert row['gps_fix'] == 1
+    assert row['power_voltage'] is None
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+import telemetry_hub
+from telemetry_hub import (FRAME_HEADER, FRAME_IMU_BURST, FRAME_SUBSCRIBE, HubSubscriber, Subscription,
+                           TelemetryHub, encode_frame, encode_imu_burst, decode_imu_burst)
+
+
+def test_imu_burst_round_trip():
+    frames = [(1_000_000_000 + i * 5_333_333, i, -i, 16384, 3, -3, 0) for i in range(40)]
+    frame = encode_imu_burst(7, frames)
+    length, frame_type = FRAME_HEADER.unpack_from(frame)
+    assert frame_type == FRAME_IMU_BURST
+    assert length == len(frame) - FRAME_HEADER.size
+
+    burst = decode_imu_burst(frame[FRAME_HEADER.size:])
+    assert burst['sequence'] == 7
+    assert burst['imu_burst'] == frames
+
+
+class FailingHelloSocket:
+    """Client socket that sends SUBSCRIBE, then is gone before HELLO can be written"""
+
+    def __init__(self, options):
+        self.pending = encode_frame(FRAME_SUBSCRIBE, json.dumps(options).encode())
+        self.closed = False
+
+    def settimeout(self, timeout):
+        pass
+
+    def recv(self, size):
+        data, self.pending = self.pending, b''
+        return data
+
+    def sendall(self, data):
+        raise BrokenPipeError("Broken pipe")
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def hub(tmp_path):
+    hub = TelemetryHub(str(tmp_path / 'hub.sock'))
+    hub.start()
+    yield hub
+    hub.stop()
+
+
+def test_failed_hello_gives_the_subscriber_slot_back(hub, monkeypatch):
+    monkeypatch.setattr(telemetry_hub, 'HUB_MAX_SUBSCRIBERS', 1)
+    sock = FailingHelloSocket({'name': 'gone'})
+    hub.handshake(sock)
+    assert sock.closed
+    assert hub.subscriptions == []
+
+    subscriber = HubSubscriber(hub.path, name='dashboard')
+    assert subscriber.connect()
+    subscriber.close()
+
+
+def test_subscriber_receives_published_samples(hub):
+    subscriber = HubSubscriber(hub.path, name='dashboard')
+    assert subscriber.connect()
+    for i in range(3):
+        hub.publish({'t_wall': 1000.0 + i, 'ax': float(i), 'gps_fix': True})
+
+    samples = [subscriber.recv(timeout=2) for _ in range(3)]
+    assert [s['sequence'] for s in samples] == [1, 2, 3]
+    assert [s['ax'] for s in samples] == [0.0, 1.0, 2.0]
+    assert samples[0]['gps_fix'] == 1
+    assert subscriber.recv(timeout=0.05) is None
+    subscriber.close()
+
+
+def test_sample_filters():
+    hub = TelemetryHub()
+    fixed = {'gps_fix': 1, 'recording': 0}
+    recording = {'gps_fix': 0, 'recording': 1}
+
+    require_fix = Subscription(hub, None, {'require_fix': True})
+    assert require_fix.wants(fixed, 0.0)
+    assert not require_fix.wants(recording, 0.1)
+
+    recording_only = Subscription(hub, None, {'recording_only': True})
+    assert recording_only.wants(recording, 0.0)
+    assert not recording_only.wants(fixed, 0.1)
+
+    # 2 Hz out of 10 Hz: every fifth sample
+    limited = Subscription(hub, None, {'max_rate': 2})
+    accepted = [t / 10 for t in range(20) if limited.wants(fixed, t / 10)]
+    assert accepted == [0.0, 0.5, 1.0, 1.5]
+
+
+def test_drop_policies():
+    hub = TelemetryHub()
+    oldest = Subscription(hub, None, {'policy': 'drop_oldest', 'queue': 2})
+    newest = Subscription(hub, None, {'policy': 'drop_newest', 'queue': 2})
+    disconnect = Subscription(hub, None, {'policy': 'disconnect', 'queue': 2})
+    for frame in (b'1', b'2', b'3', b'4'):
+        for subscription in (oldest, newest, disconnect):
+            subscription.offer(frame)
+
+    assert list(oldest.queue) == [b'3', b'4']
+    assert oldest.dropped == 2
+    assert list(newest.queue) == [b'1', b'2']
+    assert newest.dropped == 2
+    assert not disconnect.running
+
+    with pytest.raises(ValueError):
+        Subscription(hub, None, {'policy': 'block'})
@@ -0,0 +1,80 @@
+import os
+import time
+
+import pytest
+
+import telemetry_ring
+from telemetry_ring import (TelemetryRingReader, TelemetryRingWriter, HEADER_SIZE, SLOT_SIZE,
+                            SEQUENCE_STRUCT, open_reader, unlink_shared_memory)
+
+
+@pytest.fixture
+def ring():
+    name = f"motorcycle_test_{os.getpid()}_{time.monotonic_ns()}"
+    writer = TelemetryRingWriter(name, capacity=8)
+    reader = TelemetryRingReader(name)
+    yield writer, reader
+    reader.close()
+    shm = writer.shm
+    writer.close()
+    unlink_shared_memory(shm)
+
+
+def sample(i, t_wall=None):
+    return {'t_wall': time.time() if t_wall is None else t_wall, 't_ns': i,
+            'ax': float(i), 'latitude': None, 'gps_fix': True, 'satellites_used': 7}
+
+
+def test_round_trip_and_missing_values(ring):
+    writer, reader = ring
+    assert reader.latest_sample() is None
+
+    writer.publish(sample(1))
+    latest = reader.latest_sample()
+    assert latest['sequence'] == 1
+    assert latest['ax'] == 1.0
+    assert latest['latitude'] is None
+    assert latest['gps_fix'] == 1
+    assert latest['satellites_used'] == 7
+    assert latest['speed_mph'] is None
+
+
+def test_reads_wrap_around_and_skip_torn_slots(ring):
+    writer, reader = ring
+    for i in range(1, 21):
+        writer.publish(sample(i))
+
+    assert [s['t_ns'] for s in reader.latest(5)] == [16, 17, 18, 19, 20]
+    # At most capacity - 1 samples, since the next publish overwrites the oldest slot
+    assert len(reader.latest(100)) == 7
+    assert [s['t_ns'] for s in reader.read_since(18)] == [19, 20]
+    assert reader.read_since(20) == []
+
+    # A writer part-way through slot 19: leading sequence already bumped
+    SEQUENCE_STRUCT.pack_into(writer.buf, HEADER_SIZE + (19 % 8) * SLOT_SIZE, 27)
+    assert [s['t_ns'] for s in reader.latest(2)] == [20]
+
+
+def test_stale_sample_is_not_reported_as_live(ring):
+    writer, reader = ring
+    writer.publish(sample(1, t_wall=time.time() - 60))
+    assert reader.latest_sample()['t_ns'] == 1
+    assert reader.latest_sample(max_age=telemetry_ring.RING_STALE_AFTER) is None
+
+    writer.publish(sample(2))
+    assert reader.latest_sample(max_age=telemetry_ring.RING_STALE_AFTER)['t_ns'] == 2
+
+
+def test_restarted_writer_continues_the_sequence(ring):
+    writer, reader = ring
+    writer.publish(sample(1))
+    writer.publish(sample(2))
+
+    restarted = TelemetryRingWriter(writer.name, capacity=8)
+    restarted.publish(sample(3))
+    assert reader.latest_sample()['sequence'] == 3
+    restarted.close()
+
+
+def test_open_reader_without_writer():
+    assert open_reader(f"motorcycle_missing_{os.getpid()}") is None
@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import telemetry_writer
+from telemetry_metrics import create_metrics_tables
+from telemetry_writer import TelemetryWriter, TELEMETRY_COLUMNS
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry_writer, 'DB_TIMEOUT', 0.05)
+    monkeypatch.setattr(telemetry_writer, 'WRITE_RETRY_DELAY', 0.001)
+    path = tmp_path / 'telemetry.db'
+    conn = sqlite3.connect(path)
+    conn.execute(f"CREATE TABLE telemetry_data (id INTEGER PRIMARY KEY, {', '.join(TELEMETRY_COLUMNS)})")
+    create_metrics_tables(conn)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def samples(count, start=0):
+    return [dict({column: None for column in TELEMETRY_COLUMNS}, session_id='ride',
+                 timestamp=f"2026-01-01T00:00:{start + i:02d}") for i in range(count)]
+
+
+def row_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM telemetry_data").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_busy_batch_is_carried_to_next_flush(db_path):
+    writer = TelemetryWriter(db_path)
+    conn = writer.open_connection()
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    writer.write_batch(conn, samples(3))
+    stats = writer.get_stats()
+    assert stats['written'] == 0
+    assert stats['errors'] == 1
+    assert stats['retries'] == telemetry_writer.WRITE_RETRIES
+    assert stats['write_dropped'] == 0
+    assert len(writer.unwritten) == 3
+
+    blocker.execute("ROLLBACK")
+    writer.write_batch(conn, samples(2, start=3))
+    stats = writer.get_stats()
+    assert stats['written'] == 5
+    assert stats['write_dropped'] == 0
+    assert writer.unwritten == []
+    assert row_count(db_path) == 5
+    conn.close()
+    blocker.close()
+
+
+def test_persistently_busy_batch_is_dropped_and_counted(db_path, monkeypatch):
+    monkeypatch.setattr(telemetry_writer, 'WRITE_MAX_ATTEMPTS', 2)
+    writer = TelemetryWriter(db_path)
+    conn = writer.open_connection()
+    blocker = sqlite3.connect(db_path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+
+    writer.write_batch(conn, samples(3))
+    writer.write_batch(conn, [])
+    stats = writer.get_stats()
+    assert stats['write_dropped'] == 3
+    assert stats['dropped'] == 0
+    assert stats['errors'] == 2
+    assert writer.unwritten == []
+    conn.close()
+    blocker.close()
+
+
+def test_non_transient_error_drops_without_retry(db_path):
+    writer = TelemetryWriter(db_path)
+    conn = writer.open_connection()
+    conn.execute("DROP TABLE telemetry_data")
+
+    writer.write_batch(conn, samples(4))
+    stats = writer.get_stats()
+    assert stats['retries'] == 0
+    assert stats['write_dropped'] == 4
+    assert writer.unwritten == []
+    conn.close()
@@ -0,0 +1,59 @@
+import pytest
+
+from track_codec import (encode_polyline, decode_polyline, encode_track, decode_track,
+                         write_varint, read_varint)
+
+
+def test_polyline_matches_reference_encoding():
+    # Example from Google's encoded polyline algorithm documentation
+    points = [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+    assert encode_polyline(points) == '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+    assert decode_polyline('_p~iF~ps|U_ulLnnqC_mqNvxq`@') == points
+
+
+def test_polyline_round_trip_keeps_five_decimals():
+    points = [(51.50735, -0.12776), (51.50741, -0.12701), (-33.86882, 151.20929), (0.0, 0.0)]
+    assert decode_polyline(encode_polyline(points)) == points
+    assert encode_polyline([]) == ''
+
+
+@pytest.mark.parametrize('value', [0, 1, -1, 63, -64, 2**31, -2**40])
+def test_varint_round_trip(value):
+    out = bytearray()
+    write_varint(out, value)
+    assert read_varint(out, 0) == (value, len(out))
+
+
+def test_binary_track_round_trip_with_nulls():
+    points = [
+        (51.50735, -0.12776, 12.3, 0.0, '2026-05-01T10:00:00'),
+        (51.50741, -0.12701, None, 14.2, '2026-05-01 10:00:01.500000'),
+        (None, -0.12650, 12.9, 15.0, '2026-05-01T10:00:02'),     # no position - dropped
+        (51.50760, -0.12600, 13.1, None, None),                  # no time - repeats the last
+        (51.50790, -0.12550, 13.4, 17.6, '2026-05-01T10:00:04+00:00'),
+    ]
+    start = 1777629600000
+    assert decode_track(encode_track(points)) == [
+        (51.50735, -0.12776, 12.3, 0.0, start),
+        (51.50741, -0.12701, None, 14.2, start + 1500),
+        (51.5076, -0.126, 13.1, None, start + 1500),
+        (51.5079, -0.1255, 13.4, 17.6, start + 4000),
+    ]
+
+
+def test_binary_track_without_nulls_has_no_bitmaps():
+    points = [(45.0 + i * 1e-4, 7.0 - i * 1e-4, 300.0 + i, 30.0 + i, 1777629600 + i) for i in range(20)]
+    data = encode_track(points)
+    assert data[5] == 0
+    decoded = decode_track(data)
+    assert [(p[0], p[1]) for p in decoded] == [(round(p[0], 5), round(p[1], 5)) for p in points]
+    assert [p[4] for p in decoded] == [(1777629600 + i) * 1000 for i in range(20)]
+
+
+def test_empty_track():
+    assert decode_track(encode_track([])) == []
+
+
+def test_decode_rejects_other_data():
+    with pytest.raises(ValueError):
+        decode_track(b'NOPE' + bytes(14))
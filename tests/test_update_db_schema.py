@@ -0,0 +1,127 @@
+import logging
+import sqlite3
+
+import pytest
+
+import route_tracker
+from motorcycle_telemetry import MotorcycleTelemetry
+from telemetry_metrics import TOTAL_KEY
+from update_db_schema import (INDEXES, TRACKS_CURSOR_INDEXES, RIDES_START_INDEXES, SCHEMA_VERSION,
+                              apply_migrations)
+
+ALL_INDEXES = {**INDEXES, **TRACKS_CURSOR_INDEXES, **RIDES_START_INDEXES}
+
+
+def index_names(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+
+
+def collector_setup(path):
+    """The collector's own database setup, without its sensors and threads"""
+    telemetry = MotorcycleTelemetry.__new__(MotorcycleTelemetry)
+    telemetry.db_path = path
+    telemetry.logger = logging.getLogger('test')
+    telemetry.setup_database()
+
+
+def test_bare_database_waits_for_tables(tmp_path):
+    path = tmp_path / 'telemetry.db'
+    assert apply_migrations(path) == 2
+    # Rerun once the tables exist
+    collector_setup(path)
+    assert apply_migrations(path) == SCHEMA_VERSION
+
+
+def test_fresh_collector_database(tmp_path):
+    path = tmp_path / 'telemetry.db'
+    collector_setup(path)
+
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rides)")}
+    assert {'session_id', 'ride_id', 'distance_miles', 'max_lean_deg'} <= columns
+    conn.close()
+    assert set(ALL_INDEXES) <= index_names(path)
+
+
+def test_fresh_route_tracker_database(tmp_path, monkeypatch):
+    path = tmp_path / 'telemetry.db'
+    monkeypatch.setattr(route_tracker, 'DB_PATH', path)
+    assert route_tracker.setup_database()
+    # The collector starting later finds the migrations done
+    collector_setup(path)
+    assert set(ALL_INDEXES) <= index_names(path)
+
+
+def test_baseline_database(tmp_path):
+    """A database from before the migrations: telemetry_data still
+    referencing rides_old, rides without the route tracker's columns"""
+    path = tmp_path / 'telemetry.db'
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE rides (id INTEGER PRIMARY KEY AUTOINCREMENT, ride_id TEXT UNIQUE,
+                            start_time TEXT, end_time TEXT);
+        CREATE TABLE telemetry_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, timestamp TIMESTAMP,
+            ax REAL, ay REAL, az REAL, gx REAL, gy REAL, gz REAL, mx REAL, my REAL, mz REAL,
+            temperature REAL, vibration_level REAL, power_voltage REAL, on_external_power BOOLEAN,
+            latitude REAL, longitude REAL, speed_mph REAL, heading REAL, gps_fix BOOLEAN,
+            satellites_used INTEGER, hdop REAL,
+            FOREIGN KEY (session_id) REFERENCES rides_old (session_id)
+        );
+        CREATE TABLE tracks (id INTEGER PRIMARY KEY AUTOINCREMENT, ride_id TEXT, timestamp TEXT,
+                             latitude REAL, longitude REAL, altitude REAL, speed_mph REAL);
+    """)
+    conn.execute("INSERT INTO rides (ride_id, start_time) VALUES ('r1', '2026-05-01T10:00:00')")
+    conn.executemany(
+        "INSERT INTO telemetry_data (session_id, timestamp, latitude, longitude, speed_mph) VALUES (?, ?, ?, ?, ?)",
+        [('r1', f"2026-05-01T10:00:{i:02d}", 51.5 + i * 1e-4, -0.12, 20.0) for i in range(30)]
+    )
+    conn.executemany(
+        "INSERT INTO tracks (ride_id, timestamp, latitude, longitude, speed_mph) VALUES (?, ?, ?, ?, ?)",
+        [('r1', f"2026-05-01T10:00:{i:02d}", 51.5 + i * 1e-4, -0.12, 20.0) for i in range(30)]
+    )
+    conn.commit()
+    conn.close()
+
+    assert apply_migrations(path) == SCHEMA_VERSION
+    # Rerunning is a no-op
+    assert apply_migrations(path) == SCHEMA_VERSION
+
+    conn = sqlite3.connect(path)
+    foreign_keys = conn.execute("PRAGMA foreign_key_list(telemetry_data)").fetchall()
+    assert [fk[2] for fk in foreign_keys] == ['rides']
+    assert conn.execute("SELECT COUNT(*) FROM telemetry_data").fetchone()[0] == 30
+    assert conn.execute("SELECT session_id FROM rides").fetchone()[0] == 'r1'
+    assert conn.execute("SELECT rows FROM telemetry_counts WHERE session_id = ?", (TOTAL_KEY,)).fetchone()[0] == 30
+    assert conn.execute("SELECT COUNT(*) FROM track_segments").fetchone()[0] > 0
+    conn.close()
+    assert set(ALL_INDEXES) <= index_names(path)
+
+
+def test_released_index_sets_are_unchanged():
+    # Migration 3 runs before rides.ride_id exists on a collector database
+    assert all(not definition.startswith('rides ') for definition in INDEXES.values())
+
+
+@pytest.mark.parametrize('token', [
+    '', '!!!', 'é',
+    'e30=',                      # {}
+    'bnVsbA==',                  # null
+    'WzEsMl0=',                  # [1, 2]
+    'eyJhIjoxLCJiIjoyfQ==',      # {"a": 1, "b": 2}
+    'WyJhIiwiYiIsImMiXQ==',      # ["a", "b", "c"]
+    '_w==',                      # not UTF-8
+])
+def test_decode_ride_cursor_rejects_bad_tokens(token):
+    with pytest.raises(ValueError):
+        route_tracker.decode_ride_cursor(token)
+
+
+def test_ride_cursor_round_trip():
+    token = route_tracker.encode_ride_cursor('2026-05-01T10:00:00', 'r1')
+    assert route_tracker.decode_ride_cursor(token) == ('2026-05-01T10:00:00', 'r1')
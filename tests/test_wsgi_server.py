@@ -0,0 +1,78 @@
+import time
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from wsgi_server import PooledWSGIServer, REQUEST_BUDGET, time_left
+
+
+class BlockingApp:
+    """WSGI app that reports its time budget, holding the worker until released"""
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, environ, start_response):
+        self.entered.set()
+        self.release.wait(5)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [f"{time_left():.3f}".encode()]
+
+
+@pytest.fixture
+def server():
+    app = BlockingApp()
+    server = PooledWSGIServer('127.0.0.1', 0, app, threads=1, queue=0, budget=2.0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, app, f"http://127.0.0.1:{server.server_port}/"
+    app.release.set()
+    server.shutdown()
+    server.server_close()
+    thread.join(5)
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.status, response.read()
+
+
+def test_requests_run_within_their_budget(server):
+    _, _, url = server
+    status, body = fetch(url)
+    assert status == 200
+    assert 1.5 < float(body) <= 2.0
+    # Outside a pooled request the full default budget applies
+    assert time_left() == REQUEST_BUDGET
+
+
+def test_full_pool_answers_503_and_recovers(server):
+    _, app, url = server
+    app.release.clear()
+    results = []
+    busy = threading.Thread(target=lambda: results.append(fetch(url)))
+    busy.start()
+    assert app.entered.wait(5)
+
+    with pytest.raises(urllib.error.HTTPError) as refused:
+        fetch(url)
+    assert refused.value.code == 503
+    assert refused.value.headers['Retry-After'] == '1'
+
+    app.release.set()
+    busy.join(5)
+    assert results[0][0] == 200
+
+    # The slot is released just after the worker closes the socket
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            assert fetch(url)[0] == 200
+            break
+        except urllib.error.HTTPError as e:
+            assert e.code == 503 and time.monotonic() < deadline
+            time.sleep(0.01)
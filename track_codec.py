@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Compact Track Encodings
+Ride tracks sized for a cellular link: Google encoded polylines for the
+latitude/longitude path, and a delta-encoded binary format that also
+carries the speed, altitude and time columns
+
+Binary layout (all integers little-endian):
+    b'MTRK'                magic
+    u8                     format version (1)
+    u8                     null flags - bit 0 altitude, bit 1 speed
+    u32                    point count
+    i64                    time of the first point, ms since the epoch (UTC)
+    then five columns, each as zigzag varint deltas from the previous value:
+        latitude, longitude   1e-5 degrees (the polyline precision)
+        altitude              decimeters
+        speed                 tenths of a mph
+        time                  milliseconds
+A column flagged as having nulls is preceded by a bitmap of which points
+carry a value (bit i of byte i // 8), and holds deltas only for those.
+Points without a position are dropped, as a polyline can't represent them.
+"""
+
+import struct
+from datetime import datetime, timezone
+
+# Encoding configuration
+POLYLINE_PRECISION = 5       # Decimal places kept - about 1.1 m of latitude
+BINARY_MAGIC = b'MTRK'
+BINARY_VERSION = 1
+ALTITUDE_SCALE = 10          # Decimeters
+SPEED_SCALE = 10             # Tenths of a mph
+HEADER = struct.Struct('<4sBBIq')
+
+# Media types, for Accept negotiation
+POLYLINE_MIMETYPE = 'application/vnd.moto.polyline+json'
+BINARY_MIMETYPE = 'application/vnd.moto.track'
+
+
+def encode_polyline(points, precision=POLYLINE_PRECISION):
+    """Google encoded polyline of (lat, lon, ...) rows"""
+    factor = 10 ** precision
+    chunks = []
+    last_lat = last_lon = 0
+    for point in points:
+        lat = round(point[0] * factor)
+        lon = round(point[1] * factor)
+        for delta in (lat - last_lat, lon - last_lon):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        last_lat, last_lon = lat, lon
+    return ''.join(chunks)
+
+
+def decode_polyline(text, precision=POLYLINE_PRECISION):
+    """[(lat, lon), ...] from an encoded polyline"""
+    factor = 10 ** precision
+    points = []
+    values = [0, 0]
+    index = 0
+    while index < len(text):
+        for i in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(text[index]) - 63
+                index += 1
+                result |= (byte & 0x1f) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            values[i] += ~(result >> 1) if result & 1 else result >> 1
+        points.append((values[0] / factor, values[1] / factor))
+    return points
+
+
+def write_varint(out, value):
+    """Append a zigzag-encoded signed varint"""
+    value = (value << 1) ^ (value >> 63)
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """(value, new offset) of a zigzag-encoded signed varint"""
+    result = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    return (result >> 1) ^ -(result & 1), offset
+
+
+def timestamp_ms(value):
+    """Milliseconds since the epoch of a stored timestamp (naive ones are UTC)"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return round(value * 1000)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return round(moment.timestamp() * 1000)
+
+
+def write_column(out, values):
+    """Append the deltas between a column's values, skipping nulls"""
+    last = 0
+    for value in values:
+        if value is not None:
+            write_varint(out, value - last)
+            last = value
+
+
+def encode_track(points):
+    """Binary track from (lat, lon, altitude, speed_mph, timestamp) rows"""
+    points = [point for point in points if point[0] is not None and point[1] is not None]
+    factor = 10 ** POLYLINE_PRECISION
+    lats = [round(point[0] * factor) for point in points]
+    lons = [round(point[1] * factor) for point in points]
+    altitudes = [None if point[2] is None else round(point[2] * ALTITUDE_SCALE) for point in points]
+    speeds = [None if point[3] is None else round(point[3] * SPEED_SCALE) for point in points]
+    times = [timestamp_ms(point[4]) for point in points]
+
+    # Missing times repeat the previous one, so the column never needs a bitmap
+    last_time = next((t for t in times if t is not None), 0)
+    for i, t in enumerate(times):
+        if t is None:
+            times[i] = last_time
+        last_time = times[i]
+
+    flags = (1 if None in altitudes else 0) | (2 if None in speeds else 0)
+    out = bytearray(HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, len(points), times[0] if times else 0))
+    write_column(out, lats)
+    write_column(out, lons)
+    for bit, column in ((1, altitudes), (2, speeds)):
+        if flags & bit:
+            bitmap = bytearray((len(column) + 7) // 8)
+            for i, value in enumerate(column):
+                if value is not None:
+                    bitmap[i // 8] |= 1 << (i % 8)
+            out += bitmap
+        write_column(out, column)
+    write_column(out, [t - times[0] for t in times])
+    return bytes(out)
+
+
+def decode_track(data):
+    """[(lat, lon, altitude, speed_mph, time_ms), ...] from a binary track"""
+    magic, version, flags, count, start = HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC or version != BINARY_VERSION:
+        raise ValueError("Not a version 1 binary track")
+    offset = HEADER.size
+
+    def read_column(present):
+        nonlocal offset
+        values = []
+        last = 0
+        for i in range(count):
+            if present is not None and not present[i]:
+                values.append(None)
+                continue
+            delta, offset = read_varint(data, offset)
+            last += delta
+            values.append(last)
+        return values
+
+    def read_bitmap():
+        nonlocal offset
+        size = (count + 7) // 8
+        bitmap = data[offset:offset + size]
+        offset += size
+        return [bool(bitmap[i // 8] & (1 << (i % 8))) for i in range(count)]
+
+    factor = 10 ** POLYLINE_PRECISION
+    lats = read_column(None)
+    lons = read_column(None)
+    altitudes = read_column(read_bitmap() if flags & 1 else None)
+    speeds = read_column(read_bitmap() if flags & 2 else None)
+    times = read_column(None)
+    return [
+        (lat / factor, lon / factor,
+         None if alt is None else alt / ALTITUDE_SCALE,
+         None if speed is None else speed / SPEED_SCALE,
+         start + t)
+        for lat, lon, alt, speed, t in zip(lats, lons, altitudes, speeds, times)
+    ]
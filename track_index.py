@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Track Spatial Index
+SQLite R*Tree over the bounding boxes of short runs of consecutive track
+points, so "which rides passed through here" touches only the runs that
+overlap the area instead of every row of tracks
+
+Each track_segments row covers up to SEGMENT_POINTS points of one ride: its
+id is the first point's tracks.id and last_track_id the last one's, so a
+search refines candidate segments with a rowid range read of tracks. The
+route tracker's RideTracker indexes points as they are recorded; migration 7
+backfills everything recorded before.
+"""
+
+import math
+
+# Spatial index configuration
+SEGMENT_POINTS = 32          # Track points per indexed segment
+METERS_PER_DEGREE = 111320.0
+
+
+def create_track_index(conn):
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS track_segments USING rtree(
+            id,
+            min_lat, max_lat,
+            min_lon, max_lon,
+            +ride_id TEXT,
+            +last_track_id INTEGER
+        )
+    """)
+
+
+class TrackIndexer:
+    """Groups track points into segments and writes their bounding boxes"""
+
+    def __init__(self):
+        self.segment = None      # [first id, min lat, max lat, min lon, max lon, ride_id, last id, points]
+        self.pending = []        # Segments changed since the last flush
+
+    def add(self, ride_id, track_id, lat, lon):
+        segment = self.segment
+        if segment is None or segment[5] != ride_id or segment[7] >= SEGMENT_POINTS:
+            segment = self.segment = [track_id, lat, lat, lon, lon, ride_id, track_id, 0]
+        segment[1] = min(segment[1], lat)
+        segment[2] = max(segment[2], lat)
+        segment[3] = min(segment[3], lon)
+        segment[4] = max(segment[4], lon)
+        segment[6] = track_id
+        segment[7] += 1
+        if not self.pending or self.pending[-1] is not segment:
+            self.pending.append(segment)
+
+    def flush(self, conn):
+        """Write the changed segments (inside the caller's transaction)"""
+        conn.executemany(
+            "INSERT OR REPLACE INTO track_segments "
+            "(id, min_lat, max_lat, min_lon, max_lon, ride_id, last_track_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [segment[:7] for segment in self.pending]
+        )
+        self.pending = []
+
+
+def index_tracks(conn, indexer, after_id, limit):
+    """Index up to limit track points with ids above after_id; returns the
+    last id read, or None once there is nothing left"""
+    rows = conn.execute(
+        "SELECT id, ride_id, latitude, longitude FROM tracks WHERE id > ? ORDER BY id LIMIT ?",
+        (after_id, limit)
+    ).fetchall()
+    if not rows:
+        return None
+    for track_id, ride_id, lat, lon in rows:
+        if lat is not None and lon is not None:
+            indexer.add(ride_id, track_id, lat, lon)
+    indexer.flush(conn)
+    return rows[-1][0]
+
+
+def last_indexed_id(conn):
+    row = conn.execute("SELECT MAX(last_track_id) FROM track_segments").fetchone()
+    return row[0] or 0
+
+
+def radius_bbox(lat, lon, radius_m):
+    """(min_lat, min_lon, max_lat, max_lon) enclosing a circle"""
+    dlat = radius_m / METERS_PER_DEGREE
+    dlon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+
+BBOX_JOIN = """
+        FROM track_segments s
+        JOIN tracks t ON t.id BETWEEN s.id AND s.last_track_id
+        WHERE s.max_lat >= :min_lat AND s.min_lat <= :max_lat
+        AND s.max_lon >= :min_lon AND s.min_lon <= :max_lon
+        AND t.ride_id = s.ride_id
+        AND t.latitude BETWEEN :min_lat AND :max_lat
+        AND t.longitude BETWEEN :min_lon AND :max_lon
+"""
+
+
+def query_bbox(conn, select, suffix, min_lat, min_lon, max_lat, max_lon, ride_id):
+    query = select + BBOX_JOIN
+    if ride_id is not None:
+        query += " AND s.ride_id = :ride_id"
+    return conn.execute(query + suffix, {
+        'min_lat': min_lat, 'min_lon': min_lon, 'max_lat': max_lat, 'max_lon': max_lon, 'ride_id': ride_id
+    })
+
+
+def points_in_bbox(conn, min_lat, min_lon, max_lat, max_lon, ride_id=None):
+    """Cursor over (ride_id, id, timestamp, latitude, longitude, speed_mph) of
+    the track points inside a box, in recording order"""
+    return query_bbox(conn, "SELECT t.ride_id, t.id, t.timestamp, t.latitude, t.longitude, t.speed_mph",
+                      " ORDER BY t.id", min_lat, min_lon, max_lat, max_lon, ride_id)
+
+
+def rides_in_bbox(conn, min_lat, min_lon, max_lat, max_lon, ride_id=None):
+    """Cursor over (ride_id, points inside, first time, last time) of each ride
+    with track points inside a box"""
+    return query_bbox(conn, "SELECT t.ride_id, COUNT(*), MIN(t.timestamp), MAX(t.timestamp)",
+                      " GROUP BY t.ride_id", min_lat, min_lon, max_lat, max_lon, ride_id)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Track Simplification
+Douglas-Peucker simplification of ride tracks for map display, with
+per-zoom levels cached in the track_levels table once a ride has ended
+
+Each point gets a significance: the Douglas-Peucker tolerance (in meters)
+below which it survives. Simplifying to any tolerance is then a filter,
+so one pass over a track yields every zoom level.
+"""
+
+import json
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Pure-Python fallback below
+
+# Simplification configuration
+TOLERANCE_PIXELS = 1.0          # Allowed deviation from the real track, in screen pixels
+MIN_ZOOM = 4                    # Coarsest cached level
+FULL_DETAIL_ZOOM = 18           # At this zoom and above every point is returned
+WEB_MERCATOR_METERS_PER_PIXEL = 156543.03392   # At the equator, zoom 0, 256 px tiles
+METERS_PER_DEGREE = 111320.0
+VECTOR_MIN_SPAN = 64            # Use NumPy for spans longer than this
+
+
+def meters_per_pixel(zoom, latitude):
+    """Ground resolution of a web map tile pixel"""
+    return WEB_MERCATOR_METERS_PER_PIXEL * math.cos(math.radians(latitude)) / (2 ** zoom)
+
+
+def tolerance_for_zoom(zoom, latitude):
+    """Simplification tolerance in meters for a map zoom level"""
+    return TOLERANCE_PIXELS * meters_per_pixel(zoom, latitude)
+
+
+def project(points):
+    """Equirectangular x/y in meters around the track's mean latitude"""
+    mean_lat = sum(point[0] for point in points) / len(points)
+    scale_x = METERS_PER_DEGREE * math.cos(math.radians(mean_lat))
+    xs = [point[1] * scale_x for point in points]
+    ys = [point[0] * METERS_PER_DEGREE for point in points]
+    return xs, ys
+
+
+def segment_distance(px, py, ax, ay, bx, by):
+    """Distance from point p to segment a-b"""
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    if length_sq == 0:
+        return math.hypot(px - ax, py - ay)
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def farthest_point(xs, ys, first, last):
+    """(index, distance) of the point between first and last farthest from their segment"""
+    ax, ay, bx, by = xs[first], ys[first], xs[last], ys[last]
+
+    if np is not None and last - first > VECTOR_MIN_SPAN:
+        px = xs[first + 1:last]
+        py = ys[first + 1:last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        if length_sq == 0:
+            distances = np.hypot(px - ax, py - ay)
+        else:
+            t = np.clip(((px - ax) * dx + (py - ay) * dy) / length_sq, 0.0, 1.0)
+            distances = np.hypot(px - ax - t * dx, py - ay - t * dy)
+        offset = int(np.argmax(distances))
+        return first + 1 + offset, float(distances[offset])
+
+    best_index, best_distance = first, -1.0
+    for i in range(first + 1, last):
+        distance = segment_distance(xs[i], ys[i], ax, ay, bx, by)
+        if distance > best_distance:
+            best_index, best_distance = i, distance
+    return best_index, best_distance
+
+
+def significance(points):
+    """Douglas-Peucker tolerance in meters below which each point is kept"""
+    n = len(points)
+    sig = [math.inf] * n
+    if n < 3:
+        return sig
+
+    xs, ys = project(points)
+    if np is not None:
+        xs, ys = np.asarray(xs), np.asarray(ys)
+
+    # A point can't outlive the split that created its span
+    stack = [(0, n - 1, math.inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+        index, distance = farthest_point(xs, ys, first, last)
+        sig[index] = min(distance, parent)
+        stack.append((first, index, sig[index]))
+        stack.append((index, last, sig[index]))
+
+    for i in range(1, n - 1):
+        if sig[i] == math.inf:
+            sig[i] = 0.0
+    return sig
+
+
+def simplify(points, tolerance, sig=None):
+    """Points whose deviation matters at the given tolerance in meters"""
+    if sig is None:
+        sig = significance(points)
+    return [point for point, s in zip(points, sig) if s > tolerance]
+
+
+def mean_latitude(points):
+    return sum(point[0] for point in points) / len(points) if points else 0.0
+
+
+def track_levels(points):
+    """{zoom: (tolerance_m, points)} for every cached zoom level"""
+    sig = significance(points)
+    latitude = mean_latitude(points)
+    levels = {}
+    for zoom in range(MIN_ZOOM, FULL_DETAIL_ZOOM):
+        tolerance = tolerance_for_zoom(zoom, latitude)
+        levels[zoom] = (tolerance, simplify(points, tolerance, sig))
+    return levels
+
+
+def build_track_levels(conn, ride_id, source_points=None):
+    """Simplify a finished ride's track and cache each zoom level in track_levels"""
+    cursor = conn.execute(
+        "SELECT latitude, longitude, altitude, speed_mph, timestamp FROM tracks "
+        "WHERE ride_id=? ORDER BY timestamp",
+        (ride_id,)
+    )
+    points = [tuple(row) for row in cursor if row[0] is not None and row[1] is not None]
+    if source_points is None:
+        source_points = len(points)
+
+    conn.execute("DELETE FROM track_levels WHERE ride_id=?", (ride_id,))
+    conn.executemany(
+        "INSERT INTO track_levels (ride_id, zoom, tolerance_m, source_points, point_count, points) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(ride_id, zoom, tolerance, source_points, len(level), json.dumps(level))
+         for zoom, (tolerance, level) in track_levels(points).items()]
+    )
+    return len(points)
+
+
+def load_track_level(conn, ride_id, zoom=None, tolerance=None, source_points=None):
+    """(zoom, tolerance_m, points) of the cached level for a zoom or tolerance,
+    or None if the ride has no cache or the cache is older than its track"""
+    if tolerance is not None:
+        # The coarsest level that still honours the requested tolerance
+        row = conn.execute(
+            "SELECT zoom, tolerance_m, source_points, points FROM track_levels "
+            "WHERE ride_id=? AND tolerance_m <= ? ORDER BY tolerance_m DESC LIMIT 1",
+            (ride_id, tolerance)
+        ).fetchone()
+        if row is None:
+            row = conn.execute(
+                "SELECT zoom, tolerance_m, source_points, NULL FROM track_levels "
+                "WHERE ride_id=? ORDER BY zoom DESC LIMIT 1",
+                (ride_id,)
+            ).fetchone()
+    else:
+        zoom = max(MIN_ZOOM, min(zoom, FULL_DETAIL_ZOOM - 1))
+        row = conn.execute(
+            "SELECT zoom, tolerance_m, source_points, points FROM track_levels WHERE ride_id=? AND zoom=?",
+            (ride_id, zoom)
+        ).fetchone()
+
+    if row is None or (source_points is not None and row[2] != source_points):
+        return None
+    if row[3] is None:
+        # Finer than the finest cached level - the caller serves full detail
+        return row[0], 0.0, None
+    return row[0], row[1], [tuple(point) for point in json.loads(row[3])]
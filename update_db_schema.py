@@ -1,138 +1,391 @@
 #!/usr/bin/env python3
 """
 Database Schema Update Script
-Fixes issues with the motorcycle telemetry database schema
+Versioned migrations for the motorcycle telemetry database
+
+Each migration runs once; the schema version is kept in PRAGMA user_version
+and the history in schema_migrations. Table rebuilds copy rows in small
+committed chunks, so a migration interrupted by a power cut picks up where it
+stopped on the next run instead of starting over.
 """
 
-import sqlite3
 import os
+import sys
+import time
+import sqlite3
+import argparse
 from pathlib import Path
+from datetime import datetime
 import logging
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+from track_index import TrackIndexer, create_track_index, index_tracks, last_indexed_id
+from telemetry_metrics import backfill_metrics, create_metrics_tables
+
 logger = logging.getLogger(__name__)
 
 # Database path
-DB_PATH = Path("/home/pi/motorcycle_data/telemetry.db")
-BACKUP_PATH = Path("/home/pi/motorcycle_data/telemetry_backup.db")
+DATA_DIR = Path(os.environ.get('MOTO_DATA_DIR', '/home/pi/motorcycle_data'))
+DB_PATH = DATA_DIR / "telemetry.db"
+BACKUP_PATH = DATA_DIR / "telemetry_backup.db"
+
+# Migration configuration
+DB_TIMEOUT = 30.0               # Seconds to wait for database lock
+MIGRATION_CHUNK_ROWS = 20000    # Rows copied per committed chunk
+
+# Secondary indexes for the hot queries: per-session reads, time-window reads
+# (covering the dashboard's GPS history columns) and per-ride track reads
+# (covering every column the route tracker returns). Each migration creates
+# its own set - a released migration's set never changes.
+INDEXES = {
+    'idx_telemetry_session_time': 'telemetry_data (session_id, timestamp)',
+    'idx_telemetry_time': 'telemetry_data (timestamp, latitude, longitude, speed_mph)',
+    'idx_tracks_ride_time': 'tracks (ride_id, timestamp, latitude, longitude, altitude, speed_mph)',
+}
+TRACKS_CURSOR_INDEXES = {
+    # ride_id alone keeps rowid next in the key, so "ride_id=? AND id>?" is a range seek
+    'idx_tracks_ride_id': 'tracks (ride_id)',
+}
+RIDES_START_INDEXES = {
+    # Keyset pagination of the ride list, newest first
+    'idx_rides_start': 'rides (start_time, ride_id)',
+}
+
+class transaction:
+    """BEGIN IMMEDIATE ... COMMIT on an autocommit connection, rolling back on error"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+def table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+def table_columns(conn, table):
+    return [column[1] for column in conn.execute(f"PRAGMA table_info({table})")]
+
+def add_rides_session_id(conn):
+    """Give the route tracker's rides table the collector's session_id column"""
+    columns = table_columns(conn, 'rides')
+
+    if "session_id" not in columns and "ride_id" in columns:
+        logger.info("Updating rides table to include session_id")
+        with transaction(conn):
+            conn.execute("ALTER TABLE rides ADD COLUMN session_id TEXT")
+            # Copy values from ride_id to session_id
+            conn.execute("UPDATE rides SET session_id = ride_id")
+        logger.info("Rides table updated with session_id")
+    else:
+        logger.info("Rides table already has session_id or no ride_id column")
+    return True
 
-def backup_database():
+def fix_telemetry_foreign_key(conn):
+    """Rebuild telemetry_data if it still references rides_old, copying in resumable chunks"""
+    rebuilding = table_exists(conn, 'telemetry_data_new')
+    if not rebuilding:
+        if not table_exists(conn, 'telemetry_data'):
+            return True
+        foreign_keys = conn.execute("PRAGMA foreign_key_list(telemetry_data)").fetchall()
+        if not any(fk[2] == "rides_old" for fk in foreign_keys):
+            return True
+
+        logger.info("Fixing foreign key reference in telemetry_data")
+        with transaction(conn):
+            conn.execute("""
+            CREATE TABLE telemetry_data_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT,
+                timestamp TIMESTAMP,
+                ax REAL, ay REAL, az REAL,
+                gx REAL, gy REAL, gz REAL,
+                mx REAL, my REAL, mz REAL,
+                temperature REAL,
+                vibration_level REAL,
+                power_voltage REAL,
+                on_external_power BOOLEAN,
+                latitude REAL,
+                longitude REAL,
+                speed_mph REAL,
+                heading REAL,
+                gps_fix BOOLEAN,
+                satellites_used INTEGER DEFAULT 0,
+                hdop REAL DEFAULT 99.0,
+                altitude REAL,
+                FOREIGN KEY (session_id) REFERENCES rides (session_id)
+            )
+            """)
+    else:
+        logger.info("Resuming telemetry_data rebuild")
+
+    # Copy only the columns both tables have - the new one may have gained some
+    new_columns = set(table_columns(conn, 'telemetry_data_new'))
+    columns = ', '.join(c for c in table_columns(conn, 'telemetry_data') if c in new_columns)
+    copy_sql = (f"INSERT INTO telemetry_data_new ({columns}) SELECT {columns} FROM telemetry_data "
+                f"WHERE id > ? ORDER BY id")
+    total = conn.execute("SELECT COUNT(*) FROM telemetry_data").fetchone()[0]
+
+    # Each chunk commits on its own; the highest copied id is the resume point
+    while True:
+        with transaction(conn):
+            last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM telemetry_data_new").fetchone()[0]
+            copied = conn.execute(copy_sql + " LIMIT ?", (last_id, MIGRATION_CHUNK_ROWS)).rowcount
+        if copied < MIGRATION_CHUNK_ROWS:
+            break
+        done = conn.execute("SELECT COUNT(*) FROM telemetry_data_new").fetchone()[0]
+        logger.info(f"Copied {done}/{total} telemetry rows")
+
+    # Pick up rows written meanwhile and swap the tables in one transaction
+    with transaction(conn):
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM telemetry_data_new").fetchone()[0]
+        conn.execute(copy_sql, (last_id,))
+        conn.execute("DROP TABLE telemetry_data")
+        conn.execute("ALTER TABLE telemetry_data_new RENAME TO telemetry_data")
+
+    logger.info("Fixed foreign key reference in telemetry_data")
+    return True
+
+def create_indexes(conn, indexes=INDEXES):
+    """Create a set of secondary indexes; waits until all their tables exist"""
+    tables = sorted({definition.split()[0] for definition in indexes.values()})
+    if not all(table_exists(conn, table) for table in tables):
+        logger.info(f"Index migration waiting for {', '.join(tables)} tables")
+        return False
+
+    # One index per transaction - an interrupted build just rolls back and reruns
+    for name, definition in indexes.items():
+        started = time.monotonic()
+        with transaction(conn):
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        logger.info(f"Index {name} ready ({time.monotonic() - started:.1f} s)")
+    return True
+
+def create_tracks_cursor_index(conn):
+    return create_indexes(conn, TRACKS_CURSOR_INDEXES)
+
+def create_rides_start_index(conn):
+    """Needs rides.ride_id, which migration 4 adds to a collector-created rides table"""
+    return create_indexes(conn, RIDES_START_INDEXES)
+
+# Columns the collector and route tracker both expect on rides, whichever created it
+RIDES_COLUMNS = {
+    'ride_id': 'TEXT',
+    'name': 'TEXT',
+    'distance_miles': 'REAL',
+    'max_speed_mph': 'REAL',
+    'avg_speed_mph': 'REAL',
+    'active': 'INTEGER DEFAULT 0',
+    'moving_time_s': 'REAL',
+    'max_lean_deg': 'REAL',
+    'max_g': 'REAL',
+    'point_count': 'INTEGER',
+    'stats_updated': 'TEXT',
+}
+
+def add_ride_stats_columns(conn):
+    """Add the incremental ride statistics columns (and any route tracker columns) to rides"""
+    if not table_exists(conn, 'rides'):
+        logger.info("Ride stats migration waiting for rides table")
+        return False
+
+    existing = set(table_columns(conn, 'rides'))
+    with transaction(conn):
+        for column, definition in RIDES_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE rides ADD COLUMN {column} {definition}")
+                logger.info(f"Added rides.{column}")
+    return True
+
+def create_track_levels(conn):
+    """Cache table for simplified ride tracks, one row per ride and zoom level"""
+    with transaction(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS track_levels (
+                ride_id TEXT,
+                zoom INTEGER,
+                tolerance_m REAL,
+                source_points INTEGER,
+                point_count INTEGER,
+                points TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (ride_id, zoom)
+            )
+        """)
+    return True
+
+def create_track_spatial_index(conn):
+    """R*Tree over track segments, backfilled in committed chunks - an
+    interrupted backfill resumes after the last indexed point"""
+    if not table_exists(conn, 'tracks'):
+        logger.info("Spatial index migration waiting for tracks table")
+        return False
+
+    with transaction(conn):
+        create_track_index(conn)
+
+    started = time.monotonic()
+    indexer = TrackIndexer()
+    after_id = last_indexed_id(conn)
+    while after_id is not None:
+        with transaction(conn):
+            after_id = index_tracks(conn, indexer, after_id, MIGRATION_CHUNK_ROWS)
+    logger.info(f"Track spatial index ready ({time.monotonic() - started:.1f} s)")
+    return True
+
+def create_telemetry_metrics(conn):
+    """Row counters maintained by the telemetry writer, backfilled from the
+    rows recorded so far"""
+    if not table_exists(conn, 'telemetry_data'):
+        logger.info("Metrics migration waiting for telemetry_data table")
+        return False
+
+    started = time.monotonic()
+    with transaction(conn):
+        create_metrics_tables(conn)
+        backfill_metrics(conn)
+    logger.info(f"Telemetry metrics ready ({time.monotonic() - started:.1f} s)")
+    return True
+
+# (version, name, function) - append only; a function returns False to be retried next run
+MIGRATIONS = [
+    (1, 'rides_session_id', add_rides_session_id),
+    (2, 'telemetry_foreign_key', fix_telemetry_foreign_key),
+    (3, 'secondary_indexes', create_indexes),
+    (4, 'ride_stats_columns', add_ride_stats_columns),
+    (5, 'track_levels', create_track_levels),
+    (6, 'tracks_cursor_index', create_tracks_cursor_index),
+    (7, 'track_spatial_index', create_track_spatial_index),
+    (8, 'rides_start_index', create_rides_start_index),
+    (9, 'telemetry_metrics', create_telemetry_metrics),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def connect(db_path):
+    """Autocommit connection - migrations manage their own transactions"""
+    conn = sqlite3.connect(str(db_path), timeout=DB_TIMEOUT, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def get_schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def apply_migrations(db_path=DB_PATH):
+    """Bring the database up to SCHEMA_VERSION; returns the version reached"""
+    conn = connect(db_path)
+    try:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT,
+                applied_at TEXT
+            )
+        """)
+        version = get_schema_version(conn)
+
+        for migration_version, name, migrate in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            logger.info(f"Applying migration {migration_version}: {name}")
+            if not migrate(conn):
+                break
+            with transaction(conn):
+                conn.execute(
+                    "INSERT OR REPLACE INTO schema_migrations (version, name, applied_at) VALUES (?, ?, ?)",
+                    (migration_version, name, datetime.now().isoformat())
+                )
+                conn.execute(f"PRAGMA user_version = {migration_version}")
+            version = migration_version
+
+        return version
+    finally:
+        conn.close()
+
+def backup_database(db_path=DB_PATH, backup_path=BACKUP_PATH):
     """Create a backup of the database before making changes"""
-    if DB_PATH.exists():
-        import shutil
-        logger.info(f"Creating backup at {BACKUP_PATH}")
-        shutil.copy2(DB_PATH, BACKUP_PATH)
+    if Path(db_path).exists():
+        logger.info(f"Creating backup at {backup_path}")
+        # The backup API includes anything still in the WAL, unlike a file copy
+        source = sqlite3.connect(str(db_path), timeout=DB_TIMEOUT)
+        target = sqlite3.connect(str(backup_path))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
         return True
     return False
 
-def update_schema():
-    """Update the database schema to fix issues"""
+def update_schema(db_path=DB_PATH):
+    """Update the database schema to the latest version"""
     try:
-        # Connect to the database
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Start a transaction
-        conn.execute("BEGIN TRANSACTION")
-        
-        # Check if we need to update the rides table
-        cursor.execute("PRAGMA table_info(rides)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if "session_id" not in columns and "ride_id" in columns:
-            logger.info("Updating rides table to include session_id")
-            
-            # Add session_id column if it doesn't exist
-            cursor.execute("ALTER TABLE rides ADD COLUMN session_id TEXT")
-            
-            # Copy values from ride_id to session_id
-            cursor.execute("UPDATE rides SET session_id = ride_id")
-            
-            logger.info("Rides table updated with session_id")
-        else:
-            logger.info("Rides table already has session_id or no ride_id column")
-        
-        # Fix the foreign key reference in telemetry_data if needed
-        cursor.execute("PRAGMA foreign_key_list(telemetry_data)")
-        foreign_keys = cursor.fetchall()
-        
-        if foreign_keys:
-            for fk in foreign_keys:
-                if fk[2] == "rides_old":  # If referencing the old table name
-                    logger.info("Fixing foreign key reference in telemetry_data")
-                    
-                    # Create a temporary table with the correct foreign key
-                    cursor.execute("""
-                    CREATE TABLE telemetry_data_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        session_id TEXT,
-                        timestamp TIMESTAMP,
-                        ax REAL, ay REAL, az REAL,
-                        gx REAL, gy REAL, gz REAL,
-                        mx REAL, my REAL, mz REAL,
-                        temperature REAL,
-                        vibration_level REAL, 
-                        power_voltage REAL, 
-                        on_external_power BOOLEAN, 
-                        latitude REAL, 
-                        longitude REAL, 
-                        speed_mph REAL, 
-                        heading REAL, 
-                        gps_fix BOOLEAN, 
-                        satellites_used INTEGER DEFAULT 0, 
-                        hdop REAL DEFAULT 99.0, 
-                        altitude REAL,
-                        FOREIGN KEY (session_id) REFERENCES rides (session_id)
-                    )
-                    """)
-                    
-                    # Copy all data
-                    cursor.execute("INSERT INTO telemetry_data_new SELECT * FROM telemetry_data")
-                    
-                    # Drop the old table and rename the new one
-                    cursor.execute("DROP TABLE telemetry_data")
-                    cursor.execute("ALTER TABLE telemetry_data_new RENAME TO telemetry_data")
-                    
-                    logger.info("Fixed foreign key reference in telemetry_data")
-                    break
-        
-        # Commit the changes
-        conn.commit()
-        logger.info("Database schema update completed successfully")
-        
+        version = apply_migrations(db_path)
     except sqlite3.Error as e:
-        conn.rollback()
         logger.error(f"Database error: {e}")
         return False
     except Exception as e:
-        conn.rollback()
         logger.error(f"Error updating schema: {e}")
         return False
+
+    if version < SCHEMA_VERSION:
+        logger.warning(f"Schema at version {version} of {SCHEMA_VERSION} - rerun once the missing tables exist")
+        return False
+    logger.info(f"Database schema at version {version}")
+    return True
+
+def print_status(db_path):
+    """Show the schema version and applied migrations"""
+    conn = connect(db_path)
+    try:
+        print(f"Schema version: {get_schema_version(conn)} (latest {SCHEMA_VERSION})")
+        if table_exists(conn, 'schema_migrations'):
+            for version, name, applied_at in conn.execute(
+                    "SELECT version, name, applied_at FROM schema_migrations ORDER BY version"):
+                print(f"   {version}: {name} ({applied_at})")
+        if table_exists(conn, 'telemetry_data_new'):
+            print("   telemetry_data rebuild in progress")
     finally:
         conn.close()
-    
-    return True
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='Migrate the telemetry database to the latest schema')
+    parser.add_argument('--db', default=str(DB_PATH), help='Database to migrate')
+    parser.add_argument('--no-backup', action='store_true', help='Skip the backup (e.g. when resuming)')
+    parser.add_argument('--status', action='store_true', help='Show the schema version and exit')
+    args = parser.parse_args()
+    db_path = Path(args.db)
+
     logger.info("Starting database schema update")
-    
-    if not DB_PATH.exists():
-        logger.error(f"Database not found at {DB_PATH}")
-        exit(1)
-    
-    if backup_database():
+
+    if not db_path.exists():
+        logger.error(f"Database not found at {db_path}")
+        sys.exit(1)
+
+    if args.status:
+        print_status(db_path)
+        sys.exit(0)
+
+    if args.no_backup:
+        logger.info("Skipping database backup")
+    elif backup_database(db_path, db_path.with_name(db_path.stem + "_backup.db")):
         logger.info("Database backup created successfully")
     else:
         logger.warning("Could not create database backup")
-        
-    if update_schema():
+
+    if update_schema(db_path):
         logger.info("Schema update completed successfully")
     else:
         logger.error("Schema update failed")
-        exit(1)
-    
-    logger.info("Database schema update script completed") 
\ No newline at end of file
+        sys.exit(1)
+
+    logger.info("Database schema update script completed")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Pooled WSGI Server
+Production serving for the Flask services: Werkzeug's HTTP handling on a
+fixed pool of worker threads, so a slow SQLite query or camera proxy only
+occupies one worker while the others keep answering
+
+The pool is bounded - connections beyond the workers plus a short queue get
+an immediate 503 instead of piling up - and every socket read or write has
+a timeout, so a stalled client can't hold a worker forever. Each request
+also has a time budget; worker threads can't be interrupted, so handlers
+call time_left() and fit their database and long-poll waits inside it.
+Connections are closed after each response (HTTP/1.0); idle keep-alive
+sockets would otherwise pin workers. WebSocket upgrades (Flask-SocketIO's
+threading mode via simple-websocket) hold their worker for as long as they
+are open.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Server configuration
+SERVER_THREADS = 8            # Worker threads
+SERVER_QUEUE = 32             # Accepted connections that may wait for a worker
+REQUEST_TIMEOUT = 60.0        # Seconds a socket read or write may block
+REQUEST_BUDGET = 30.0         # Seconds a handler may spend on a request, waits included
+
+OVERLOADED_RESPONSE = (
+    b"HTTP/1.0 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server busy\n"
+)
+
+
+# Deadline of the request the current worker thread is handling
+request_state = threading.local()
+
+
+def time_left(default=REQUEST_BUDGET):
+    """Seconds left in the current request's budget - default outside a pooled request"""
+    deadline = getattr(request_state, 'deadline', None)
+    if deadline is None:
+        return default
+    return max(0.0, deadline - time.monotonic())
+
+
+class PooledRequestHandler(WSGIRequestHandler):
+    protocol_version = "HTTP/1.0"
+    timeout = REQUEST_TIMEOUT
+    budget = REQUEST_BUDGET
+
+    def run_wsgi(self):
+        request_state.deadline = time.monotonic() + self.budget
+        try:
+            super().run_wsgi()
+        finally:
+            request_state.deadline = None
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server dispatching each connection to a bounded thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=SERVER_THREADS, queue=SERVER_QUEUE,
+                 timeout=REQUEST_TIMEOUT, budget=REQUEST_BUDGET):
+        handler = type('RequestHandler', (PooledRequestHandler,), {'timeout': timeout, 'budget': budget})
+        super().__init__(host, port, app, handler=handler)
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self.slots = threading.BoundedSemaphore(threads + queue)
+
+    def process_request(self, request, client_address):
+        if not self.slots.acquire(blocking=False):
+            # Overloaded - refuse now rather than queue without bound
+            try:
+                request.sendall(OVERLOADED_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+
+def serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS, queue=SERVER_QUEUE,
+          timeout=REQUEST_TIMEOUT, budget=REQUEST_BUDGET):
+    """Serve a WSGI app until interrupted"""
+    server = PooledWSGIServer(host, port, app, threads=threads, queue=queue, timeout=timeout,
+                              budget=budget)
+    logging.info(f"Serving on {host}:{port} with {threads} worker threads")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()